@@ -0,0 +1,192 @@
+"""
+Admission control for request pipeline stages.
+
+Work runs in one of two pools: 'cheap' (knowledge base lookups, arithmetic,
+derivatives) and 'expensive' (SymPy integrals, limits and equation solving,
+web search). Each pool runs a bounded number of tasks at once; the rest wait
+in a priority queue until a slot frees up or their queue-time deadline
+passes. Work that cannot start in time is shed with Overloaded, right away
+when the queue is full or the expected wait already exceeds the deadline, so
+a burst of pathological integrals never starves KB hits.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from telemetry import telemetry
+
+CHEAP = 'cheap'
+EXPENSIVE = 'expensive'
+
+class Overloaded(Exception):
+    """Raised when a pool sheds work instead of queueing it"""
+
+    def __init__(self, pool: str, reason: str):
+        super().__init__(f"The server is too busy to take more {pool} work right now ({reason}). "
+                         f"Please try again in a moment.")
+        self.pool = pool
+        self.reason = reason
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'deadline', 'event', 'granted')
+
+    def __init__(self, priority: int, seq: int, deadline: float):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.granted = False
+
+    def __lt__(self, other: '_Waiter') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class AdmissionPool:
+    """
+    Bounded concurrency with a priority queue in front of it.
+
+    Lower priority values are served first, FIFO within a priority. A freed
+    slot is handed directly to the next waiter whose deadline has not passed.
+    """
+    # Weight of the newest sample in the service time average
+    SERVICE_TIME_ALPHA = 0.2
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int = 64, queue_timeout: float = 1.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {'queue_full': 0, 'predicted_wait': 0, 'deadline': 0}
+        self.service_time: Optional[float] = None
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _expected_wait(self, priority: int) -> float:
+        """Rough wait before a new request of this priority would start"""
+        if self.service_time is None:
+            return 0.0
+        ahead = sum(1 for waiter in self._queue if waiter.priority <= priority)
+        return (ahead // self.max_concurrency + 1) * self.service_time
+
+    def _reject(self, reason: str):
+        self.shed[reason] += 1
+        telemetry.increment('admission_shed_total', pool=self.name, reason=reason)
+        raise Overloaded(self.name, reason)
+
+    def _publish(self):
+        telemetry.set_gauge('admission_queue_depth', len(self._queue), pool=self.name)
+        telemetry.set_gauge('admission_active', self.active, pool=self.name)
+
+    def acquire(self, priority: int = 0, timeout: Optional[float] = None):
+        """Take a slot, waiting at most timeout seconds; raises Overloaded otherwise"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._lock:
+            if self.active < self.max_concurrency and not self._queue:
+                self.active += 1
+                self.admitted += 1
+                self._publish()
+                return
+            if len(self._queue) >= self.max_queue:
+                self._reject('queue_full')
+            if self._expected_wait(priority) > timeout:
+                self._reject('predicted_wait')
+            waiter = _Waiter(priority, next(self._seq), time.monotonic() + timeout)
+            heapq.heappush(self._queue, waiter)
+            self._publish()
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                return
+            # Timed out; release() may already have dropped it as expired
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            self._publish()
+            self._reject('deadline')
+
+    def release(self, service_time: Optional[float] = None):
+        with self._lock:
+            if service_time is not None:
+                if self.service_time is None:
+                    self.service_time = service_time
+                else:
+                    self.service_time += self.SERVICE_TIME_ALPHA * (service_time - self.service_time)
+            now = time.monotonic()
+            while self._queue:
+                waiter = heapq.heappop(self._queue)
+                if waiter.deadline > now:
+                    # Hand the slot over without freeing it
+                    waiter.granted = True
+                    waiter.event.set()
+                    break
+            else:
+                self.active -= 1
+            self._publish()
+
+    @contextmanager
+    def slot(self, priority: int = 0, timeout: Optional[float] = None) -> Iterator[None]:
+        self.acquire(priority, timeout)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active': self.active,
+                'queued': len(self._queue),
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'service_time_ms': self.service_time * 1000 if self.service_time is not None else None
+            }
+
+class AdmissionController:
+    """
+    A cheap and an expensive pool. Every controller has its own caps, so the
+    Routers and agents of a process share default_admission().
+
+    Defaults can be overridden with MATH_AGENT_CHEAP_CONCURRENCY,
+    MATH_AGENT_EXPENSIVE_CONCURRENCY and MATH_AGENT_ADMISSION_QUEUE.
+    """
+
+    def __init__(self, cheap_concurrency: Optional[int] = None, expensive_concurrency: Optional[int] = None,
+                 max_queue: Optional[int] = None, cheap_timeout: float = 1.0, expensive_timeout: float = 5.0):
+        cpus = os.cpu_count() or 2
+        cheap_concurrency = cheap_concurrency or int(os.environ.get('MATH_AGENT_CHEAP_CONCURRENCY', 4 * cpus))
+        expensive_concurrency = expensive_concurrency or int(os.environ.get('MATH_AGENT_EXPENSIVE_CONCURRENCY', max(2, cpus)))
+        max_queue = max_queue or int(os.environ.get('MATH_AGENT_ADMISSION_QUEUE', 64))
+        self.pools = {
+            CHEAP: AdmissionPool(CHEAP, cheap_concurrency, max_queue, cheap_timeout),
+            EXPENSIVE: AdmissionPool(EXPENSIVE, expensive_concurrency, max_queue, expensive_timeout)
+        }
+
+    def slot(self, pool: str, priority: int = 0, timeout: Optional[float] = None):
+        """Context manager running its body in a slot of the given pool"""
+        return self.pools[pool].slot(priority, timeout)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Active tasks, queue depth and shed counts per pool"""
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+_default: Optional[AdmissionController] = None
+_default_lock = threading.Lock()
+
+def default_admission() -> AdmissionController:
+    """The process-wide controller, created with the environment's defaults on first use"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AdmissionController()
+    return _default
@@ -1,29 +1,26 @@
-import re
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
+from guardrail_engine import default_engine
 
 class AIGateway:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.math_patterns = [
-            r'\b(derivative|integral|limit|solve|equation|function|matrix|vector|calculus|algebra|geometry|trigonometry)\b',
-            r'[0-9+\-*/^()\[\]{}]',
-            r'\b(sin|cos|tan|cot|sec|csc|log|ln|exp)\b'
-        ]
+        self.engine = default_engine()
         
     def validate_input(self, query: str) -> Dict[str, Any]:
         """Validate if the input is a mathematical question"""
+        return self._input_result(query, self.engine.check(query))
+    
+    def _input_result(self, query: str, verdict: Dict[str, bool]) -> Dict[str, Any]:
         # Check if the query contains mathematical content
-        is_math = any(re.search(pattern, query.lower()) for pattern in self.math_patterns)
-        
-        if not is_math:
+        if not verdict['is_math_query']:
             return {
                 "valid": False,
                 "error": "Input does not appear to be a mathematical question"
             }
             
         # Check for potentially harmful content
-        if any(word in query.lower() for word in ["hack", "exploit", "bypass", "security"]):
+        if verdict['is_harmful']:
             return {
                 "valid": False,
                 "error": "Input contains potentially harmful content"
@@ -36,15 +33,18 @@ class AIGateway:
     
     def validate_output(self, response: str) -> Dict[str, Any]:
         """Validate the response for correctness and safety"""
+        return self._output_result(response, self.engine.check(response))
+    
+    def _output_result(self, response: str, verdict: Dict[str, bool]) -> Dict[str, Any]:
         # Check if response is empty
-        if not response.strip():
+        if verdict['is_empty']:
             return {
                 "valid": False,
                 "error": "Empty response"
             }
             
         # Check for error messages in response
-        if "error" in response.lower():
+        if verdict['has_error']:
             return {
                 "valid": False,
                 "error": "Response contains error"
@@ -55,6 +55,11 @@ class AIGateway:
             "response": response
         }
     
+    def check_many(self, texts: List[str], output: bool = False) -> List[Dict[str, Any]]:
+        """Validate a batch of inputs (or outputs) with one engine scan per text"""
+        result = self._output_result if output else self._input_result
+        return [result(text, verdict) for text, verdict in zip(texts, self.engine.check_many(texts))]
+    
     def process_input(self, input_text: str) -> Optional[str]:
         """
         Process input through the gateway.
@@ -0,0 +1,82 @@
+"""
+NumericEvaluator against sympify for MathAgent.evaluate_expression-style input.
+
+Each expression is timed three ways: sympify plus float conversion (the old
+evaluate_expression), a cold compile and evaluation with an empty cache, and
+a cached evaluation.
+
+    python benchmarks/bench_evaluator.py --repeat 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EXPRESSIONS = [
+    "2+3*4",
+    "(1+2)/3 - 7%3",
+    "2^10 + 3**4",
+    "sqrt(2)*3 + 1e3",
+    "sin(pi/6) + cos(pi/3)",
+    "log(8, 2) * exp(1)",
+    "((1+2)*(3+4)*(5+6))/(7-8)",
+    "atan2(1, 1) + floor(2.7) + abs(-2.5)"
+]
+
+def time_per_call(function: Callable[[], object], repeat: int) -> float:
+    """Median of five runs, in microseconds per call"""
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        runs.append((time.perf_counter() - start) / repeat * 1e6)
+    return statistics.median(runs)
+
+def run(expressions: List[str], repeat: int) -> List[Dict]:
+    import sympy as sp
+    from evaluator import NumericEvaluator
+
+    def sympify_value(expression: str):
+        result = sp.sympify(expression)
+        return float(result) if result.is_number else str(result)
+
+    report = []
+    for expression in expressions:
+        expected = sympify_value(expression)
+        value = NumericEvaluator().evaluate(expression)
+        cached = NumericEvaluator()
+        cached.evaluate(expression)
+        row = {
+            'expression': expression,
+            'value': value,
+            'sympify_value': expected,
+            'sympify_us': time_per_call(lambda: sympify_value(expression), max(1, repeat // 20)),
+            'cold_us': time_per_call(lambda: NumericEvaluator().evaluate(expression), repeat),
+            'cached_us': time_per_call(lambda: cached.evaluate(expression), repeat)
+        }
+        row['speedup_cached'] = row['sympify_us'] / row['cached_us']
+        report.append(row)
+        print(f"{expression:40} sympify {row['sympify_us']:9.1f} us   cold {row['cold_us']:7.1f} us   "
+              f"cached {row['cached_us']:5.2f} us   ({row['speedup_cached']:.0f}x)")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AST evaluator against sympify")
+    parser.add_argument('--repeat', type=int, default=2000, help="Evaluator calls per timing run")
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = run(EXPRESSIONS, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
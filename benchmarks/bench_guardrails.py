@@ -0,0 +1,127 @@
+"""
+Benchmark the single-pass guardrail engine against the original
+Guardrails/AIGateway implementations (reproduced below as Legacy*).
+
+Run from the repository root:
+    python benchmarks/bench_guardrails.py
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_gateway import AIGateway
+from guardrail_engine import GuardrailEngine
+from guardrails import Guardrails
+
+class LegacyGuardrails:
+    EMAIL_PATTERN = re.compile(r"[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}")
+    PHONE_PATTERN = re.compile(r"\b\d{10,}\b")
+    ADDRESS_KEYWORDS = Guardrails.ADDRESS_KEYWORDS
+    ALLOWED_TOPICS = Guardrails.ALLOWED_TOPICS
+
+    @staticmethod
+    def contains_pii(text):
+        if LegacyGuardrails.EMAIL_PATTERN.search(text):
+            return True
+        if LegacyGuardrails.PHONE_PATTERN.search(text):
+            return True
+        for word in LegacyGuardrails.ADDRESS_KEYWORDS:
+            if word in text.lower():
+                return True
+        return False
+
+    @staticmethod
+    def is_math_topic(text):
+        text_lower = text.lower()
+        math_symbols = ['+', '-', '*', '/', '=', '^', '√', 'π', 'sin', 'cos', 'tan', 'log', 'ln']
+        if any(symbol in text_lower for symbol in math_symbols):
+            return True
+        return any(topic in text_lower for topic in LegacyGuardrails.ALLOWED_TOPICS)
+
+    @classmethod
+    def input_guardrail(cls, user_input):
+        if cls.contains_pii(user_input):
+            return False, "Input rejected: contains personal or sensitive information."
+        if not cls.is_math_topic(user_input):
+            return False, "Input rejected: only mathematics or education-related questions are allowed."
+        return True, ""
+
+class LegacyAIGateway:
+    math_patterns = [
+        r'\b(derivative|integral|limit|solve|equation|function|matrix|vector|calculus|algebra|geometry|trigonometry)\b',
+        r'[0-9+\-*/^()\[\]{}]',
+        r'\b(sin|cos|tan|cot|sec|csc|log|ln|exp)\b'
+    ]
+
+    def validate_input(self, query):
+        is_math = any(re.search(pattern, query.lower()) for pattern in self.math_patterns)
+        if not is_math:
+            return {"valid": False, "error": "Input does not appear to be a mathematical question"}
+        if any(word in query.lower() for word in ["hack", "exploit", "bypass", "security"]):
+            return {"valid": False, "error": "Input contains potentially harmful content"}
+        return {"valid": True, "query": query}
+
+    def validate_output(self, response):
+        if not response.strip():
+            return {"valid": False, "error": "Empty response"}
+        if "error" in response.lower():
+            return {"valid": False, "error": "Response contains error"}
+        return {"valid": True, "response": response}
+
+def load_texts():
+    """Questions and answers from the repository's data files plus a few edge cases"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    texts = []
+    with open(os.path.join(root, 'jee_questions.json'), encoding='utf-8') as f:
+        for item in json.load(f):
+            texts += [item['text'], item['expected_answer']]
+    with open(os.path.join(root, 'math_kb.json'), encoding='utf-8') as f:
+        for question, entry in json.load(f).items():
+            texts += [question, entry['answer'], ' '.join(entry['steps'])]
+    texts += [
+        "hello, how are you today?",
+        "email me at someone@example.com about the integral",
+        "call 9876543210 for the derivative",
+        "how do I hack the exam server",
+        "what is the velocity of a ball",
+        "Error: could not parse",
+        "   "
+    ]
+    return texts
+
+def time_per_call(func, texts, number):
+    total = timeit.timeit(lambda: [func(text) for text in texts], number=number)
+    return total / (number * len(texts)) * 1e6
+
+def main(number=200):
+    texts = load_texts()
+    legacy_gateway = LegacyAIGateway()
+    gateway = AIGateway()
+
+    def legacy_all(text):
+        return (LegacyGuardrails.input_guardrail(text), legacy_gateway.validate_input(text),
+                legacy_gateway.validate_output(text))
+
+    def engine_all(text):
+        return (Guardrails.input_guardrail(text), gateway.validate_input(text), gateway.validate_output(text))
+
+    mismatches = [text for text in texts if legacy_all(text) != engine_all(text)]
+
+    # Uncached engine: every call scans the text again
+    fresh = GuardrailEngine(cache_size=0)
+    results = {
+        'texts': len(texts),
+        'legacy_us_per_text': time_per_call(legacy_all, texts, number),
+        'engine_uncached_us_per_text': time_per_call(fresh.check, texts, number),
+        'engine_us_per_text': time_per_call(engine_all, texts, number),
+        'mismatches': mismatches
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Recall vs. latency of MinHash-LSH retrieval against the exact KnowledgeBase scan.
+
+Probes are stored questions, perturbed copies of them (case and spacing,
+typos, changed numbers) and unrelated questions. Recall is the share of
+probes for which LSH retrieval returns the same match as the exact scan.
+
+    python benchmarks/bench_lsh.py --sizes 10000 50000 --probes 40
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_kb
+
+UNRELATED = [
+    "What is the volume of a torus?",
+    "Explain the central limit theorem",
+    "How many edges does a dodecahedron have?",
+    "Find the eigenvalues of a 2x2 rotation matrix"
+]
+
+def make_probes(questions: List[str], count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    probes = []
+    for i in range(count):
+        question = rng.choice(questions)
+        kind = i % 5
+        if kind == 0:
+            probes.append(question)
+        elif kind == 1:
+            probes.append('  '.join(question.lower().split()))
+        elif kind == 2:
+            # One dropped character
+            position = rng.randrange(len(question))
+            probes.append(question[:position] + question[position + 1:])
+        elif kind == 3:
+            probes.append(''.join(str((int(c) + 1) % 10) if c in '0123456789' and rng.random() < 0.3 else c
+                                  for c in question))
+        else:
+            probes.append(rng.choice(UNRELATED))
+    return probes
+
+def timed_queries(kb, probes: List[str]) -> Dict:
+    results = []
+    latencies = []
+    for probe in probes:
+        start = time.perf_counter()
+        result = kb.query(probe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result['question'] if result else None)
+    latencies.sort()
+    return {
+        'results': results,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+def run(sizes: List[int], probe_count: int, configs: List[Dict]) -> List[Dict]:
+    from knowledge_base import KnowledgeBase
+    from minhash import MinHashLSH
+
+    report = []
+    for size in sizes:
+        kb_file = f'kb_{size}.json'
+        write_kb(kb_file, size)
+        exact = KnowledgeBase(kb_file, retrieval='exact')
+        probes = make_probes(list(exact.knowledge_base), probe_count)
+        baseline = timed_queries(exact, probes)
+        print(f"[{size}] exact: p50 {baseline['p50_ms']:.2f} ms, p95 {baseline['p95_ms']:.2f} ms")
+        matched = [i for i, result in enumerate(baseline['results']) if result is not None]
+
+        for config in configs:
+            kb = KnowledgeBase(kb_file, retrieval='lsh', max_candidates=config['max_candidates'])
+            start = time.perf_counter()
+            kb._lsh = MinHashLSH(num_perm=config['num_perm'], bands=config['bands'])
+            kb._lsh.add_many(list(kb.knowledge_base))
+            build_s = time.perf_counter() - start
+            candidates = [len(kb._lsh.candidates(probe, config['max_candidates'])) for probe in probes]
+            lsh = timed_queries(kb, probes)
+            agree = sum(1 for a, b in zip(lsh['results'], baseline['results']) if a == b)
+            recall = sum(1 for i in matched if lsh['results'][i] == baseline['results'][i]) / max(len(matched), 1)
+            row = {
+                'size': size, **config, 'build_s': build_s,
+                'recall': recall, 'agreement': agree / len(probes),
+                'mean_candidates': statistics.fmean(candidates),
+                'p50_ms': lsh['p50_ms'], 'p95_ms': lsh['p95_ms'],
+                'exact_p50_ms': baseline['p50_ms'], 'speedup_p50': baseline['p50_ms'] / max(lsh['p50_ms'], 1e-9)
+            }
+            report.append(row)
+            print(f"[{size}] lsh {config}: recall {recall:.3f}, p50 {row['p50_ms']:.2f} ms, "
+                  f"p95 {row['p95_ms']:.2f} ms, {row['mean_candidates']:.0f} candidates, build {build_s:.1f} s")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MinHash-LSH retrieval recall and latency")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--probes', type=int, default=40)
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    configs = [
+        {'num_perm': 64, 'bands': 16, 'max_candidates': 100},
+        {'num_perm': 64, 'bands': 16, 'max_candidates': 500},
+        {'num_perm': 64, 'bands': 32, 'max_candidates': 500},
+        {'num_perm': 128, 'bands': 32, 'max_candidates': 500}
+    ]
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='math_agent_lsh_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = run(args.sizes, args.probes, configs)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup state with and without the warm-start snapshot.
+
+For each KB size the prepared state MathAgent needs (knowledge base with its
+retrieval index, guardrail keyword matcher) is built three ways in
+a temporary directory: from the source files with the snapshot disabled,
+from the sources while writing a new snapshot, and from the snapshot.
+Interpreter imports are not included.
+
+    python benchmarks/bench_warm_start.py --sizes 1000 50000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import write_kb
+
+def build_state(snapshot: Optional[str]) -> float:
+    """Milliseconds to build (or restore) and save the startup state"""
+    from warm_start import WarmStart
+    start = time.perf_counter()
+    warm_start = WarmStart(snapshot)
+    warm_start.knowledge_base('math_kb.json')
+    warm_start.install_guardrails()
+    warm_start.flush()
+    return (time.perf_counter() - start) * 1000
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    report = []
+    cwd = os.getcwd()
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='bench_warm_start_')
+        try:
+            os.chdir(directory)
+            write_kb('math_kb.json', size)
+            # The first build also writes the LSH index file, which later builds reuse
+            build_state(None)
+            row = {
+                'size': size,
+                'cold_ms': statistics.median(build_state(None) for _ in range(repeat)),
+                'write_ms': build_state('warm_start.snap'),
+                'warm_ms': statistics.median(build_state('warm_start.snap') for _ in range(repeat)),
+                'snapshot_bytes': os.path.getsize('warm_start.snap')
+            }
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory, ignore_errors=True)
+        row['speedup'] = row['cold_ms'] / row['warm_ms']
+        report.append(row)
+        print(f"{size:>8} entries   cold {row['cold_ms']:8.1f} ms   with snapshot write {row['write_ms']:8.1f} ms   "
+              f"warm {row['warm_ms']:7.1f} ms   ({row['speedup']:.1f}x, {row['snapshot_bytes'] / 2 ** 20:.1f} MiB)")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark startup with the warm-start snapshot")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 50000])
+    parser.add_argument('--repeat', type=int, default=5, help="Timed builds per mode")
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
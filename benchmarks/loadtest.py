@@ -0,0 +1,284 @@
+"""
+End-to-end load test for Router/MathAgent, entirely offline.
+
+The web search and WolframAlpha backends are replaced by local HTTP stub
+servers with configurable latency and error rates. A question mix built from
+jee_questions.json, feedback.json and synthetic variants is replayed at a
+target QPS (open loop, so queueing delay counts toward latency).
+
+    python benchmarks/loadtest.py --qps 20 --duration 10
+    python benchmarks/loadtest.py --ramp 5 10 20 40 80 --slo-ms 1000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telemetry import LatencyHistogram
+
+class StubBackendServer:
+    """Local HTTP stand-in for a remote answer service."""
+
+    def __init__(self, name: str, latency_ms: float = 100, jitter: float = 0.5,
+                 error_rate: float = 0.0, miss_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.miss_rate = miss_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def _draw(self):
+        """Latency (seconds) from a log-normal around latency_ms, and the outcome"""
+        with self.rng_lock:
+            latency = self.rng.lognormvariate(math.log(max(self.latency_ms, 0.001)), self.jitter) / 1000
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            return latency, 'error'
+        if roll < self.error_rate + self.miss_rate:
+            return latency, 'miss'
+        return latency, 'ok'
+
+    def start(self) -> 'StubBackendServer':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('input', [''])[0]
+                latency, outcome = stub._draw()
+                time.sleep(latency)
+                if outcome == 'error':
+                    self.send_error(500)
+                    return
+                body = json.dumps({
+                    'answer': f"{stub.name} answer for: {query}" if outcome == 'ok' else None,
+                    'steps': [f"Fetched from {stub.name}"]
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name=f'stub-{self.name}', daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/query"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+class StubSearchClient:
+    """
+    Client for a StubBackendServer with the interfaces the agent expects:
+    search_math_content() like router.WebSearch, search() for MathAgent.
+    """
+
+    def __init__(self, url: str, source: str, timeout: float = 10):
+        self.url = url
+        self.source = source
+        self.timeout = timeout
+
+    def _fetch(self, query: str) -> Optional[Dict]:
+        try:
+            with urllib.request.urlopen(f"{self.url}?{urllib.parse.urlencode({'input': query})}",
+                                        timeout=self.timeout) as response:
+                data = json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+        return data if data.get('answer') else None
+
+    def search_math_content(self, query: str) -> Optional[Dict]:
+        data = self._fetch(query)
+        if not data:
+            return None
+        return {'success': True, 'answer': data['answer'], 'steps': data['steps'], 'source': self.source}
+
+    def search(self, query: str) -> Optional[Dict]:
+        data = self._fetch(query)
+        if not data:
+            return None
+        return {'answer': data['answer'], 'steps': data['steps'], 'source': self.url}
+
+def load_question_mix(root: str = ROOT, synthetic: int = 100, seed: int = 0) -> List[str]:
+    """Questions from the repository's data files plus synthetic variants of them"""
+    questions = []
+    with open(os.path.join(root, 'jee_questions.json'), encoding='utf-8') as f:
+        questions += [item['text'] for item in json.load(f)]
+    with open(os.path.join(root, 'feedback.json'), encoding='utf-8') as f:
+        questions += [entry['question'] for entry in json.load(f)['entries']]
+
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(synthetic):
+        base = rng.choice(questions)
+        variant = re.sub(r"\d+", lambda m: str(int(m.group()) + rng.randint(1, 9)), base)
+        variant = rng.choice([variant, variant.lower(), f"Please {variant[0].lower()}{variant[1:]}",
+                              variant.rstrip('?') + '?'])
+        variants.append(variant)
+    return questions + variants
+
+def run_load(target: Callable[[str], Dict], questions: List[str], qps: float, duration: float,
+             workers: int = 32, seed: int = 0) -> Dict:
+    """Replay questions at a fixed rate and summarize latency per answer source"""
+    rng = random.Random(seed)
+    histograms: Dict[str, LatencyHistogram] = {}
+    overall = LatencyHistogram()
+    lock = threading.Lock()
+    errors = [0]
+    completed_at = []
+
+    def task(question: str, scheduled: float):
+        try:
+            result = target(question)
+            source = result.get('source') or ('error' if 'error' in result else 'unknown')
+        except Exception:
+            source = 'exception'
+            with lock:
+                errors[0] += 1
+        finished = time.perf_counter()
+        latency_us = (finished - scheduled) * 1e6
+        with lock:
+            histograms.setdefault(source, LatencyHistogram()).record(latency_us)
+            completed_at.append(finished)
+        overall.record(latency_us)
+
+    total = int(qps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(total):
+            # Open loop: latency is measured from the scheduled send time
+            scheduled = start + i / qps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, rng.choice(questions), scheduled)
+    elapsed = (max(completed_at) if completed_at else time.perf_counter()) - start
+
+    def summary(histogram: LatencyHistogram) -> Dict:
+        return {
+            'count': histogram.count,
+            'p50_ms': histogram.percentile(50) / 1000,
+            'p95_ms': histogram.percentile(95) / 1000,
+            'p99_ms': histogram.percentile(99) / 1000,
+            'max_ms': histogram.max / 1000
+        }
+
+    return {
+        'target_qps': qps,
+        'requests': total,
+        'throughput_qps': len(completed_at) / elapsed if elapsed > 0 else 0,
+        'exceptions': errors[0],
+        'overall': summary(overall),
+        'by_source': {source: summary(histogram) for source, histogram in sorted(histograms.items())}
+    }
+
+def find_saturation(target: Callable[[str], Dict], questions: List[str], steps: List[float], duration: float,
+                    workers: int, slo_ms: float) -> Dict:
+    """Step up the offered load until throughput falls behind or p99 breaks the SLO"""
+    runs = []
+    saturation = None
+    sustained = 0
+    for qps in steps:
+        result = run_load(target, questions, qps, duration, workers)
+        runs.append(result)
+        print(f"{qps:8.1f} qps offered -> {result['throughput_qps']:8.1f} qps, p99 {result['overall']['p99_ms']:.1f} ms")
+        if result['throughput_qps'] < 0.9 * qps or result['overall']['p99_ms'] > slo_ms:
+            saturation = qps
+            break
+        sustained = qps
+    return {'runs': runs, 'max_sustained_qps': sustained, 'saturation_qps': saturation}
+
+def build_target(name: str, web: StubBackendServer, wolfram: StubBackendServer) -> Callable[[str], Dict]:
+    """Construct Router or MathAgent wired to the stub backends (call inside the work directory)"""
+    if name == 'agent':
+        from main import MathAgent
+        agent = MathAgent()
+        agent.websearch = StubSearchClient(web.url, 'Web Search')
+        agent.feedback = type(agent.feedback)('loadtest_feedback.db')
+        return agent.process_question
+
+    from feedback import FeedbackCollector
+    from knowledge_base import KnowledgeBase
+    from router import Router
+    router = Router(KnowledgeBase(), StubSearchClient(wolfram.url, 'WolframAlpha'))
+    router.feedback_collector = FeedbackCollector('loadtest_feedback.db')
+    return router.route
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Math Agent")
+    parser.add_argument('--target', choices=['router', 'agent'], default='router')
+    parser.add_argument('--qps', type=float, default=10, help="Offered load for a single run")
+    parser.add_argument('--ramp', type=float, nargs='+', help="QPS steps for a saturation search")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per run")
+    parser.add_argument('--workers', type=int, default=32, help="Concurrent requests in flight")
+    parser.add_argument('--slo-ms', type=float, default=2000, help="p99 latency that counts as saturated")
+    parser.add_argument('--synthetic', type=int, default=100, help="Synthetic question variants in the mix")
+    parser.add_argument('--web-latency-ms', type=float, default=300)
+    parser.add_argument('--web-error-rate', type=float, default=0.02)
+    parser.add_argument('--wolfram-latency-ms', type=float, default=500)
+    parser.add_argument('--wolfram-error-rate', type=float, default=0.02)
+    parser.add_argument('--wolfram-miss-rate', type=float, default=0.3, help="Share of queries with no answer")
+    parser.add_argument('--jitter', type=float, default=0.5, help="Log-normal sigma of backend latency")
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    questions = load_question_mix(synthetic=args.synthetic)
+    web = StubBackendServer('web', args.web_latency_ms, args.jitter, args.web_error_rate).start()
+    wolfram = StubBackendServer('WolframAlpha', args.wolfram_latency_ms, args.jitter,
+                                args.wolfram_error_rate, args.wolfram_miss_rate, seed=1).start()
+
+    # Components read and write their data files in the working directory, which
+    # is removed before exit, so there is no warm-start snapshot to keep
+    os.environ.setdefault('MATH_AGENT_WARM_START', '0')
+    workdir = tempfile.mkdtemp(prefix='math_agent_load_')
+    shutil.copy(os.path.join(ROOT, 'math_kb.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        target = build_target(args.target, web, wolfram)
+        if args.ramp:
+            report = find_saturation(target, questions, args.ramp, args.duration, args.workers, args.slo_ms)
+        else:
+            report = run_load(target, questions, args.qps, args.duration, args.workers)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        web.stop()
+        wolfram.stop()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
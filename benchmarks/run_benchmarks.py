@@ -0,0 +1,216 @@
+"""
+Microbenchmark suite for the Math Agent.
+
+Covers KnowledgeBase.query/add_entry over synthetic corpora of growing size,
+Guardrails/AIGateway validation, every MathAgent SymPy method and
+FeedbackCollector.collect_feedback. Results are written as JSON and can be
+compared against a saved baseline:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --sizes 10 1000 100000 1000000
+
+The exit status is 1 when any benchmark is slower than the baseline by more
+than --threshold, so the suite can gate a deployment.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_kb
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+def measure(func: Callable[[], object], min_time: float = 0.2, max_runs: int = 1000,
+            min_runs: int = 3) -> Dict[str, float]:
+    """Time func repeatedly and summarize the per-call latency in microseconds"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    samples.sort()
+    return {
+        'runs': len(samples),
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_us': samples[0]
+    }
+
+class Suite:
+    def __init__(self, sizes: List[int], min_time: float, only: Optional[List[str]] = None):
+        self.sizes = sizes
+        self.min_time = min_time
+        self.only = only
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    def run(self, name: str, func: Callable[[], object], **kwargs):
+        if self.only and not any(prefix in name for prefix in self.only):
+            return
+        self.results[name] = measure(func, min_time=self.min_time, **kwargs)
+        print(f"{name:50s} {self.results[name]['p50_us']:14.1f} us (p50, {self.results[name]['runs']} runs)")
+
+    def knowledge_base(self):
+        from knowledge_base import KnowledgeBase
+
+        for size in self.sizes:
+            kb = KnowledgeBase(f'kb_{size}.json', retrieval='exact')
+            kb.knowledge_base = generate_kb(size)
+            questions = list(kb.knowledge_base)
+            probe_hit = questions[size // 2]
+            # Large sizes are slow per call; a few runs are enough
+            max_runs = 1000 if size <= 10000 else 3
+            self.run(f'kb.query.hit[{size}]', lambda: kb.query(probe_hit), max_runs=max_runs)
+            self.run(f'kb.query.miss[{size}]', lambda: kb.query("What is the volume of a torus?"), max_runs=max_runs)
+
+            lsh_kb = KnowledgeBase(f'kb_{size}.json', retrieval='lsh')
+            lsh_kb.knowledge_base = kb.knowledge_base
+            lsh_kb.query(probe_hit)  # builds the index
+            self.run(f'kb.query.lsh.hit[{size}]', lambda: lsh_kb.query(probe_hit))
+            self.run(f'kb.query.lsh.miss[{size}]', lambda: lsh_kb.query("What is the volume of a torus?"))
+
+            # add_entry rewrites the file, so it scales with the corpus too
+            counter = iter(range(10 ** 9))
+            self.run(f'kb.add_entry[{size}]',
+                     lambda: kb.add_entry(f"Benchmark question {next(counter)}", "answer", ["step"]),
+                     max_runs=max_runs)
+
+    def validation(self):
+        from ai_gateway import AIGateway
+        from guardrail_engine import GuardrailEngine
+        from guardrails import Guardrails
+
+        gateway = AIGateway()
+        question = "What is the derivative of sin(x)cos(x)?"
+        answer = "The derivative of sin(x)*cos(x) is -sin(x)**2 + cos(x)**2."
+        uncached = GuardrailEngine(cache_size=0)
+        self.run('guardrails.input_guardrail', lambda: Guardrails.input_guardrail(question))
+        self.run('guardrails.output_guardrail', lambda: Guardrails.output_guardrail(answer))
+        self.run('gateway.validate_input', lambda: gateway.validate_input(question))
+        self.run('gateway.validate_output', lambda: gateway.validate_output(answer))
+        self.run('engine.check.uncached', lambda: uncached.check(question))
+
+    def sympy_methods(self):
+        from main import MathAgent
+
+        agent = MathAgent()
+        self.run('agent.evaluate_expression', lambda: agent.evaluate_expression("2+3*4"))
+        self.run('agent.evaluate_expression.symbolic', lambda: agent.evaluate_expression("x**2 + 2*x"))
+        self.run('agent.solve_equation', lambda: agent.solve_equation("x**2 - 5*x + 6 = 0"))
+        self.run('agent.calculate_derivative', lambda: agent.calculate_derivative("sin(x)*cos(x)"))
+        self.run('agent.calculate_integral', lambda: agent.calculate_integral("x**2"))
+        self.run('agent.calculate_integral.definite', lambda: agent.calculate_integral("x**2", 'x', 0, 2))
+        self.run('agent.calculate_limit', lambda: agent.calculate_limit("sin(x)/x", 'x', 0))
+
+    def feedback(self):
+        from feedback import FeedbackCollector
+
+        answer = {'answer': 'The derivative of sin(x) is cos(x).', 'steps': ['step'], 'source': 'Knowledge Base'}
+        ratings = {'accuracy': 4, 'clarity': 5, 'relevance': 4, 'comments': ''}
+        for backend, path in (('json', 'bench_feedback.json'), ('sqlite', 'bench_feedback.db')):
+            collector = FeedbackCollector(path)
+            self.run(f'feedback.collect_feedback.{backend}',
+                     lambda: collector.collect_feedback("What is the derivative of sin(x)?", answer, ratings),
+                     max_runs=500)
+            self.run(f'feedback.get_feedback_summary.{backend}', collector.get_feedback_summary)
+
+    def run_all(self) -> Dict[str, Dict[str, float]]:
+        for group in (self.knowledge_base, self.validation, self.sympy_methods, self.feedback):
+            group()
+        return self.results
+
+def compare(results: Dict, baseline: Dict, threshold: float, min_delta_us: float = 2.0) -> List[Dict]:
+    """
+    Benchmarks whose p50 grew by more than the threshold ratio.
+
+    Sub-microsecond benchmarks are noisy, so a regression must also add at
+    least min_delta_us of latency.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['p50_us'] / max(baseline[name]['p50_us'], 1e-9)
+        if ratio > threshold and result['p50_us'] - baseline[name]['p50_us'] >= min_delta_us:
+            regressions.append({'name': name, 'baseline_us': baseline[name]['p50_us'],
+                                'current_us': result['p50_us'], 'ratio': ratio})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Math Agent microbenchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Synthetic KB sizes")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Seconds spent on each benchmark")
+    parser.add_argument('--only', nargs='+', help="Only run benchmarks whose name contains one of these")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write the results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Allowed p50 slowdown ratio")
+    parser.add_argument('--min-delta-us', type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    workdir = tempfile.mkdtemp(prefix='math_agent_bench_')
+    cwd = os.getcwd()
+    # Components read and write their data files in the working directory, which
+    # is removed before exit, so there is no warm-start snapshot to keep
+    os.environ.setdefault('MATH_AGENT_WARM_START', '0')
+    os.chdir(workdir)
+    try:
+        results = Suite(args.sizes, args.min_time, args.only).run_all()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': args.sizes
+        },
+        'results': results
+    }
+
+    regressions = []
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold, args.min_delta_us)
+        report['baseline'] = baseline_path
+        report['regressions'] = regressions
+    elif not args.save_baseline:
+        # Baselines are machine specific, so none is shipped; without one nothing is checked
+        print(f"WARNING: no baseline at {baseline_path}, so regressions were not checked. "
+              f"Run with --save-baseline on the reference machine first.", file=sys.stderr)
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['baseline_us']:.1f} us -> "
+              f"{regression['current_us']:.1f} us ({regression['ratio']:.2f}x)")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Synthetic math_kb.json-style corpora for scaling benchmarks.
+
+    python benchmarks/synthetic.py 100000 synthetic_kb.json
+"""
+import json
+import random
+import sys
+from typing import Dict, Iterator, Tuple
+
+FUNCTIONS = ["sin(x)", "cos(x)", "tan(x)", "log(x)", "exp(x)", "sqrt(x)", "x^2", "x^3", "1/x", "sin(x)cos(x)"]
+
+TEMPLATES = [
+    ("What is the derivative of {f}?", "The derivative of {f} is {r}.",
+     ["Identify the function {f}.", "Apply the differentiation rules.", "Simplify to get {r}."]),
+    ("What is the integral of {f}?", "The integral of {f} is {r} + C.",
+     ["Identify the integrand {f}.", "Apply the integration rules.", "Add the constant of integration C."]),
+    ("Find the area of a circle with radius {n}", "The area is {n2}π square units.",
+     ["Recall the formula for the area of a circle: A = πr².", "Substitute r = {n}: A = π * {n}² = {n2}π."]),
+    ("Find the area of a square with side {n}", "The area of a square with side {n} is {n2} square units.",
+     ["Recall the formula for the area of a square: A = side².", "Substitute side = {n}: A = {n}² = {n2}."]),
+    ("Solve x² + {b}x + {c} = 0", "The solutions are x = -{p} and x = -{q}.",
+     ["Factor the quadratic: (x + {p})(x + {q}) = 0.", "Set each factor to zero.", "Solve for x: x = -{p} or x = -{q}."]),
+    ("Calculate the integral of x² from 0 to {n}", "The integral evaluates to {n3}/3.",
+     ["Set up the definite integral of x² from 0 to {n}.", "The antiderivative of x² is (1/3)x³.",
+      "Evaluate from 0 to {n}: {n3}/3."]),
+]
+
+def generate_entries(size: int, seed: int = 0) -> Iterator[Tuple[str, Dict]]:
+    """Yield `size` distinct (question, entry) pairs"""
+    rng = random.Random(seed)
+    seen = set()
+    index = 0
+    while len(seen) < size:
+        question_template, answer_template, step_templates = TEMPLATES[index % len(TEMPLATES)]
+        index += 1
+        n = rng.randint(1, max(100, size))
+        p, q = rng.randint(1, 99), rng.randint(1, 99)
+        f = rng.choice(FUNCTIONS)
+        if rng.random() < 0.5:
+            f = f"{n}*{f}"
+        values = {'f': f, 'r': f"d({f})", 'n': n, 'n2': n * n, 'n3': n ** 3,
+                  'b': p + q, 'c': p * q, 'p': p, 'q': q}
+        question = question_template.format(**values)
+        if question in seen:
+            continue
+        seen.add(question)
+        yield question, {
+            'answer': answer_template.format(**values),
+            'steps': [step.format(**values) for step in step_templates]
+        }
+
+def generate_kb(size: int, seed: int = 0) -> Dict[str, Dict]:
+    return dict(generate_entries(size, seed))
+
+def write_kb(path: str, size: int, seed: int = 0):
+    """Write a synthetic knowledge base file entry by entry"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for i, (question, entry) in enumerate(generate_entries(size, seed)):
+            if i:
+                f.write(',\n')
+            f.write(f"  {json.dumps(question)}: {json.dumps(entry)}")
+        f.write('\n}\n')
+
+if __name__ == "__main__":
+    write_kb(sys.argv[2] if len(sys.argv) > 2 else 'synthetic_kb.json', int(sys.argv[1]))
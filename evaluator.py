@@ -0,0 +1,201 @@
+"""
+Restricted numeric evaluation of arithmetic expressions.
+
+Expressions are parsed with Python's ast module and compiled into nested
+closures; only numbers, the constants pi and E, + - * / // % ** (or ^) and a
+fixed set of elementary functions are accepted, so nothing in the input is
+ever executed. Constant subtrees are folded at compile time and compiled
+forms are cached, so evaluating a repeated expression costs a dictionary
+lookup and a call. Input that is symbolic or outside this grammar is left to
+SymPy.
+"""
+import ast
+import math
+import operator
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, FrozenSet, Mapping, NamedTuple, Optional
+
+def _cot(x: float) -> float:
+    return 1 / math.tan(x)
+
+def _sec(x: float) -> float:
+    return 1 / math.cos(x)
+
+def _csc(x: float) -> float:
+    return 1 / math.sin(x)
+
+class CompiledExpression(NamedTuple):
+    function: Callable[[Mapping[str, float]], float]
+    variables: FrozenSet[str]
+
+    def __call__(self, variables: Mapping[str, float] = {}) -> float:
+        return self.function(variables)
+
+class NumericEvaluator:
+    """Compile and evaluate arithmetic expressions in floating point."""
+
+    BINARY_OPERATORS = {
+        ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow
+    }
+    UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+    # Names as SymPy spells them, so falling back never changes the meaning
+    FUNCTIONS = {
+        'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'cot': _cot, 'sec': _sec, 'csc': _csc,
+        'asin': math.asin, 'acos': math.acos, 'atan': math.atan, 'atan2': math.atan2,
+        'sinh': math.sinh, 'cosh': math.cosh, 'tanh': math.tanh,
+        'exp': math.exp, 'log': math.log, 'ln': math.log, 'sqrt': math.sqrt,
+        'abs': abs, 'Abs': abs, 'floor': math.floor, 'ceiling': math.ceil
+    }
+    CONSTANTS = {'pi': math.pi, 'E': math.e}
+    MAX_LENGTH = 1000
+    MAX_DEPTH = 100
+    # Integers from here on are not all representable as floats
+    EXACT_LIMIT = 2 ** 53
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        # Expression text -> compiled form, or None for input left to SymPy
+        self._cache: 'OrderedDict[str, Optional[CompiledExpression]]' = OrderedDict()
+        self._lock = Lock()
+
+    def compile(self, expression: str) -> Optional[CompiledExpression]:
+        """Compiled form of an expression, or None if it is not plain arithmetic"""
+        compiled = self._cache.get(expression, False)
+        if compiled is not False:
+            return compiled
+        compiled = self._compile(expression)
+        with self._lock:
+            self._cache[expression] = compiled
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def export_cache(self) -> Dict[str, Optional[float]]:
+        """Cached constant values and rejected inputs (None); closures over variables are not exported"""
+        with self._lock:
+            items = list(self._cache.items())
+        exported = {}
+        for expression, compiled in items:
+            if compiled is None:
+                exported[expression] = None
+            elif (not compiled.variables and hasattr(compiled.function, 'constant')
+                  and not compiled.function.approximate):
+                exported[expression] = compiled.function.constant
+        return exported
+
+    def import_cache(self, items: Dict[str, Optional[float]]):
+        """Seed the cache with the output of export_cache()"""
+        with self._lock:
+            for expression, value in items.items():
+                if len(self._cache) >= self.cache_size:
+                    break
+                if expression not in self._cache:
+                    self._cache[expression] = (None if value is None
+                                               else CompiledExpression(self._constant(value), frozenset()))
+
+    def _compile(self, expression: str) -> Optional[CompiledExpression]:
+        if len(expression) > self.MAX_LENGTH:
+            return None
+        try:
+            tree = ast.parse(expression.strip().replace('^', '**'), mode='eval')
+            variables = set()
+            function = self._node(tree.body, variables, 0)
+        except (SyntaxError, ValueError, RecursionError):
+            return None
+        return CompiledExpression(function, frozenset(variables))
+
+    def _node(self, node: ast.AST, variables: set, depth: int) -> Callable[[Mapping[str, float]], float]:
+        """Closure computing one node; raises ValueError for anything outside the grammar"""
+        if depth > self.MAX_DEPTH:
+            raise ValueError("expression too deeply nested")
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError(f"unsupported constant {node.value!r}")
+            return self._constant(float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id in self.CONSTANTS:
+                return self._constant(self.CONSTANTS[node.id])
+            if node.id in self.FUNCTIONS:
+                raise ValueError(f"function {node.id} used as a value")
+            if node.id.startswith('_'):
+                raise ValueError(f"unsupported name {node.id}")
+            name = node.id
+            variables.add(name)
+            return lambda env: env[name]
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.UNARY_OPERATORS:
+            return self._fold(self.UNARY_OPERATORS[type(node.op)], [self._node(node.operand, variables, depth + 1)])
+        if isinstance(node, ast.BinOp) and type(node.op) in self.BINARY_OPERATORS:
+            operands = [self._node(node.left, variables, depth + 1), self._node(node.right, variables, depth + 1)]
+            return self._fold(self.BINARY_OPERATORS[type(node.op)], operands)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in self.FUNCTIONS
+                and not node.keywords):
+            arguments = [self._node(argument, variables, depth + 1) for argument in node.args]
+            return self._fold(self.FUNCTIONS[node.func.id], arguments)
+        raise ValueError(f"unsupported syntax {type(node).__name__}")
+
+    @staticmethod
+    def _constant(value: float, approximate: bool = False) -> Callable[[Mapping[str, float]], float]:
+        function = lambda env: value
+        function.constant = value
+        # Set when a folded integer went past EXACT_LIMIT and may have lost digits
+        function.approximate = approximate
+        return function
+
+    def _fold(self, op: Callable, operands: list) -> Callable[[Mapping[str, float]], float]:
+        """Apply op at compile time when every operand is constant, otherwise build a closure"""
+        if all(hasattr(operand, 'constant') for operand in operands):
+            try:
+                value = float(op(*(operand.constant for operand in operands)))
+                approximate = (any(operand.approximate for operand in operands)
+                               or (value.is_integer() and abs(value) >= self.EXACT_LIMIT))
+                return self._constant(value, approximate)
+            except (ArithmeticError, ValueError, TypeError):
+                # Left to fail at evaluation time, where the caller falls back to SymPy
+                pass
+        if len(operands) == 1:
+            (only,) = operands
+            return lambda env: op(only(env))
+        if len(operands) == 2:
+            left, right = operands
+            return lambda env: op(left(env), right(env))
+        return lambda env: op(*(operand(env) for operand in operands))
+
+    def is_approximate(self, expression: str) -> bool:
+        """Whether a constant expression went through integers too large to be exact as floats"""
+        compiled = self.compile(expression)
+        return compiled is not None and getattr(compiled.function, 'approximate', False)
+
+    @staticmethod
+    def integer_only(expression: str) -> bool:
+        """Whether an expression combines integer literals only (no floats, names or functions)"""
+        try:
+            tree = ast.parse(expression.strip().replace('^', '**'), mode='eval')
+        except SyntaxError:
+            return False
+        return all(not isinstance(node, (ast.Name, ast.Call))
+                   and (not isinstance(node, ast.Constant) or type(node.value) is int)
+                   for node in ast.walk(tree))
+
+    def evaluate(self, expression: str, variables: Optional[Dict[str, float]] = None) -> Optional[float]:
+        """
+        Value of an expression, or None when it has to go to SymPy instead:
+        symbolic input (names without a value), syntax outside the grammar, or
+        a math error such as division by zero or overflow.
+        """
+        compiled = self.compile(expression)
+        if compiled is None:
+            return None
+        if compiled.variables and (variables is None or not compiled.variables <= variables.keys()):
+            return None
+        try:
+            return float(compiled(variables or {}))
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+
+def format_number(value: float) -> str:
+    """Integers without a trailing .0, everything else to 12 significant digits"""
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.12g}"
@@ -1,11 +1,21 @@
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Callable, Union, Tuple
+import ast
 import json
-from transformers import pipeline
+import bisect
+import hashlib
 import dspy
 from pydantic import BaseModel
 import os
+import sqlite3
+import sys
+import time
+import queue
+import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import telemetry
+from knowledge_base import KnowledgeBase, normalize_question
 
 class FeedbackResponse(BaseModel):
     correctness: float  # 0-1 score
@@ -13,37 +23,121 @@ class FeedbackResponse(BaseModel):
     helpfulness: float # 0-1 score
     comments: str      # Free-form feedback
 
+class FeedbackCache:
+    """Persistent content-hash keyed cache for feedback stage outputs (SQLite, WAL mode)."""
+
+    def __init__(self, cache_file: str = 'dspy_cache.db'):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_file, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS feedback_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM feedback_cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO feedback_cache (key, value) VALUES (?, ?)", (key, value))
+
+class TemplateFeedbackBackend:
+    """
+    Deterministic offline stand-in for the DSPy feedback stages.
+
+    Produces the same text for the same inputs, so MathFeedback can be
+    exercised and benchmarked without an LM or network access.
+    """
+    name = 'template'
+
+    def generate_feedback(self, question: str, answer: str) -> str:
+        if not answer.strip():
+            return "The answer is empty."
+        if not any(ch.isdigit() or ch in '=+-*/^' for ch in answer):
+            return "The answer does not show any mathematical working."
+        return f"The answer addresses '{question}' and states a mathematical result."
+
+    def analyze_feedback(self, feedback: str, question: str, answer: str) -> str:
+        if feedback.startswith("The answer addresses"):
+            return "Add intermediate steps to the answer."
+        return "Provide a worked mathematical answer to the question."
+
 class MathFeedback(dspy.Module):
-    def __init__(self):
+    def __init__(self, promoter=None, lm: Optional[Any] = None, backend: Optional[Any] = None,
+                 cache: Optional[FeedbackCache] = None, max_workers: int = 4, kb: Optional[KnowledgeBase] = None):
         super().__init__()
         self.logger = logging.getLogger(__name__)
+        # KBPromoter used by update_knowledge; created on first use over kb, the
+        # caller's live knowledge base, so promoted entries are served at once
+        self.promoter = promoter
+        self.kb = kb
+        self._promotion_requested = threading.Event()
+        self._promotion_worker: Optional[threading.Thread] = None
+        self._promotion_lock = threading.Lock()
+        # Either a dspy LM used for this module's calls, or a backend object with
+        # generate_feedback/analyze_feedback methods (e.g. TemplateFeedbackBackend)
+        self.lm = lm
+        self.backend = backend
+        self.cache = cache if cache is not None else FeedbackCache()
+        self.max_workers = max_workers
         
         # Define DSPy signatures
         self.generate_feedback = dspy.ChainOfThought("question, answer -> feedback")
         self.analyze_feedback = dspy.ChainOfThought("feedback, question, answer -> improvements")
         
+    def _backend_name(self) -> str:
+        """Identifies the model in cache keys so switching backends never serves stale results"""
+        if self.backend is not None:
+            return getattr(self.backend, 'name', type(self.backend).__name__)
+        lm = self.lm or dspy.settings.lm
+        return getattr(lm, 'model', type(lm).__name__)
+
+    def _run_stage(self, stage: str, **inputs: str) -> str:
+        """Run one feedback stage, memoized by a hash of the stage, model and inputs"""
+        key = FeedbackCache.key(stage, self._backend_name(), *(f"{k}={v}" for k, v in sorted(inputs.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if self.backend is not None:
+            value = getattr(self.backend, stage)(**inputs)
+        else:
+            predictor = getattr(self, stage)
+            output_field = 'feedback' if stage == 'generate_feedback' else 'improvements'
+            if self.lm is not None:
+                with dspy.context(lm=self.lm):
+                    value = getattr(predictor(**inputs), output_field)
+            else:
+                value = getattr(predictor(**inputs), output_field)
+        
+        self.cache.set(key, value)
+        return value
+        
     def collect_feedback(self, question: str, answer: str) -> Dict[str, Any]:
         """
         Collect feedback on the answer quality.
         """
         try:
-            # Generate feedback using DSPy
-            feedback = self.generate_feedback(
-                question=question,
-                answer=answer
-            )
+            # Generate feedback
+            feedback = self._run_stage('generate_feedback', question=question, answer=answer)
             
             # Analyze feedback for improvements
-            improvements = self.analyze_feedback(
-                feedback=feedback.feedback,
-                question=question,
-                answer=answer
-            )
+            improvements = self._run_stage('analyze_feedback', feedback=feedback, question=question, answer=answer)
             
             return {
                 'success': True,
-                'feedback': feedback.feedback,
-                'improvements': improvements.improvements,
+                'feedback': feedback,
+                'improvements': improvements,
                 'source': 'DSPy Feedback'
             }
             
@@ -54,6 +148,18 @@ class MathFeedback(dspy.Module):
                 'error': str(e)
             }
     
+    def collect_feedback_batch(self, pairs: List[Tuple[str, str]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Collect feedback for many (question, answer) pairs with bounded concurrency.
+
+        Duplicate pairs are only sent through the pipeline once; results come
+        back in the order of the input.
+        """
+        unique = list(dict.fromkeys(pairs))
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            results = dict(zip(unique, executor.map(lambda pair: self.collect_feedback(*pair), unique)))
+        return [results[pair] for pair in pairs]
+    
     def update_knowledge(self, feedback: Dict[str, Any]) -> bool:
         """
         Update knowledge base based on feedback.
@@ -65,40 +171,618 @@ class MathFeedback(dspy.Module):
             # Extract key information from feedback
             improvements = feedback['improvements']
             
-            # Update knowledge base with improvements
-            # This would typically involve updating the vector database
-            # For now, we'll just log the improvements
             self.logger.info(f"Knowledge base updates suggested: {improvements}")
             
+            # Promote answers that users rated well into the knowledge base; the
+            # promoter scans the feedback history, so it runs off the request path
+            self.schedule_promotion()
+            
             return True
             
         except Exception as e:
             self.logger.error(f"Error updating knowledge: {str(e)}")
             return False
 
-class FeedbackCollector:
-    def __init__(self):
-        self.feedback_file = 'feedback.json'
-        self.feedback = self._load_feedback()
+    def schedule_promotion(self):
+        """Ask the background worker for a promotion run; requests made during a run share the next one"""
+        with self._promotion_lock:
+            self._promotion_requested.set()
+            if self._promotion_worker is None:
+                self._promotion_worker = threading.Thread(target=self._promotion_loop, name="kb-promotion",
+                                                          daemon=True)
+                self._promotion_worker.start()
+
+    def _promotion_loop(self):
+        while True:
+            self._promotion_requested.wait()
+            self._promotion_requested.clear()
+            try:
+                if self.promoter is None:
+                    from promotion import KBPromoter
+                    self.promoter = KBPromoter(kb=self.kb)
+                summary = self.promoter.run()
+                self.logger.info(f"Promoted {summary['promoted']} feedback answers into the knowledge base")
+            except Exception as e:
+                self.logger.error(f"Error promoting feedback answers: {str(e)}")
+
+class FeedbackAggregates:
+    """Running feedback counters with rolling per-minute and per-hour buckets."""
+    FIELDS = ('accuracy', 'clarity', 'relevance')
+    # window name -> (bucket key, bucket width in seconds, buckets kept)
+    WINDOWS = {
+        'hour': ('minutes', 60, 60),
+        'day': ('hours', 3600, 24)
+    }
+
+    def __init__(self, data: Optional[Dict] = None):
+        self.data = data if data is not None else self.empty()
+
+    @classmethod
+    def empty(cls) -> Dict:
+        data = cls._counter()
+        data.update({'by_source': {}, 'minutes': {}, 'hours': {}})
+        return data
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict]) -> 'FeedbackAggregates':
+        """Rebuild the aggregates from existing entries (one pass)"""
+        aggregates = cls()
+        for entry in entries:
+            aggregates.add(entry)
+        return aggregates
+
+    @classmethod
+    def _counter(cls) -> Dict:
+        return {'total': 0, 'sums': {field: 0 for field in cls.FIELDS}}
+
+    @staticmethod
+    def entry_source(entry: Dict) -> str:
+        """Source an entry is attributed to in per-source breakdowns"""
+        answer = entry.get('answer')
+        answer_source = answer.get('source') if isinstance(answer, dict) else None
+        return entry.get('source') or answer_source or 'unknown'
+
+    def add(self, entry: Dict):
+        """Count one feedback entry"""
+        ratings = entry['user_feedback']
+        self._bump(self.data, ratings)
+        self._bump(self.data['by_source'].setdefault(self.entry_source(entry), self._counter()), ratings)
+
+        timestamp = datetime.fromisoformat(entry['timestamp']).timestamp()
+        for key, width, count in self.WINDOWS.values():
+            buckets = self.data[key]
+            bucket = int(timestamp // width)
+            self._bump(buckets.setdefault(str(bucket), self._counter()), ratings)
+            for stale in [b for b in buckets if int(b) <= bucket - count]:
+                del buckets[stale]
+
+    def _bump(self, counter: Dict, ratings: Dict):
+        counter['total'] += 1
+        for field in self.FIELDS:
+            counter['sums'][field] += ratings.get(field, 0)
+
+    @classmethod
+    def window_start(cls, window: str) -> Tuple[str, int]:
+        """Bucket key and first bucket number covered by a rolling window"""
+        if window not in cls.WINDOWS:
+            raise ValueError(f"Unknown window: {window}")
+        key, width, count = cls.WINDOWS[window]
+        return key, int(time.time() // width) - count + 1
+
+    def summary(self, window: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        """Summary over everything, a rolling window ('hour' or 'day'), or one source"""
+        if window is not None and source is not None:
+            raise ValueError("Summaries can be filtered by window or by source, not both")
+        if window is not None:
+            key, first = self.window_start(window)
+            counter = self._counter()
+            for bucket, bucket_counter in self.data[key].items():
+                if int(bucket) >= first:
+                    counter['total'] += bucket_counter['total']
+                    for field in self.FIELDS:
+                        counter['sums'][field] += bucket_counter['sums'][field]
+        elif source is not None:
+            counter = self.data['by_source'].get(source, self._counter())
+        else:
+            counter = self.data
+        return self.format_summary(counter['total'], counter['sums'])
+
+    @staticmethod
+    def format_summary(total: int, sums: Dict) -> Dict:
+        if not total:
+            return {
+                'total_feedback': 0,
+                'average_accuracy': 0,
+                'average_clarity': 0,
+                'average_relevance': 0
+            }
+        return {
+            'total_feedback': total,
+            'average_accuracy': sums['accuracy'] / total,
+            'average_clarity': sums['clarity'] / total,
+            'average_relevance': sums['relevance'] / total
+        }
+
+    def sources(self) -> List[str]:
+        return list(self.data['by_source'])
+
+def entry_rating(entry: Dict) -> float:
+    """Mean of the accuracy, clarity and relevance ratings of an entry"""
+    ratings = entry['user_feedback']
+    return sum(ratings.get(field, 0) for field in FeedbackAggregates.FIELDS) / len(FeedbackAggregates.FIELDS)
+
+# Per-response fields that are not part of the answer itself
+TRANSIENT_ANSWER_KEYS = ('feedback', 'final')
+
+def compact_answer(answer: Any) -> Any:
+    """The answer without per-response fields such as an embedded feedback entry"""
+    if isinstance(answer, dict):
+        return {key: value for key, value in answer.items() if key not in TRANSIENT_ANSWER_KEYS}
+    return answer
+
+def answer_hash(answer: Any) -> str:
+    """Content address of an answer: sha256 of its canonical JSON"""
+    data = json.dumps(answer, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+class FeedbackRecord:
+    """One feedback entry held in memory; the answer is referenced by its content hash."""
+    __slots__ = ('timestamp', 'question', 'answer_hash', 'source', 'accuracy', 'clarity', 'relevance', 'comments')
+
+    def __init__(self, timestamp: str, question: str, answer_hash: str, source: str,
+                 accuracy: float = 0, clarity: float = 0, relevance: float = 0, comments: str = ''):
+        self.timestamp = timestamp
+        self.question = question
+        self.answer_hash = answer_hash
+        # Sources repeat on every record, so share one string per source
+        self.source = sys.intern(source)
+        self.accuracy = accuracy
+        self.clarity = clarity
+        self.relevance = relevance
+        self.comments = comments
+
+    @classmethod
+    def from_entry(cls, entry: Dict, answer_hash: str) -> 'FeedbackRecord':
+        ratings = entry['user_feedback']
+        return cls(entry['timestamp'], entry['question'], answer_hash, FeedbackAggregates.entry_source(entry),
+                   ratings.get('accuracy', 0), ratings.get('clarity', 0), ratings.get('relevance', 0),
+                   ratings.get('comments', ''))
+
+    @property
+    def user_feedback(self) -> Dict:
+        return {'accuracy': self.accuracy, 'clarity': self.clarity,
+                'relevance': self.relevance, 'comments': self.comments}
+
+    @property
+    def rating(self) -> float:
+        return (self.accuracy + self.clarity + self.relevance) / len(FeedbackAggregates.FIELDS)
+
+    def to_json(self) -> Dict:
+        """Stored form, with the answer hash in place of the answer"""
+        return {'timestamp': self.timestamp, 'question': self.question, 'answer_hash': self.answer_hash,
+                'source': self.source, 'user_feedback': self.user_feedback}
+
+    def to_entry(self, answers: Dict[str, Any]) -> Dict:
+        """The full feedback entry as returned by FeedbackCollector"""
+        return {'timestamp': self.timestamp, 'question': self.question, 'answer': answers.get(self.answer_hash),
+                'source': self.source, 'user_feedback': self.user_feedback}
+
+class AnswerStore:
+    """Content-addressed answers in an append-only JSONL file, one line per distinct answer."""
+
+    def __init__(self, answers_file: str = 'feedback_answers.jsonl'):
+        self.answers_file = answers_file
+        self._lock = threading.Lock()
+        self.answers: Dict[str, Any] = {}
+        if os.path.exists(answers_file):
+            with open(answers_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.answers[record['hash']] = record['answer']
+
+    def put(self, answer: Any) -> str:
+        """Store an answer if it is new and return its hash"""
+        answer = compact_answer(answer)
+        key = answer_hash(answer)
+        if key not in self.answers:
+            with self._lock:
+                if key not in self.answers:
+                    with open(self.answers_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps({'hash': key, 'answer': answer}, ensure_ascii=False) + '\n')
+                    self.answers[key] = answer
+        return key
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.answers.get(key)
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+class JsonFeedbackStore:
+    """
+    Feedback kept in a single JSON document (the original feedback.json format).
+
+    Each distinct answer is stored once under 'answers' and entries refer to
+    it by hash. Files with answers embedded in every entry are still read and
+    are written back in the compact form.
+    """
+
+    def __init__(self, feedback_file: str = 'feedback.json'):
+        self.feedback_file = feedback_file
+        self._lock = threading.Lock()
+        self.records: List[FeedbackRecord] = []
+        self.answers: Dict[str, Any] = {}
+        self.aggregates = FeedbackAggregates(self._load_feedback())
         
     def _load_feedback(self) -> Dict:
-        """Load feedback from file"""
+        """Load feedback from file and return the stored aggregates"""
         if os.path.exists(self.feedback_file):
             with open(self.feedback_file, 'r') as f:
-                return json.load(f)
-        return {'entries': []}
+                feedback = json.load(f)
+        else:
+            feedback = {'entries': []}
+        self.answers = feedback.get('answers', {})
+        for entry in feedback['entries']:
+            if 'answer_hash' not in entry:
+                entry = {**entry, 'answer': compact_answer(entry.get('answer'))}
+                entry['answer_hash'] = self._intern_answer(entry['answer'])
+            self.records.append(FeedbackRecord.from_entry(entry, entry['answer_hash']))
+        if 'aggregates' not in feedback:
+            # Files written before running aggregates existed are counted once here
+            return FeedbackAggregates.from_entries(feedback['entries']).data
+        return feedback['aggregates']
         
     def _save_feedback(self):
         """Save feedback to file"""
         with open(self.feedback_file, 'w') as f:
-            json.dump(self.feedback, f, indent=2)
+            json.dump({
+                'entries': [record.to_json() for record in self.records],
+                'answers': self.answers,
+                'aggregates': self.aggregates.data
+            }, f, indent=2)
+
+    def _intern_answer(self, answer: Any) -> str:
+        key = answer_hash(answer)
+        self.answers.setdefault(key, answer)
+        return key
+
+    def add(self, entry: Dict):
+        # Router may be called from several threads (Streamlit, load tests)
+        with self._lock:
+            key = self._intern_answer(compact_answer(entry['answer']))
+            self.records.append(FeedbackRecord.from_entry(entry, key))
+            self.aggregates.add(entry)
+            self._save_feedback()
+
+    def _entries(self, records) -> List[Dict]:
+        return [record.to_entry(self.answers) for record in records]
+
+    def summary(self, window: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        return self.aggregates.summary(window=window, source=source)
+
+    def sources(self) -> List[str]:
+        return self.aggregates.sources()
+
+    def recent(self, limit: int) -> List[Dict]:
+        return self._entries(self.records[-limit:])
+
+    def for_question(self, question: str, limit: Optional[int] = None) -> List[Dict]:
+        normalized = normalize_question(question)
+        matches = [record for record in reversed(self.records)
+                   if normalize_question(record.question) == normalized]
+        return self._entries(matches if limit is None else matches[:limit])
+
+    def lowest_rated(self, since: str, limit: int) -> List[Dict]:
+        recent = [record for record in self.records if record.timestamp >= since]
+        return self._entries(sorted(recent, key=lambda record: record.rating)[:limit])
+
+    def entries_after(self, position: int, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Entries written after a position returned by a previous call, and the new position"""
+        end = len(self.records) if limit is None else position + limit
+        records = self.records[position:end]
+        return self._entries(records), position + len(records)
+
+class SQLiteFeedbackStore:
+    """
+    Feedback kept in SQLite with indexes on timestamp, normalized question,
+    source and rating. WAL mode lets several processes write concurrently, and
+    the running aggregates live in a counters table updated with upserts.
+    Answers are stored once in the answers table, keyed by content hash.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            question TEXT NOT NULL,
+            normalized_question TEXT NOT NULL,
+            source TEXT NOT NULL,
+            answer_hash TEXT NOT NULL,
+            accuracy REAL NOT NULL,
+            clarity REAL NOT NULL,
+            relevance REAL NOT NULL,
+            rating REAL NOT NULL,
+            comments TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_feedback_question ON feedback (normalized_question, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_feedback_source ON feedback (source, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_feedback_rating ON feedback (rating, timestamp);
+        CREATE TABLE IF NOT EXISTS answers (
+            hash TEXT PRIMARY KEY,
+            answer TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS feedback_counters (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            accuracy REAL NOT NULL,
+            clarity REAL NOT NULL,
+            relevance REAL NOT NULL,
+            PRIMARY KEY (scope, key)
+        );
+    """
+
+    def __init__(self, feedback_file: str = 'feedback.db'):
+        self.feedback_file = feedback_file
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(feedback_file, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        tables = {row['name'] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(feedback)")]
+        if 'answer' in columns or 'feedback_legacy' in tables:
+            self._upgrade_answers('answer' in columns)
+        self.conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _legacy_answer(answer: Any) -> Any:
+        """Answer of an older row; text that is not JSON is kept as a plain string"""
+        try:
+            return compact_answer(json.loads(answer))
+        except (TypeError, ValueError):
+            return answer
+
+    def _upgrade_answers(self, rename: bool = True):
+        """
+        Move answers embedded in every feedback row of an older database into
+        the answers table. Everything runs in one transaction, so a failure
+        leaves the original table in place. Without rename the old rows are
+        already in feedback_legacy (left behind by an interrupted upgrade).
+        """
+        self.conn.create_function('compact_json', 1, lambda answer: json.dumps(self._legacy_answer(answer)),
+                                  deterministic=True)
+        self.conn.create_function('compact_hash', 1, lambda answer: answer_hash(self._legacy_answer(answer)),
+                                  deterministic=True)
+        # DDL does not open a transaction implicitly, and executescript() would commit it
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for index in ('timestamp', 'question', 'source', 'rating'):
+                self.conn.execute(f"DROP INDEX IF EXISTS idx_feedback_{index}")
+            if rename:
+                self.conn.execute("ALTER TABLE feedback RENAME TO feedback_legacy")
+            for statement in self.SCHEMA.split(';'):
+                if statement.strip():
+                    self.conn.execute(statement)
+            self.conn.execute("INSERT OR IGNORE INTO answers (hash, answer) "
+                              "SELECT compact_hash(answer), compact_json(answer) FROM feedback_legacy")
+            self.conn.execute(
+                "INSERT OR IGNORE INTO feedback (id, timestamp, question, normalized_question, source, answer_hash, "
+                "accuracy, clarity, relevance, rating, comments) "
+                "SELECT id, timestamp, question, normalized_question, source, compact_hash(answer), "
+                "accuracy, clarity, relevance, rating, comments FROM feedback_legacy"
+            )
+            self.conn.execute("DROP TABLE feedback_legacy")
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def add(self, entry: Dict):
+        self.add_many([entry])
+
+    def add_many(self, entries: List[Dict]) -> int:
+        """Insert entries and update the counters in one transaction"""
+        rows = []
+        answers = {}
+        increments = {}
+        latest = {}
+        for entry in entries:
+            ratings = entry['user_feedback']
+            values = [ratings.get(field, 0) for field in FeedbackAggregates.FIELDS]
+            source = FeedbackAggregates.entry_source(entry)
+            answer = compact_answer(entry['answer'])
+            key = answer_hash(answer)
+            if key not in answers:
+                answers[key] = json.dumps(answer)
+            rows.append((entry['timestamp'], entry['question'], normalize_question(entry['question']), source,
+                         key, *values, entry_rating(entry), ratings.get('comments', '')))
+
+            timestamp = datetime.fromisoformat(entry['timestamp']).timestamp()
+            keys = [('all', ''), ('source', source)]
+            for key, width, count in FeedbackAggregates.WINDOWS.values():
+                bucket = int(timestamp // width)
+                keys.append((key, str(bucket)))
+                latest[key] = max(latest.get(key, bucket), bucket)
+            for scope_key in keys:
+                counter = increments.setdefault(scope_key, [0, 0, 0, 0])
+                counter[0] += 1
+                for i, value in enumerate(values, 1):
+                    counter[i] += value
+
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO answers (hash, answer) VALUES (?, ?)", answers.items())
+            self.conn.executemany(
+                "INSERT INTO feedback (timestamp, question, normalized_question, source, answer_hash, "
+                "accuracy, clarity, relevance, rating, comments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.executemany(
+                "INSERT INTO feedback_counters (scope, key, total, accuracy, clarity, relevance) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (scope, key) DO UPDATE SET "
+                "total = total + excluded.total, accuracy = accuracy + excluded.accuracy, "
+                "clarity = clarity + excluded.clarity, relevance = relevance + excluded.relevance",
+                [(scope, key, *counter) for (scope, key), counter in increments.items()]
+            )
+            # Drop buckets that have rolled out of their window
+            for key, width, count in FeedbackAggregates.WINDOWS.values():
+                if key in latest:
+                    self.conn.execute(
+                        "DELETE FROM feedback_counters WHERE scope = ? AND CAST(key AS INTEGER) <= ?",
+                        (key, latest[key] - count)
+                    )
+        return len(entries)
+
+    def summary(self, window: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        if window is not None and source is not None:
+            raise ValueError("Summaries can be filtered by window or by source, not both")
+        query = ("SELECT COALESCE(SUM(total), 0) AS total, SUM(accuracy) AS accuracy, "
+                 "SUM(clarity) AS clarity, SUM(relevance) AS relevance FROM feedback_counters ")
+        if window is not None:
+            key, first = FeedbackAggregates.window_start(window)
+            query += "WHERE scope = ? AND CAST(key AS INTEGER) >= ?"
+            params = (key, first)
+        elif source is not None:
+            query += "WHERE scope = 'source' AND key = ?"
+            params = (source,)
+        else:
+            query += "WHERE scope = 'all'"
+            params = ()
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+        sums = {field: row[field] for field in FeedbackAggregates.FIELDS}
+        return FeedbackAggregates.format_summary(row['total'], sums)
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT key FROM feedback_counters WHERE scope = 'source'").fetchall()
+        return [row['key'] for row in rows]
+
+    def _select(self, where: str, params: Tuple, order: str, limit: Optional[int]) -> List[Dict]:
+        query = (f"SELECT feedback.*, answers.answer FROM feedback JOIN answers ON hash = answer_hash "
+                 f"{where} ORDER BY {order}")
+        if limit is not None:
+            query += " LIMIT ?"
+            params = params + (limit,)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    @staticmethod
+    def _to_entry(row: sqlite3.Row) -> Dict:
+        return {
+            'timestamp': row['timestamp'],
+            'question': row['question'],
+            'answer': json.loads(row['answer']),
+            'source': row['source'],
+            'user_feedback': {
+                'accuracy': row['accuracy'],
+                'clarity': row['clarity'],
+                'relevance': row['relevance'],
+                'comments': row['comments']
+            }
+        }
+
+    def recent(self, limit: int) -> List[Dict]:
+        entries = self._select("", (), "timestamp DESC, id DESC", limit)
+        return list(reversed(entries))
+
+    def for_question(self, question: str, limit: Optional[int] = None) -> List[Dict]:
+        return self._select("WHERE normalized_question = ?", (normalize_question(question),),
+                            "timestamp DESC", limit)
+
+    def lowest_rated(self, since: str, limit: int) -> List[Dict]:
+        return self._select("WHERE timestamp >= ?", (since,), "rating ASC, timestamp DESC", limit)
+
+    def entries_after(self, position: int, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Entries with a row id above position, and the highest row id returned"""
+        query = ("SELECT feedback.*, answers.answer FROM feedback JOIN answers ON hash = answer_hash "
+                 "WHERE id > ? ORDER BY id")
+        params = (position,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = params + (limit,)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        if not rows:
+            return [], position
+        return [self._to_entry(row) for row in rows], rows[-1]['id']
+
+def migrate_feedback(json_file: str = 'feedback.json', db_file: str = 'feedback.db') -> int:
+    """Copy every entry of a JSON feedback file into a SQLite feedback store"""
+    entries, _ = JsonFeedbackStore(json_file).entries_after(0)
+    return SQLiteFeedbackStore(db_file).add_many(entries)
+
+def compact_feedback_store(feedback_file: str = 'feedback.json'):
+    """Rewrite a JSON or SQLite feedback store with each answer stored once"""
+    if feedback_file.endswith(FeedbackCollector.SQLITE_SUFFIXES):
+        store = SQLiteFeedbackStore(feedback_file)
+        # Opening upgraded the schema; reclaim the space the embedded answers used
+        store.conn.execute("VACUUM")
+        store.conn.close()
+    else:
+        JsonFeedbackStore(feedback_file)._save_feedback()
+
+def compact_feedback_log(log_file: str = 'feedback_log.txt', answers_file: str = 'feedback_answers.jsonl') -> int:
+    """Replace the answer dicts in a FeedbackLogger log with "#<hash>" references; returns lines rewritten"""
+    answers = AnswerStore(answers_file)
+    rewritten = 0
+    tmp_file = log_file + '.tmp'
+    with open(log_file, 'r', encoding='utf-8', newline='') as src, \
+            open(tmp_file, 'w', encoding='utf-8', newline='') as dst:
+        for line in src:
+            parts = line.rstrip('\r\n').split('\t')
+            if len(parts) >= 5 and parts[2].startswith('A: {'):
+                try:
+                    answer = ast.literal_eval('\t'.join(parts[2:-2])[len('A: '):])
+                except (ValueError, SyntaxError):
+                    answer = None
+                if isinstance(answer, dict):
+                    line = '\t'.join(parts[:2] + [f"A: #{answers.put(answer)}"] + parts[-2:]) + '\n'
+                    rewritten += 1
+            dst.write(line)
+    os.replace(tmp_file, log_file)
+    return rewritten
+
+def compact_analysis_log(analysis_file: str = 'feedback_analysis.jsonl',
+                         answers_file: str = 'feedback_answers.jsonl') -> int:
+    """Replace the responses stored in an analysis log with "#<hash>" references; returns records rewritten"""
+    answers = AnswerStore(answers_file)
+    rewritten = 0
+    tmp_file = analysis_file + '.tmp'
+    with open(analysis_file, 'r', encoding='utf-8') as src, open(tmp_file, 'w', encoding='utf-8') as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            analysis = record.get('analysis', {})
+            if isinstance(analysis.get('response'), dict):
+                analysis['response'] = f"#{answers.put(analysis['response'])}"
+                rewritten += 1
+            dst.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(tmp_file, analysis_file)
+    return rewritten
+
+class FeedbackCollector:
+    SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, feedback_file: str = 'feedback.json'):
+        self.feedback_file = feedback_file
+        if feedback_file.endswith(self.SQLITE_SUFFIXES):
+            self.store = SQLiteFeedbackStore(feedback_file)
+        else:
+            self.store = JsonFeedbackStore(feedback_file)
             
-    def collect_feedback(self, question: str, answer: Dict, user_feedback: Dict) -> Dict:
+    def collect_feedback(self, question: str, answer: Dict, user_feedback: Dict,
+                         source: Optional[str] = None) -> Dict:
         """Collect feedback for a question-answer pair"""
         feedback_entry = {
             'timestamp': datetime.now().isoformat(),
             'question': question,
             'answer': answer,
+            'source': source or FeedbackAggregates.entry_source({'answer': answer}),
             'user_feedback': {
                 'accuracy': user_feedback.get('accuracy', 0),
                 'clarity': user_feedback.get('clarity', 0),
@@ -107,41 +791,199 @@ class FeedbackCollector:
             }
         }
         
-        self.feedback['entries'].append(feedback_entry)
-        self._save_feedback()
+        with telemetry.span('feedback_write'):
+            self.store.add(feedback_entry)
         
         return feedback_entry
         
-    def get_feedback_summary(self) -> Dict:
-        """Get summary statistics of feedback"""
-        if not self.feedback['entries']:
-            return {
-                'total_feedback': 0,
-                'average_accuracy': 0,
-                'average_clarity': 0,
-                'average_relevance': 0
-            }
-            
-        total = len(self.feedback['entries'])
-        accuracy_sum = sum(entry['user_feedback']['accuracy'] for entry in self.feedback['entries'])
-        clarity_sum = sum(entry['user_feedback']['clarity'] for entry in self.feedback['entries'])
-        relevance_sum = sum(entry['user_feedback']['relevance'] for entry in self.feedback['entries'])
+    def get_feedback_summary(self, window: Optional[str] = None, source: Optional[str] = None) -> Dict:
+        """
+        Get summary statistics of feedback from the running aggregates.
+
+        window may be 'hour' or 'day' to only count recent feedback, and source
+        restricts the summary to one answer source (e.g. 'Knowledge Base').
+        """
+        return self.store.summary(window=window, source=source)
         
-        return {
-            'total_feedback': total,
-            'average_accuracy': accuracy_sum / total,
-            'average_clarity': clarity_sum / total,
-            'average_relevance': relevance_sum / total
-        }
+    def get_source_breakdown(self) -> Dict[str, Dict]:
+        """Get a feedback summary for every answer source"""
+        return {source: self.store.summary(source=source) for source in self.store.sources()}
         
     def get_recent_feedback(self, limit: int = 5) -> List[Dict]:
         """Get recent feedback entries"""
-        return self.feedback['entries'][-limit:]
+        return self.store.recent(limit)
+
+    def get_feedback_for_question(self, question: str, limit: Optional[int] = None) -> List[Dict]:
+        """Get all feedback for a question (matched after normalization), newest first"""
+        return self.store.for_question(question, limit)
+
+    def get_lowest_rated(self, days: float = 7, limit: int = 10) -> List[Dict]:
+        """Get the lowest-rated answers from the last few days"""
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        return self.store.lowest_rated(since, limit)
+
+class AnalysisLog:
+    """
+    Append-only JSON-lines store for feedback analysis records.
+
+    Only byte offsets and timestamps are kept in memory. New lines written by
+    this or another process are picked up incrementally, so reads never
+    re-parse the whole history. Lines that are not valid records are logged
+    and skipped. Several processes may append, so file order is not
+    timestamp order; the timestamp index is kept sorted separately.
+    """
+
+    def __init__(self, path: str = "feedback_analysis.jsonl", legacy_path: Optional[str] = "feedback_analysis.json"):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Offsets in file order, and (timestamp, offset) pairs in timestamp order
+        self._offsets: List[int] = []
+        self._by_time: List[Tuple[str, int]] = []
+        self._end = 0
+        self._migrate_legacy()
+        self.refresh()
+
+    def _migrate_legacy(self):
+        """One-time conversion of the old JSON array file into the log"""
+        if os.path.exists(self.path) or not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Could not migrate {self.legacy_path}: {str(e)}")
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self.logger.info(f"Migrated {len(records)} analysis records from {self.legacy_path} to {self.path}")
+
+    def refresh(self):
+        """Index any complete lines appended since the last read"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size < self._end:
+            # The file was replaced; index it again from the start
+            self._offsets, self._by_time, self._end = [], [], 0
+        if size == self._end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._end)
+            offset = self._end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line, picked up next time
+                if line.strip():
+                    self._index_line(line, offset)
+                offset += len(line)
+            self._end = offset
+
+    def _index_line(self, line: bytes, offset: int):
+        try:
+            timestamp = json.loads(line)["timestamp"]
+            if not isinstance(timestamp, str):
+                raise TypeError(f"timestamp is {type(timestamp).__name__}")
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Skipping bad record at byte {offset} of {self.path}: {str(e)}")
+            return
+        self._offsets.append(offset)
+        entry = (timestamp, offset)
+        if not self._by_time or entry >= self._by_time[-1]:
+            self._by_time.append(entry)
+        else:
+            bisect.insort(self._by_time, entry)
+
+    def append(self, records: List[Dict[str, Any]]):
+        """Append {'timestamp', 'analysis'} records with a single write"""
+        if not records:
+            return
+        with self._lock:
+            self._refresh()
+            data = b"".join((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records)
+            with open(self.path, "ab") as f:
+                f.write(data)
+        self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._offsets)
+
+    def read(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Read a page of records in insertion order (negative offsets count from the end)"""
+        with self._lock:
+            self._refresh()
+            offsets = self._offsets[offset:] if limit is None else self._offsets[offset:][:limit]
+        return self._read_at(offsets)
+
+    def read_range(self, start: Optional[Union[str, datetime]] = None,
+                   end: Optional[Union[str, datetime]] = None) -> List[Dict[str, Any]]:
+        """Read records with start <= timestamp < end, in timestamp order"""
+        with self._lock:
+            self._refresh()
+            lo = bisect.bisect_left(self._by_time, (self._iso(start),)) if start is not None else 0
+            hi = bisect.bisect_left(self._by_time, (self._iso(end),)) if end is not None else len(self._by_time)
+            offsets = [offset for _, offset in self._by_time[lo:hi]]
+        return self._read_at(offsets)
+
+    @staticmethod
+    def _iso(value: Union[str, datetime]) -> str:
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    def _read_at(self, offsets: List[int]) -> List[Dict[str, Any]]:
+        if not offsets:
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+class KeywordSentimentClassifier:
+    """
+    Deterministic stand-in for the sentiment pipeline.
+
+    Takes a batch of texts and returns one {'label', 'score'} dict per text,
+    so FeedbackLogger can run offline without downloading the model.
+    """
+    NEGATIVE_WORDS = ("helpful: false", "wrong", "incorrect", "missing", "bad", "confusing", "not")
+
+    def __call__(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        results = []
+        for text in texts:
+            hits = sum(1 for word in self.NEGATIVE_WORDS if word in text.lower())
+            if hits:
+                results.append({"label": "NEGATIVE", "score": min(0.5 + 0.1 * hits, 0.99)})
+            else:
+                results.append({"label": "POSITIVE", "score": 0.9})
+        return results
 
 class FeedbackLogger:
-    def __init__(self, log_file="feedback_log.txt"):
+    def __init__(self, log_file="feedback_log.txt", classifier: Optional[Callable[..., List[Dict[str, Any]]]] = None,
+                 batch_size: int = 16, max_latency: float = 0.5, analysis_file: str = "feedback_analysis.jsonl",
+                 answers_file: str = "feedback_answers.jsonl"):
         self.log_file = log_file
-        self.analyzer = pipeline("text-classification", model="distilbert-base-uncased-finetuned-sst-2-english")
+        # Responses are logged as "#<hash>" references into this store
+        self.answers = AnswerStore(answers_file)
+        self.analysis_log = AnalysisLog(analysis_file)
+        self.logger = logging.getLogger(__name__)
+        # The model is loaded by the analysis worker so it never blocks the caller
+        self.analyzer = classifier
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._analysis_worker, name="feedback-analysis", daemon=True)
+        self._worker.start()
         self._load_feedback_history()
 
     def _load_feedback_history(self):
@@ -151,8 +993,10 @@ class FeedbackLogger:
         except FileNotFoundError:
             self.feedback_history = []
 
-    def log_feedback(self, question: str, response: str, is_helpful: bool, comment: Optional[str] = None):
+    def log_feedback(self, question: str, response: Union[str, Dict], is_helpful: bool, comment: Optional[str] = None):
         timestamp = datetime.now().isoformat()
+        if isinstance(response, dict):
+            response = f"#{self.answers.put(response)}"
         feedback_entry = f"{timestamp}\tQ: {question}\tA: {response}\tHelpful: {is_helpful}\tComment: {comment or ''}\n"
         
         with open(self.log_file, "a", encoding="utf-8") as f:
@@ -162,45 +1006,108 @@ class FeedbackLogger:
         self._analyze_feedback(question, response, is_helpful, comment)
 
     def _analyze_feedback(self, question: str, response: str, is_helpful: bool, comment: Optional[str] = None):
-        """Analyze feedback using a local model to improve future responses."""
+        """Queue feedback for sentiment analysis by the background worker."""
         feedback_text = f"Helpful: {is_helpful}"
         if comment:
             feedback_text += f", Comment: {comment}"
 
-        # Analyze the sentiment of the feedback
-        sentiment = self.analyzer(feedback_text)[0]
-        
-        # Store analysis for future improvements
-        self._store_analysis({
-            "sentiment": sentiment["label"],
-            "confidence": sentiment["score"],
+        self._queue.put({
+            "timestamp": datetime.now().isoformat(),
             "feedback": feedback_text,
             "question": question,
             "response": response
         })
 
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued feedback event has been analyzed and stored."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _analysis_worker(self):
+        """Collect queued feedback into micro-batches by size or latency budget."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._analyze_batch(batch)
+            except Exception as e:
+                self.logger.error(f"Error analyzing feedback batch: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _analyze_batch(self, batch: List[Dict[str, Any]]):
+        """Run one classifier call over the batch and store the results."""
+        if self.analyzer is None:
+            # Imported here: transformers takes about a second to import
+            from transformers import pipeline
+            self.analyzer = pipeline("text-classification", model="distilbert-base-uncased-finetuned-sst-2-english")
+
+        # Analyze the sentiment of all feedback texts in one call
+        texts = [item["feedback"] for item in batch]
+        sentiments = self.analyzer(texts, batch_size=len(texts))
+        
+        # Store analysis for future improvements
+        self._store_analyses([
+            (item["timestamp"], {
+                "sentiment": sentiment["label"],
+                "confidence": sentiment["score"],
+                "feedback": item["feedback"],
+                "question": item["question"],
+                "response": item["response"]
+            })
+            for item, sentiment in zip(batch, sentiments)
+        ])
+
     def _store_analysis(self, analysis):
         """Store the analysis results for future reference."""
-        analysis_file = "feedback_analysis.json"
-        try:
-            with open(analysis_file, "r", encoding="utf-8") as f:
-                existing_analysis = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            existing_analysis = []
+        self._store_analyses([(datetime.now().isoformat(), analysis)])
 
-        existing_analysis.append({
-            "timestamp": datetime.now().isoformat(),
-            "analysis": analysis
-        })
+    def _store_analyses(self, analyses):
+        """Append a batch of (timestamp, analysis) results to the analysis log."""
+        self.analysis_log.append([
+            {"timestamp": timestamp, "analysis": analysis}
+            for timestamp, analysis in analyses
+        ])
 
-        with open(analysis_file, "w", encoding="utf-8") as f:
-            json.dump(existing_analysis, f, indent=2)
+    def get_improvements(self, offset: int = 0, limit: Optional[int] = None,
+                         since: Optional[Union[str, datetime]] = None) -> list:
+        """Get improvements based on feedback analysis, optionally paginated or since a time."""
+        if since is not None:
+            records = self.analysis_log.read_range(start=since)[offset:]
+            records = records if limit is None else records[:limit]
+        else:
+            records = self.analysis_log.read(offset, limit)
+        return [self._resolve_response(item["analysis"]) for item in records]
 
-    def get_improvements(self) -> list:
-        """Get the latest improvements based on feedback analysis."""
-        try:
-            with open("feedback_analysis.json", "r", encoding="utf-8") as f:
-                analysis_data = json.load(f)
-                return [item["analysis"] for item in analysis_data]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return [] 
\ No newline at end of file
+    def resolve_answer(self, response: Any) -> Any:
+        """The answer behind a logged "#<hash>" reference; other values are returned unchanged"""
+        if isinstance(response, str) and response.startswith('#'):
+            answer = self.answers.get(response[1:])
+            if answer is not None:
+                return answer
+        return response
+
+    def _resolve_response(self, analysis: Dict) -> Dict:
+        if 'response' in analysis:
+            return {**analysis, 'response': self.resolve_answer(analysis['response'])}
+        return analysis
+
+    def get_improvement_count(self) -> int:
+        """Number of analyzed feedback events, without reading them."""
+        return len(self.analysis_log)
@@ -1,10 +1,9 @@
 import streamlit as st
-from knowledge_base import KnowledgeBase
+from shared_kb import open_knowledge_base
 from router import WebSearch
 from router import Router
 from feedback import FeedbackLogger
 from guardrails import Guardrails
-import time
 
 # Page configuration
 st.set_page_config(
@@ -32,7 +31,7 @@ st.markdown("""
 # Initialize components
 @st.cache_resource
 def init_components():
-    kb = KnowledgeBase()
+    kb = open_knowledge_base(watch=True)
     websearch = WebSearch(app_id="7A5QRH-QWGRXU6QKU")
     router = Router(kb, websearch)
     feedback_logger = FeedbackLogger()
@@ -75,6 +74,23 @@ with st.sidebar:
         - Calculate ∫x²dx from 0 to 2
     """)
 
+def render_response(area, response):
+    """Render a (possibly partial) routed response into a placeholder"""
+    with area.container():
+        st.markdown("### Answer")
+        st.markdown(f"{response['answer']}")
+        
+        if 'steps' in response:
+            st.markdown("### Steps")
+            for i, step in enumerate(response['steps'], 1):
+                st.markdown(f"{i}. {step}")
+                
+        if 'source' in response:
+            st.info(f"Source: {response['source']}")
+        
+        if not response.get('final', True):
+            st.caption("Checking the web for a more detailed answer...")
+
 # Main content
 main_col1, main_col2 = st.columns([2, 1])
 
@@ -92,44 +108,41 @@ with main_col1:
         if not is_valid:
             st.error(f"⚠️ {error_msg}")
         else:
-            with st.spinner("Thinking..."):
-                # Add slight delay for better UX
-                time.sleep(0.5)
-                try:
-                    response = router.route(user_input)
-                    
-                    # Store in session state
-                    st.session_state['last_question'] = user_input
-                    st.session_state['last_response'] = response
-                    
-                    # Display answer
-                    st.markdown("### Answer")
-                    st.markdown(f"{response['answer']}")
-                    
-                    if 'steps' in response:
-                        st.markdown("### Steps")
-                        for i, step in enumerate(response['steps'], 1):
-                            st.markdown(f"{i}. {step}")
+            try:
+                # Streamlit reruns this script on every interaction (including the
+                # feedback buttons), so answers are cached per question
+                cached_responses = st.session_state.setdefault('responses', {})
+                response = cached_responses.get(user_input)
+                answer_area = st.empty()
+                
+                if response is None:
+                    with st.spinner("Thinking..."):
+                        for response in router.route_stream(user_input):
+                            render_response(answer_area, response)
+                    cached_responses[user_input] = response
+                else:
+                    render_response(answer_area, response)
+                
+                # Store in session state
+                st.session_state['last_question'] = user_input
+                st.session_state['last_response'] = response
+                
+                # Feedback section
+                st.markdown("### Was this answer helpful?")
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("👍 Yes", key="yes"):
+                        feedback_logger.log_feedback(user_input, response, True)
+                        st.success("Thank you for your feedback!")
+                with col2:
+                    if st.button("👎 No", key="no"):
+                        feedback = st.text_area("What was wrong or missing?")
+                        if feedback:
+                            feedback_logger.log_feedback(user_input, response, False, feedback)
+                            st.info("Thank you for your feedback!")
                             
-                    if 'source' in response:
-                        st.info(f"Source: {response['source']}")
-                    
-                    # Feedback section
-                    st.markdown("### Was this answer helpful?")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("👍 Yes", key="yes"):
-                            feedback_logger.log_feedback(user_input, response, True)
-                            st.success("Thank you for your feedback!")
-                    with col2:
-                        if st.button("👎 No", key="no"):
-                            feedback = st.text_area("What was wrong or missing?")
-                            if feedback:
-                                feedback_logger.log_feedback(user_input, response, False, feedback)
-                                st.info("Thank you for your feedback!")
-                                
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)} ")
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)} ")
 
 with main_col2:
     if 'last_response' in st.session_state and st.session_state['last_response']:
@@ -137,10 +150,10 @@ with main_col2:
         st.markdown(f"Q: {st.session_state['last_question']}")
         
         # Display feedback stats if available
-        stats = feedback_logger.get_improvements()
+        stats = feedback_logger.get_improvement_count()
         if stats:
             st.markdown("### Feedback Statistics")
-            st.markdown(f"Total questions answered: {len(stats)}")
+            st.markdown(f"Total questions answered: {stats}")
             # Add more stats as needed
 
 # Footer
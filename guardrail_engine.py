@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+
+# Rules shared by Guardrails and AIGateway
+EMAIL_PATTERN = r"[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}"
+PHONE_PATTERN = r"\b\d{10,}\b"
+ADDRESS_KEYWORDS = ["street", "road", "avenue", "city", "zip", "postal", "country"]
+
+# Allow more math topics and keywords
+ALLOWED_TOPICS = [
+    "math", "algebra", "geometry", "calculus", "trigonometry", "probability", "statistics",
+    "number theory", "equation", "function", "integral", "derivative", "matrix", "vector",
+    "education", "mathematics", "JEE", "exam", "problem", "solution", "proof",
+    "area", "volume", "triangle", "circle", "sphere", "determinant", "sin", "cos", "tan",
+    "solve", "find", "calculate", "compute", "value", "formula", "theorem"
+]
+MATH_SYMBOLS = ['+', '-', '*', '/', '=', '^', '√', 'π', 'sin', 'cos', 'tan', 'log', 'ln']
+
+# AIGateway matches these as whole words, plus any single operator/digit character
+GATEWAY_MATH_WORDS = [
+    "derivative", "integral", "limit", "solve", "equation", "function", "matrix", "vector",
+    "calculus", "algebra", "geometry", "trigonometry",
+    "sin", "cos", "tan", "cot", "sec", "csc", "log", "ln", "exp"
+]
+GATEWAY_MATH_CHARS = list("0123456789+-*/^()[]{}")
+HARMFUL_WORDS = ["hack", "exploit", "bypass", "security"]
+ERROR_WORDS = ["error"]
+
+class KeywordMatcher:
+    """
+    Finds every keyword group present in a text, with one compiled
+    alternation per group so the scanning runs inside the regex engine.
+
+    Plain keywords match anywhere (like `keyword in text`); word keywords
+    only match between word boundaries (like r'\bkeyword\b').
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], word_keywords: Optional[Dict[str, Iterable[str]]] = None):
+        word_keywords = word_keywords or {}
+        self.patterns: List[Tuple[str, Pattern]] = []
+        for group in list(keywords) + [group for group in word_keywords if group not in keywords]:
+            alternatives = []
+            if keywords.get(group):
+                alternatives.append(self._alternation(keywords[group]))
+            if word_keywords.get(group):
+                alternatives.append(rf"\b(?:{self._alternation(word_keywords[group])})\b")
+            if alternatives:
+                self.patterns.append((group, re.compile('|'.join(alternatives))))
+
+    @staticmethod
+    def _alternation(keywords: Iterable[str]) -> str:
+        keywords = {keyword.lower() for keyword in keywords}
+        # Single characters go in one character class, which the regex engine scans fastest
+        chars = ''.join(re.escape(keyword) for keyword in sorted(keywords) if len(keyword) == 1)
+        words = [re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True) if len(keyword) > 1]
+        return '|'.join(([f"[{chars}]"] if chars else []) + words)
+
+    def find_groups(self, text: str) -> set:
+        """Groups with at least one keyword in text (text should already be lowercased)"""
+        return {group for group, pattern in self.patterns if pattern.search(text)}
+
+class GuardrailEngine:
+    """
+    Compiled guardrail checks for Guardrails and AIGateway.
+
+    A text is lowercased once and scanned by the keyword matcher and the PII
+    patterns, and every verdict is derived from that scan. Repeated texts
+    are answered from a cache.
+    """
+
+    def __init__(self, cache_size: int = 1024, matcher: Optional[KeywordMatcher] = None):
+        # A prebuilt matcher (e.g. from a warm-start snapshot) skips the build
+        self.matcher = matcher or self.build_matcher()
+        self.email_pattern = re.compile(EMAIL_PATTERN)
+        self.phone_pattern = re.compile(PHONE_PATTERN)
+        # Guardrails and AIGateway usually check the same text back to back
+        self._scan = lru_cache(maxsize=cache_size)(self._scan_uncached)
+
+    @staticmethod
+    def build_matcher() -> KeywordMatcher:
+        return KeywordMatcher(
+            keywords={
+                'address': ADDRESS_KEYWORDS,
+                'topic': ALLOWED_TOPICS,
+                'math_symbol': MATH_SYMBOLS,
+                'gateway_math': GATEWAY_MATH_CHARS,
+                'harmful': HARMFUL_WORDS,
+                'error': ERROR_WORDS
+            },
+            word_keywords={'gateway_math': GATEWAY_MATH_WORDS}
+        )
+
+    def _scan_uncached(self, text: str) -> FrozenSet[str]:
+        groups = self.matcher.find_groups(text.lower())
+        # The email pattern backtracks over every word, so it only runs on texts with an '@'
+        if ('@' in text and self.email_pattern.search(text)) or self.phone_pattern.search(text):
+            groups.add('pii')
+        return frozenset(groups)
+
+    def check(self, text: str) -> Dict[str, bool]:
+        """Every guardrail verdict for a text"""
+        groups = self._scan(text)
+        return {
+            'contains_pii': 'pii' in groups or 'address' in groups,
+            'is_math_topic': 'math_symbol' in groups or 'topic' in groups,
+            'is_math_query': 'gateway_math' in groups,
+            'is_harmful': 'harmful' in groups,
+            'has_error': 'error' in groups,
+            'is_empty': not text.strip()
+        }
+
+    def check_many(self, texts: Iterable[str]) -> List[Dict[str, bool]]:
+        """Verdicts for a batch of texts"""
+        return [self.check(text) for text in texts]
+
+_default_engine: Optional[GuardrailEngine] = None
+
+def default_engine() -> GuardrailEngine:
+    """The engine shared by every Guardrails and AIGateway instance in the process"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = GuardrailEngine()
+    return _default_engine
+
+def set_default_engine(engine: GuardrailEngine):
+    """Replace the shared engine, e.g. with one built from a warm-start snapshot"""
+    global _default_engine
+    _default_engine = engine
@@ -1,54 +1,47 @@
 import re
-from typing import Tuple
+from typing import Dict, List, Tuple
+import guardrail_engine
+from guardrail_engine import default_engine
 
 class Guardrails:
     # Simple regex patterns for PII (can be extended)
-    EMAIL_PATTERN = re.compile(r"[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}")
-    PHONE_PATTERN = re.compile(r"\b\d{10,}\b")
-    ADDRESS_KEYWORDS = ["street", "road", "avenue", "city", "zip", "postal", "country"]
+    EMAIL_PATTERN = re.compile(guardrail_engine.EMAIL_PATTERN)
+    PHONE_PATTERN = re.compile(guardrail_engine.PHONE_PATTERN)
+    ADDRESS_KEYWORDS = guardrail_engine.ADDRESS_KEYWORDS
     
     # Allow more math topics and keywords
-    ALLOWED_TOPICS = [
-        "math", "algebra", "geometry", "calculus", "trigonometry", "probability", "statistics",
-        "number theory", "equation", "function", "integral", "derivative", "matrix", "vector",
-        "education", "mathematics", "JEE", "exam", "problem", "solution", "proof",
-        "area", "volume", "triangle", "circle", "sphere", "determinant", "sin", "cos", "tan",
-        "solve", "find", "calculate", "compute", "value", "formula", "theorem"
-    ]
+    ALLOWED_TOPICS = guardrail_engine.ALLOWED_TOPICS
 
     @staticmethod
     def contains_pii(text: str) -> bool:
-        if Guardrails.EMAIL_PATTERN.search(text):
-            return True
-        if Guardrails.PHONE_PATTERN.search(text):
-            return True
-        for word in Guardrails.ADDRESS_KEYWORDS:
-            if word in text.lower():
-                return True
-        return False
+        return default_engine().check(text)['contains_pii']
 
     @staticmethod
     def is_math_topic(text: str) -> bool:
-        text_lower = text.lower()
-        # Check for math symbols and operations
-        math_symbols = ['+', '-', '*', '/', '=', '^', '√', 'π', 'sin', 'cos', 'tan', 'log', 'ln']
-        if any(symbol in text_lower for symbol in math_symbols):
-            return True
-        # Check for math keywords
-        return any(topic in text_lower for topic in Guardrails.ALLOWED_TOPICS)
+        return default_engine().check(text)['is_math_topic']
 
-    @classmethod
-    def input_guardrail(cls, user_input: str) -> Tuple[bool, str]:
-        if cls.contains_pii(user_input):
+    @staticmethod
+    def _input_verdict(verdict: Dict[str, bool]) -> Tuple[bool, str]:
+        if verdict['contains_pii']:
             return False, "Input rejected: contains personal or sensitive information."
-        if not cls.is_math_topic(user_input):
+        if not verdict['is_math_topic']:
             return False, "Input rejected: only mathematics or education-related questions are allowed."
         return True, ""
 
+    @classmethod
+    def input_guardrail(cls, user_input: str) -> Tuple[bool, str]:
+        return cls._input_verdict(default_engine().check(user_input))
+
     @classmethod
     def output_guardrail(cls, response: str) -> Tuple[bool, str]:
-        if cls.contains_pii(response):
+        verdict = default_engine().check(response)
+        if verdict['contains_pii']:
             return False, "Output blocked: contains personal or sensitive information."
-        if not cls.is_math_topic(response):
+        if not verdict['is_math_topic']:
             return False, "Output blocked: only mathematics or education-related content is allowed."
-        return True, "" 
\ No newline at end of file
+        return True, ""
+
+    @classmethod
+    def check_many(cls, user_inputs: List[str]) -> List[Tuple[bool, str]]:
+        """Run the input guardrail over a batch of texts"""
+        return [cls._input_verdict(verdict) for verdict in default_engine().check_many(user_inputs)]
@@ -0,0 +1,202 @@
+"""
+Stream a question bank into the knowledge base.
+
+Records are read one at a time from JSONL or CSV files, validated,
+normalized and deduplicated against the questions already in the KB. The
+accepted entries are indexed in one batch and the KB file is written once at
+the end:
+
+    python ingest.py question_bank.jsonl
+    python ingest.py bank.csv --on-duplicate replace --dry-run
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from ai_gateway import AIGateway
+from knowledge_base import KnowledgeBase, normalize_question
+
+QUESTION_FIELDS = ('question', 'text', 'problem')
+ANSWER_FIELDS = ('answer', 'expected_answer', 'solution')
+MAX_QUESTION_LENGTH = 1000
+
+def read_records(path: str, file_format: Optional[str] = None) -> Iterator[Dict]:
+    """Yield raw records from a JSONL or CSV file ('-' reads JSONL from stdin)"""
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield {'_error': 'invalid JSON'}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def _first(record: Dict, fields: Iterable[str]):
+    for field in fields:
+        if record.get(field):
+            return record[field]
+    return None
+
+def _steps(value) -> List[str]:
+    """Steps as a list: JSON lists as they are, CSV cells split on '|' or new lines"""
+    if isinstance(value, list):
+        steps = value
+    elif isinstance(value, str):
+        text = value.strip()
+        if text.startswith('['):
+            try:
+                steps = json.loads(text)
+            except json.JSONDecodeError:
+                steps = [text]
+        else:
+            steps = text.replace('\n', '|').split('|')
+    else:
+        steps = []
+    return [' '.join(str(step).split()) for step in steps if str(step).strip()]
+
+class IngestStats:
+    def __init__(self):
+        self.read = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.replaced = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict:
+        return {
+            'read': self.read,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'replaced': self.replaced,
+            'seconds': round(self.elapsed, 3),
+            'records_per_second': round(self.read / self.elapsed, 1) if self.elapsed else 0
+        }
+
+class KBIngest:
+    """Generator pipeline from input records to knowledge base entries."""
+
+    def __init__(self, kb: Optional[KnowledgeBase] = None, gateway: Optional[AIGateway] = None,
+                 on_duplicate: str = 'skip', strict: bool = False, progress_every: float = 2.0):
+        self.logger = logging.getLogger(__name__)
+        self.kb = kb or KnowledgeBase()
+        self.gateway = gateway or AIGateway()
+        self.on_duplicate = on_duplicate
+        self.strict = strict
+        self.progress_every = progress_every
+        self.stats = IngestStats()
+
+    def normalize(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """Validate records and bring them into the stored entry form"""
+        for record in records:
+            self.stats.read += 1
+            question = _first(record, QUESTION_FIELDS)
+            answer = _first(record, ANSWER_FIELDS)
+            if not isinstance(question, str) or answer is None:
+                self.stats.rejected += 1
+                continue
+            question = ' '.join(question.split())
+            answer = ' '.join(str(answer).split())
+            if not question or len(question) > MAX_QUESTION_LENGTH or not answer:
+                self.stats.rejected += 1
+                continue
+            if not self.gateway.validate_output(answer)['valid']:
+                self.stats.rejected += 1
+                continue
+            if self.strict and not self.gateway.validate_input(question)['valid']:
+                self.stats.rejected += 1
+                continue
+            yield {'question': question, 'answer': answer, 'steps': _steps(record.get('steps'))}
+
+    def deduplicate(self, entries: Iterable[Dict]) -> Iterator[Dict]:
+        """Drop repeats within the input and, unless replacing, questions the KB already has"""
+        existing = {normalize_question(question): question for question in self.kb.knowledge_base}
+        seen = set()
+        for entry in entries:
+            key = normalize_question(entry['question'])
+            if key in seen:
+                self.stats.duplicates += 1
+                continue
+            seen.add(key)
+            if key in existing:
+                if self.on_duplicate != 'replace':
+                    self.stats.duplicates += 1
+                    continue
+                # Replace under the question text the KB already uses
+                entry['question'] = existing[key]
+                self.stats.replaced += 1
+            self.stats.accepted += 1
+            yield entry
+
+    def annotate(self, entries: Iterable[Dict], source: str) -> Iterator[Dict]:
+        ingested_at = datetime.now().isoformat()
+        for entry in entries:
+            entry['provenance'] = {'method': 'ingest', 'source': source, 'timestamp': ingested_at}
+            yield entry
+
+    def report_progress(self, entries: Iterable[Dict]) -> Iterator[Dict]:
+        last = time.perf_counter()
+        for entry in entries:
+            yield entry
+            now = time.perf_counter()
+            if now - last >= self.progress_every:
+                last = now
+                self.logger.info(f"{self.stats.read} read, {self.stats.accepted} accepted, "
+                                 f"{self.stats.read / self.stats.elapsed:.0f} records/s")
+
+    def run(self, paths: List[str], file_format: Optional[str] = None, dry_run: bool = False) -> Dict:
+        """Ingest every file and write the knowledge base once"""
+        def pipeline() -> Iterator[Dict]:
+            for path in paths:
+                records = read_records(path, file_format)
+                yield from self.annotate(self.normalize(records), os.path.basename(path))
+
+        entries = self.report_progress(self.deduplicate(pipeline()))
+        if dry_run:
+            for _ in entries:
+                pass
+        else:
+            self.kb.add_entries(entries)
+            self.kb.prepare()
+        summary = self.stats.as_dict()
+        summary['kb_entries'] = len(self.kb.knowledge_base)
+        return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a JSONL/CSV question bank into the knowledge base")
+    parser.add_argument('paths', nargs='+', help="Input files ('-' for JSONL on stdin)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Input format (default: from the extension)")
+    parser.add_argument('--kb-file', default='math_kb.json')
+    parser.add_argument('--on-duplicate', choices=['skip', 'replace'], default='skip',
+                        help="What to do with questions the KB already has")
+    parser.add_argument('--strict', action='store_true', help="Also reject questions that fail input validation")
+    parser.add_argument('--dry-run', action='store_true', help="Validate and count without writing the KB")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    ingest = KBIngest(KnowledgeBase(args.kb_file), on_duplicate=args.on_duplicate, strict=args.strict)
+    summary = ingest.run(args.paths, args.format, dry_run=args.dry_run)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,63 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional
 import json
+import logging
 import os
+import threading
+import time
 from difflib import SequenceMatcher
+from minhash import MinHashLSH
+
+logger = logging.getLogger(__name__)
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for grouping: lowercase, single spaces, no trailing punctuation"""
+    return ' '.join(question.lower().split()).rstrip('?.! ')
+
+class _KBState(NamedTuple):
+    """Entries and the indexes derived from them, swapped as one unit"""
+    entries: Dict[str, Dict]
+    lowered: Dict[str, str]
 
 class KnowledgeBase:
-    def __init__(self):
-        self.kb_file = 'math_kb.json'
-        self.knowledge_base = self._load_knowledge_base()
+    def __init__(self, kb_file: str = 'math_kb.json', retrieval: str = 'auto', lsh_min_entries: int = 50000,
+                 max_candidates: int = 500):
+        self.kb_file = kb_file
+        # 'exact' compares against every question, 'lsh' only against MinHash-LSH
+        # candidates, and 'auto' switches to LSH once the KB has lsh_min_entries questions
+        self.retrieval = retrieval
+        self.lsh_min_entries = lsh_min_entries
+        self.max_candidates = max_candidates
+        self.lsh_file = os.path.splitext(kb_file)[0] + '.minhash.npz'
+        self._lsh: Optional[MinHashLSH] = None
+        self._write_lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._signature = self._file_signature()
+        self._state = self._build_state(self._load_knowledge_base())
+        
+    def __getstate__(self) -> Dict:
+        # Locks and the watcher thread belong to one process; warm-start
+        # snapshots only carry the loaded entries and indexes
+        state = self.__dict__.copy()
+        del state['_write_lock'], state['_watcher']
+        return state
+        
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._write_lock = threading.RLock()
+        self._watcher = None
+        
+    @property
+    def knowledge_base(self) -> Dict:
+        return self._state.entries
+        
+    @knowledge_base.setter
+    def knowledge_base(self, entries: Dict):
+        self._state = self._build_state(entries)
+        self._lsh = None
+        
+    @staticmethod
+    def _build_state(entries: Dict) -> _KBState:
+        return _KBState(entries, {question: question.lower() for question in entries})
         
     def _load_knowledge_base(self) -> Dict:
         """Load the knowledge base from file"""
@@ -17,32 +68,200 @@ class KnowledgeBase:
         
     def _save_knowledge_base(self):
         """Save the knowledge base to file"""
-        with open(self.kb_file, 'w') as f:
+        # Written to a temporary file first so watchers and other processes
+        # never read a half-written knowledge base
+        tmp_file = self.kb_file + '.tmp'
+        with open(tmp_file, 'w') as f:
             json.dump(self.knowledge_base, f, indent=2)
+        os.replace(tmp_file, self.kb_file)
+        if self._lsh is not None:
+            self._lsh.save(self.lsh_file)
+        # Our own write is not an external change
+        self._signature = self._file_signature()
             
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.kb_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+        
     def _similarity(self, a: str, b: str) -> float:
         """Calculate similarity between two strings"""
         return SequenceMatcher(None, a.lower(), b.lower()).ratio()
         
-    def add_entry(self, question: str, answer: str, steps: List[str]):
+    def _apply(self, updates: Dict[str, Dict], removed: Iterable[str] = ()):
+        """
+        Publish a new state with some entries replaced or removed.
+
+        Unchanged entries and index items are shared with the previous state;
+        only the top-level containers are copied, so a query that already
+        holds the old state keeps reading a consistent view.
+        """
+        state = self._state
+        entries = dict(state.entries)
+        lowered = dict(state.lowered)
+        for question in removed:
+            entries.pop(question, None)
+            lowered.pop(question, None)
+        for question, entry in updates.items():
+            entries[question] = entry
+            if question not in lowered:
+                lowered[question] = question.lower()
+        if self._lsh is not None:
+            # Queries only accept candidates present in their own state, so the
+            # index may run ahead of the state swap below
+            for question in removed:
+                self._lsh.remove(question)
+            self._lsh.add_many(list(updates))
+        self._state = _KBState(entries, lowered)
+        
+    def _use_lsh(self, state: _KBState) -> bool:
+        return self.retrieval == 'lsh' or (self.retrieval == 'auto' and len(state.entries) >= self.lsh_min_entries)
+        
+    def _lsh_index(self) -> MinHashLSH:
+        """The MinHash-LSH index, loaded from lsh_file or built on first use"""
+        if self._lsh is None:
+            with self._write_lock:
+                if self._lsh is None:
+                    self._lsh = self._load_lsh()
+        return self._lsh
+        
+    def prepare(self):
+        """Build (or load) the retrieval index now instead of on the first query"""
+        if self._use_lsh(self._state):
+            self._lsh_index()
+        
+    def _load_lsh(self) -> MinHashLSH:
+        entries = self._state.entries
+        index = None
+        if os.path.exists(self.lsh_file):
+            try:
+                index = MinHashLSH.load(self.lsh_file)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Rebuilding {self.lsh_file}: {e}")
+        changed = index is None
+        index = index or MinHashLSH()
+        # Bring a persisted index in line with edits made while it was not loaded
+        stale = [question for question in index.ids if question not in entries]
+        missing = [question for question in entries if question not in index.ids]
+        for question in stale:
+            index.remove(question)
+        index.add_many(missing)
+        if changed or stale or missing:
+            index.save(self.lsh_file)
+        return index
+        
+    def add_entry(self, question: str, answer: str, steps: List[str], provenance: Optional[Dict] = None):
         """Add a new entry to the knowledge base"""
-        self.knowledge_base[question] = {
+        with self._write_lock:
+            self._apply({question: self._make_entry(answer, steps, provenance)})
+            self._save_knowledge_base()
+        
+    def add_entries(self, entries: Iterable[Dict]) -> int:
+        """Add many entries and save the knowledge base once"""
+        updates = {}
+        for entry in entries:
+            updates[entry['question']] = self._make_entry(
+                entry['answer'], entry['steps'], entry.get('provenance')
+            )
+        if updates:
+            with self._write_lock:
+                self._apply(updates)
+                self._save_knowledge_base()
+        return len(updates)
+        
+    def _make_entry(self, answer: str, steps: List[str], provenance: Optional[Dict] = None) -> Dict:
+        """Build the stored form of an entry"""
+        entry = {
             'answer': answer,
             'steps': steps
         }
-        self._save_knowledge_base()
+        if provenance:
+            entry['provenance'] = provenance
+        return entry
+        
+    def reload(self) -> Dict[str, int]:
+        """
+        Pick up external edits to the knowledge base file.
+
+        The file is re-read only when its mtime or size changed, and only
+        added, changed and removed questions are applied.
+        """
+        with self._write_lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return {}
+            try:
+                new_entries = self._load_knowledge_base()
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                # Probably caught mid-write; the next check will try again
+                logger.warning(f"Could not reload {self.kb_file}: {e}")
+                return {}
+            current = self._state.entries
+            updates = {question: entry for question, entry in new_entries.items()
+                       if current.get(question) != entry}
+            removed = [question for question in current if question not in new_entries]
+            if updates or removed:
+                self._apply(updates, removed)
+            self._signature = signature
+        changes = {
+            'added': sum(1 for question in updates if question not in current),
+            'changed': sum(1 for question in updates if question in current),
+            'removed': len(removed)
+        }
+        logger.info(f"Reloaded {self.kb_file}: {changes}")
+        return changes
         
+    def watch(self, interval: float = 1.0):
+        """Reload in a background thread whenever the file changes"""
+        if self._watcher is not None:
+            return
+        
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except OSError as e:
+                    logger.warning(f"Knowledge base reload failed: {e}")
+        
+        self._watcher = threading.Thread(target=poll, name='kb-watcher', daemon=True)
+        self._watcher.start()
+        
+    def candidate_score(self, question: str) -> Optional[float]:
+        """
+        Cheap estimate of how close the best stored question is (0-1), from
+        the LSH signatures. None when only the full scan in query() could tell.
+        """
+        state = self._state
+        if not state.entries:
+            return 0.0
+        if not self._use_lsh(state):
+            return None
+        return self._lsh_index().best_estimate(question)
+
     def query(self, question: str, threshold: float = 0.85) -> Optional[Dict]:
         """Query the knowledge base for similar questions"""
-        if not self.knowledge_base:
+        # One state for the whole query, even if a reload swaps it meanwhile
+        state = self._state
+        if not state.entries:
             return None
             
+        if self._use_lsh(state):
+            lowered = state.lowered
+            candidates = self._lsh_index().candidates(question, self.max_candidates)
+            items = [(candidate, lowered[candidate]) for candidate in candidates if candidate in lowered]
+        else:
+            items = state.lowered.items()
+            
         # Find the most similar question
         best_match = None
         best_similarity = 0
+        question_lower = question.lower()
         
-        for stored_question in self.knowledge_base:
-            similarity = self._similarity(question, stored_question)
+        for stored_question, stored_lower in items:
+            similarity = SequenceMatcher(None, question_lower, stored_lower).ratio()
             if similarity > best_similarity:
                 best_similarity = similarity
                 best_match = stored_question
@@ -52,7 +271,7 @@ class KnowledgeBase:
             
         return {
             'question': best_match,
-            'answer': self.knowledge_base[best_match]['answer'],
-            'steps': self.knowledge_base[best_match]['steps'],
+            'answer': state.entries[best_match]['answer'],
+            'steps': state.entries[best_match]['steps'],
             'similarity': best_similarity
-        } 
\ No newline at end of file
+        }
@@ -1,35 +1,96 @@
-from knowledge_base import KnowledgeBase
+from admission import AdmissionController, Overloaded, default_admission, CHEAP, EXPENSIVE
+from shared_kb import open_knowledge_base
 from websearch import WebSearch
 from ai_gateway import AIGateway
 from feedback import FeedbackCollector
+from planner import (QueryFeatures, QueryPlanner, extract_features, KNOWLEDGE_BASE, NO_SOURCE, OVERLOADED, REJECTED,
+                     SOURCES, WEB_SEARCH)
+from symbolic import SymbolicSolver
+from telemetry import telemetry
 from typing import Dict, Union, List, Optional
+from warm_start import default_warm_start
 import json
+import time
 import numpy as np
 import sympy as sp
 from sympy import symbols, solve, diff, integrate, limit, sin, cos, tan, log, exp, pi
 
 class MathAgent:
-    def __init__(self):
-        self.kb = KnowledgeBase()
+    def __init__(self, admission: Optional[AdmissionController] = None, planner: Optional[QueryPlanner] = None):
+        warm_start = default_warm_start()
+        # Before AIGateway, which keeps the engine installed at construction
+        warm_start.install_guardrails()
+        self.kb = open_knowledge_base()
         self.websearch = WebSearch()
         self.gateway = AIGateway()
         self.feedback = FeedbackCollector()
+        self.admission = admission or default_admission()
+        self.planner = planner or QueryPlanner()
+        # Only its patterns are used, to classify questions for the planner
+        self.symbolic = SymbolicSolver()
+        self.evaluator = self.symbolic.evaluator
+        warm_start.attach(evaluator=self.evaluator, planner=self.planner)
         self.x, self.y, self.z = symbols('x y z')
         
-    def process_question(self, question: str) -> Dict:
-        """Process a mathematical question"""
+    def process_question(self, question: str, priority: int = 0) -> Dict:
+        """Process a mathematical question (lower priority values are served first under load)"""
+        with telemetry.span('process_question'):
+            try:
+                result = self._process_question(question, priority)
+            except Overloaded as e:
+                telemetry.increment('requests_total', source=OVERLOADED)
+                result = {'error': str(e), 'source': 'overloaded'}
+        return result
+        
+    def _process_question(self, question: str, priority: int = 0) -> Dict:
         # Validate input
-        input_validation = self.gateway.validate_input(question)
+        with telemetry.span('validate_input'):
+            input_validation = self.gateway.validate_input(question)
         if not input_validation['valid']:
+            telemetry.increment('requests_total', source=REJECTED)
             return {
                 'error': input_validation['error']
             }
             
-        # Try knowledge base first
-        kb_result = self.kb.query(question)
+        # Try the answer paths in the planner's order
+        with telemetry.span('plan'):
+            features = extract_features(question, self.symbolic, self.kb)
+            stages = self.planner.plan(features, [KNOWLEDGE_BASE, WEB_SEARCH], parallel=False)
+        shed = None
+        for [path] in stages:
+            try:
+                result = self._try_path(path, question, features, priority)
+            except Overloaded as e:
+                shed = e
+                continue
+            if result:
+                # Responses keep the path name as their source; the counter uses the shared label
+                telemetry.increment('requests_total', source=SOURCES[path])
+                return result
+        if shed:
+            raise shed
+                
+        telemetry.increment('requests_total', source=NO_SOURCE)
+        return {
+            'error': 'Could not find a suitable answer'
+        }
+
+    def _try_path(self, path: str, question: str, features: QueryFeatures, priority: int) -> Optional[Dict]:
+        """Run one answer path in its admission pool and report the outcome to the planner"""
+        pool, handler = (CHEAP, self._knowledge_base_answer) if path == KNOWLEDGE_BASE else (EXPENSIVE, self._web_answer)
+        with self.admission.slot(pool, priority):
+            start = time.perf_counter()
+            result = handler(question)
+            self.planner.record(path, features, time.perf_counter() - start, result is not None)
+        return result
+
+    def _knowledge_base_answer(self, question: str) -> Optional[Dict]:
+        with telemetry.span('kb_query'):
+            kb_result = self.kb.query(question)
         if kb_result:
             # Validate output
-            output_validation = self.gateway.validate_output(kb_result['answer'])
+            with telemetry.span('validate_output'):
+                output_validation = self.gateway.validate_output(kb_result['answer'])
             if output_validation['valid']:
                 return {
                     'source': 'knowledge_base',
@@ -37,12 +98,15 @@ class MathAgent:
                     'steps': kb_result['steps'],
                     'similarity': kb_result['similarity']
                 }
-                
-        # If not in knowledge base, try web search
-        web_result = self.websearch.search(question)
+        return None
+
+    def _web_answer(self, question: str) -> Optional[Dict]:
+        with telemetry.span('web_search'):
+            web_result = self.websearch.search(question)
         if web_result:
             # Validate output
-            output_validation = self.gateway.validate_output(web_result['answer'])
+            with telemetry.span('validate_output'):
+                output_validation = self.gateway.validate_output(web_result['answer'])
             if output_validation['valid']:
                 return {
                     'source': 'web_search',
@@ -50,10 +114,7 @@ class MathAgent:
                     'steps': web_result['steps'],
                     'url': web_result['source']
                 }
-                
-        return {
-            'error': 'Could not find a suitable answer'
-        }
+        return None
         
     def collect_feedback(self, question: str, answer: Dict, user_feedback: Dict) -> Dict:
         """Collect feedback for a question-answer pair"""
@@ -70,9 +131,10 @@ class MathAgent:
             Dict: Solution and steps
         """
         try:
-            # Convert string equation to SymPy expression
-            eq = sp.sympify("Eq(" + equation.replace("=", ",") + ")")
-            solution = solve(eq)
+            with self.admission.slot(EXPENSIVE):
+                # Convert string equation to SymPy expression
+                eq = sp.sympify("Eq(" + equation.replace("=", ",") + ")")
+                solution = solve(eq)
             
             return {
                 "equation": equation,
@@ -93,8 +155,17 @@ class MathAgent:
             Union[float, str]: Result of the evaluation or error message
         """
         try:
-            result = sp.sympify(expression)
-            return float(result) if result.is_number else str(result)
+            with self.admission.slot(CHEAP):
+                # sympify evaluates arbitrary strings, so it only sees input within
+                # the evaluator's grammar that has free symbols; the rest is rejected
+                compiled = self.evaluator.compile(expression)
+                if compiled is None:
+                    return f"Error: unsupported expression {expression!r}"
+                if not compiled.variables:
+                    value = self.evaluator.evaluate(expression)
+                    return value if value is not None else f"Error: cannot evaluate {expression!r}"
+                result = sp.sympify(expression, locals={name: sp.Symbol(name) for name in compiled.variables})
+                return float(result) if result.is_number else str(result)
         except Exception as e:
             return f"Error: {str(e)}"
             
@@ -110,8 +181,9 @@ class MathAgent:
             Dict: Derivative and steps
         """
         try:
-            expr = sp.sympify(expression)
-            derivative = diff(expr, variable)
+            with self.admission.slot(CHEAP):
+                expr = sp.sympify(expression)
+                derivative = diff(expr, variable)
             
             return {
                 "expression": expression,
@@ -141,13 +213,14 @@ class MathAgent:
             Dict: Integral and steps
         """
         try:
-            expr = sp.sympify(expression)
-            if lower_limit is not None and upper_limit is not None:
-                integral = integrate(expr, (variable, lower_limit, upper_limit))
-                integral_type = "definite"
-            else:
-                integral = integrate(expr, variable)
-                integral_type = "indefinite"
+            with self.admission.slot(EXPENSIVE):
+                expr = sp.sympify(expression)
+                if lower_limit is not None and upper_limit is not None:
+                    integral = integrate(expr, (variable, lower_limit, upper_limit))
+                    integral_type = "definite"
+                else:
+                    integral = integrate(expr, variable)
+                    integral_type = "indefinite"
                 
             return {
                 "expression": expression,
@@ -176,8 +249,9 @@ class MathAgent:
             Dict: Limit and steps
         """
         try:
-            expr = sp.sympify(expression)
-            lim = limit(expr, variable, point)
+            with self.admission.slot(EXPENSIVE):
+                expr = sp.sympify(expression)
+                lim = limit(expr, variable, point)
             
             return {
                 "expression": expression,
@@ -211,6 +285,8 @@ def main():
             print(f"Average accuracy: {summary['average_accuracy']:.2f}")
             print(f"Average clarity: {summary['average_clarity']:.2f}")
             print(f"Average relevance: {summary['average_relevance']:.2f}")
+            recent = agent.feedback.get_feedback_summary(window='hour')
+            print(f"Feedback in the last hour: {recent['total_feedback']}")
             continue
             
         # Process the question
@@ -0,0 +1,56 @@
+"""
+Convert existing feedback history to content-addressed answer storage.
+
+Every answer is stored once (keyed by the hash of its content) and feedback
+records refer to it, instead of embedding a full copy per record:
+
+    python migrate_answers.py
+    python migrate_answers.py --feedback-file feedback.db --log-file feedback_log.txt
+"""
+import argparse
+import os
+from typing import Dict, List
+
+from feedback import compact_analysis_log, compact_feedback_log, compact_feedback_store
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def migrate(feedback_files: List[str], log_file: str, analysis_file: str, answers_file: str) -> Dict[str, Dict]:
+    """Compact every existing file and report its size before and after"""
+    report = {}
+    for path in feedback_files + [log_file, analysis_file]:
+        if os.path.exists(path):
+            report[path] = {'before': _size(path)}
+
+    for path in feedback_files:
+        if path in report:
+            compact_feedback_store(path)
+    if log_file in report:
+        report[log_file]['rewritten'] = compact_feedback_log(log_file, answers_file)
+    if analysis_file in report:
+        report[analysis_file]['rewritten'] = compact_analysis_log(analysis_file, answers_file)
+
+    for path, sizes in report.items():
+        sizes['after'] = _size(path)
+    report[answers_file] = {'after': _size(answers_file)}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Store feedback answers once, referenced by content hash")
+    parser.add_argument('--feedback-file', nargs='+', default=['feedback.json'],
+                        help="FeedbackCollector files (.json or .db)")
+    parser.add_argument('--log-file', default='feedback_log.txt', help="FeedbackLogger log file")
+    parser.add_argument('--analysis-file', default='feedback_analysis.jsonl', help="FeedbackLogger analysis log")
+    parser.add_argument('--answers-file', default='feedback_answers.jsonl', help="Answer store for the logs")
+    args = parser.parse_args()
+
+    report = migrate(args.feedback_file, args.log_file, args.analysis_file, args.answers_file)
+    for path, sizes in report.items():
+        line = f"{path}: {sizes.get('before', 0)} -> {sizes['after']} bytes"
+        if 'rewritten' in sizes:
+            line += f" ({sizes['rewritten']} records rewritten)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
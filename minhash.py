@@ -0,0 +1,253 @@
+"""
+MinHash signatures with LSH banding for approximate question lookup.
+
+Questions are lowercased and split into overlapping byte k-grams. Each
+question gets a signature of num_perm minimum hash values, and signatures are
+cut into bands; questions that agree on every row of at least one band
+become candidates. KnowledgeBase runs its exact similarity only on those
+candidates instead of the whole corpus.
+"""
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Prime just above 2**32: (a * x + b) mod PRIME is a universal hash family for
+# 32-bit x, and a * x + b stays below 2**64 for a, b < 2**32
+PRIME = np.uint64(4294967311)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+class MinHashLSH:
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if not 1 <= shingle <= 4:
+            raise ValueError("shingle must be between 1 and 4 bytes")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 2 ** 32 - 1, num_perm, dtype=np.uint64)
+
+        self.count = 0
+        self.questions: List[Optional[str]] = []
+        self.ids: Dict[str, int] = {}
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.band_keys = np.empty((0, bands), dtype=np.uint64)
+        # Bands of ids below _base are searched in sorted arrays, newer ids in _delta
+        self._base = 0
+        self._sorted: Tuple[List[np.ndarray], List[np.ndarray]] = ([], [])
+        self._delta: Dict[Tuple[int, int], List[int]] = {}
+
+    @classmethod
+    def from_arrays(cls, params: Sequence[int], signatures: np.ndarray, sorted_keys: Sequence[np.ndarray],
+                    orders: Sequence[np.ndarray], questions: Sequence[str]) -> 'MinHashLSH':
+        """
+        Read-only index over arrays built elsewhere, such as the ones
+        band_arrays() exported into a shared snapshot. questions can be any
+        sequence indexed by id.
+        """
+        index = cls(*params)
+        index.count = len(signatures)
+        index.questions = questions
+        index.signatures = signatures
+        index._sorted = (list(sorted_keys), list(orders))
+        index._base = index.count
+        return index
+
+    def __getstate__(self) -> Dict:
+        """Pickle only the used rows of the growable arrays"""
+        state = self.__dict__.copy()
+        state['signatures'] = self.signatures[:self.count]
+        state['band_keys'] = self.band_keys[:self.count]
+        return state
+
+    @property
+    def params(self) -> Tuple[int, int, int, int]:
+        return self.num_perm, self.bands, self.shingle, self.seed
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    def _shingle_codes(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """k-gram codes of every text, concatenated, and the number of k-grams per text"""
+        k = self.shingle
+        encoded = [f" {self.normalize(text)} ".encode('utf-8').ljust(k) for text in texts]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        codes = data[:len(data) - k + 1].copy()
+        for j in range(1, k):
+            codes = (codes << np.uint64(8)) | data[j:len(data) - k + 1 + j]
+
+        # Drop k-grams that straddle two texts
+        counts = lengths - k + 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        positions = np.repeat(starts - first, counts) + np.arange(counts.sum())
+        return codes[positions], counts
+
+    def signatures_for(self, texts: Sequence[str], chunk: int = 2000) -> np.ndarray:
+        """MinHash signatures, one row of num_perm uint32 values per text"""
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i in range(0, len(texts), chunk):
+            codes, counts = self._shingle_codes(texts[i:i + chunk])
+            hashed = ((np.outer(self.a, codes) + self.b[:, None]) % PRIME) & MAX_HASH
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            result[i:i + chunk] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        return result
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """One 64-bit key per band, combining the band's rows"""
+        rows = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = rows[:, :, 0].copy()
+        for j in range(1, self.rows):
+            keys = keys * BAND_MULTIPLIER + rows[:, :, j]
+        return keys
+
+    def _grow(self, extra: int):
+        needed = self.count + extra
+        if needed <= len(self.signatures):
+            return
+        capacity = max(needed, 2 * len(self.signatures), 1024)
+        signatures = np.empty((capacity, self.num_perm), dtype=np.uint32)
+        signatures[:self.count] = self.signatures[:self.count]
+        band_keys = np.empty((capacity, self.bands), dtype=np.uint64)
+        band_keys[:self.count] = self.band_keys[:self.count]
+        self.signatures, self.band_keys = signatures, band_keys
+
+    def add_many(self, questions: Sequence[str], signatures: Optional[np.ndarray] = None):
+        """Index new questions (already indexed ones are skipped)"""
+        seen = set()
+        keep = []
+        for i, question in enumerate(questions):
+            if question not in self.ids and question not in seen:
+                seen.add(question)
+                keep.append(i)
+        if not keep:
+            return
+        if len(keep) < len(questions):
+            questions = [questions[i] for i in keep]
+            signatures = signatures[keep] if signatures is not None else None
+        if signatures is None:
+            signatures = self.signatures_for(questions)
+        keys = self._band_keys(signatures)
+        self._grow(len(questions))
+        start = self.count
+        self.signatures[start:start + len(questions)] = signatures
+        self.band_keys[start:start + len(questions)] = keys
+        # Readers may look up ids as soon as they appear in a bucket, so the
+        # question list is extended first
+        self.questions.extend(questions)
+        for offset, question in enumerate(questions):
+            self.ids[question] = start + offset
+        self.count += len(questions)
+
+        if self.count - self._base > max(1000, self._base // 10):
+            self._rebuild_sorted()
+        else:
+            for offset, row in enumerate(keys.tolist()):
+                for band, key in enumerate(row):
+                    self._delta.setdefault((band, key), []).append(start + offset)
+
+    def add(self, question: str):
+        self.add_many([question])
+
+    def remove(self, question: str):
+        """Forget a question; its slot stays behind as a tombstone until the next save"""
+        index = self.ids.pop(question, None)
+        if index is not None:
+            self.questions[index] = None
+
+    def band_arrays(self) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Per band, the band keys in sorted order and the ids they belong to"""
+        if self._base != self.count:
+            self._rebuild_sorted()
+        return self._sorted
+
+    def _rebuild_sorted(self):
+        keys = self.band_keys[:self.count]
+        orders = [np.argsort(keys[:, band], kind='stable') for band in range(self.bands)]
+        sorted_keys = [keys[order, band] for band, order in enumerate(orders)]
+        # Publish the new arrays before clearing the delta they absorbed
+        self._sorted = (sorted_keys, orders)
+        self._base = self.count
+        self._delta = {}
+
+    def _candidate_ids(self, signature: np.ndarray) -> List[int]:
+        """Live ids sharing at least one band with a signature"""
+        keys = self._band_keys(signature[None, :])[0]
+        # The delta is read first: a concurrent rebuild publishes the sorted
+        # arrays before dropping the delta, so nothing is missed in between
+        delta = self._delta
+        sorted_keys, orders = self._sorted
+        ids = set()
+        for band, key in enumerate(keys):
+            if sorted_keys:
+                column = sorted_keys[band]
+                lo = np.searchsorted(column, key, side='left')
+                hi = np.searchsorted(column, key, side='right')
+                if hi > lo:
+                    ids.update(orders[band][lo:hi].tolist())
+            ids.update(delta.get((band, int(key)), ()))
+        questions = self.questions
+        return [i for i in ids if questions[i] is not None]
+
+    def candidate_ids(self, question: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Ids of the indexed questions sharing at least one band with the
+        question, in insertion order. With a limit, only the candidates whose
+        signatures agree with the question's most often (highest estimated
+        Jaccard similarity) are kept.
+        """
+        signature = self.signatures_for([question])[0]
+        ids = self._candidate_ids(signature)
+        if limit is not None and len(ids) > limit:
+            candidate_ids = np.array(ids)
+            agreement = (self.signatures[candidate_ids] == signature).sum(axis=1)
+            ids = candidate_ids[np.argpartition(-agreement, limit - 1)[:limit]].tolist()
+        return sorted(ids)
+
+    def candidates(self, question: str, limit: Optional[int] = None) -> List[str]:
+        """Indexed questions for candidate_ids()"""
+        ids = self.candidate_ids(question, limit)
+        questions = self.questions
+        return [questions[i] for i in ids]
+
+    def best_estimate(self, question: str) -> float:
+        """Highest estimated Jaccard similarity between the question and any candidate (0 if none)"""
+        signature = self.signatures_for([question])[0]
+        ids = self._candidate_ids(signature)
+        if not ids:
+            return 0.0
+        agreement = (self.signatures[np.array(ids)] == signature).sum(axis=1)
+        return float(agreement.max()) / self.num_perm
+
+    def save(self, path: str):
+        """Persist signatures and their questions (tombstones dropped) in one .npz file"""
+        live = [i for i in range(self.count) if self.questions[i] is not None]
+        encoded = [self.questions[i].encode('utf-8') for i in live]
+        offsets = np.concatenate(([0], np.cumsum([len(q) for q in encoded], dtype=np.int64)))
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, params=np.array(self.params, dtype=np.int64),
+                     signatures=self.signatures[live],
+                     questions=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+                     offsets=offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MinHashLSH':
+        with np.load(path) as data:
+            index = cls(*(int(value) for value in data['params']))
+            blob = data['questions'].tobytes()
+            offsets = data['offsets'].tolist()
+            questions = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+            index.add_many(questions, data['signatures'])
+        return index
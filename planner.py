@@ -0,0 +1,238 @@
+"""
+Cost-based planning of the answer paths.
+
+A question can be answered by the knowledge base, the local SymPy solver or
+the web. The planner estimates each path's latency and chance of answering
+from cheap features of the question (operation, expression tree size,
+polynomial degree, KB candidate score) and from the outcomes it has observed
+so far, then orders the paths by expected latency: cheapest per unit of
+success probability first. Two consecutive paths share a stage, and run
+concurrently, when the expected saving outweighs the work wasted if the
+first one answers.
+"""
+import ast
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+KNOWLEDGE_BASE = 'knowledge_base'
+SYMBOLIC = 'symbolic'
+WEB_SEARCH = 'web_search'
+# Display names of the answer sources; also the source labels of the
+# requests_total counter, so Router and MathAgent count a source once
+SOURCES = {KNOWLEDGE_BASE: "Knowledge Base", SYMBOLIC: "Symbolic Math", WEB_SEARCH: "Web Search"}
+OVERLOADED = "Overloaded"
+NO_SOURCE = "No Source"
+REJECTED = "Rejected"
+
+_IMPLICIT_PRODUCT = re.compile(r'(\d)\s*(?=[a-z(])')
+_TOKEN = re.compile(r'\w+|[^\s\w]')
+_CONSTANTS = frozenset({'pi', 'e', 'E', 'oo', 'I'})
+
+class QueryFeatures(NamedTuple):
+    operation: Optional[str]
+    tree_size: int
+    degree: Optional[int]
+    kb_score: Optional[float]
+
+    @property
+    def complexity(self) -> int:
+        """Coarse (log2) size bucket; non-polynomials count as degree 8"""
+        degree = 8 if self.degree is None else min(self.degree, 64)
+        return (self.tree_size + 4 * degree).bit_length()
+
+def _degree(node: ast.AST) -> Optional[int]:
+    """Polynomial degree of an expression tree, None if it is not a polynomial"""
+    if isinstance(node, ast.Constant):
+        return 0
+    if isinstance(node, ast.Name):
+        return 0 if node.id in _CONSTANTS else 1
+    if isinstance(node, ast.UnaryOp):
+        return _degree(node.operand)
+    if isinstance(node, ast.Call):
+        return 0 if all(_degree(arg) == 0 for arg in node.args) else None
+    if isinstance(node, ast.BinOp):
+        left, right = _degree(node.left), _degree(node.right)
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            return max(left, right)
+        if isinstance(node.op, ast.Mult):
+            return left + right
+        if isinstance(node.op, ast.Div):
+            return left if right == 0 else None
+        if isinstance(node.op, ast.Pow):
+            exponent = node.right
+            if isinstance(exponent, ast.Constant) and isinstance(exponent.value, int) and exponent.value >= 0:
+                return left * exponent.value
+            return 0 if left == 0 and right == 0 else None
+    return None
+
+def expression_features(text: str) -> Tuple[int, Optional[int]]:
+    """
+    Syntax tree size and polynomial degree of an expression (or both sides
+    of an equation). Text Python cannot parse falls back to its token count
+    and an unknown degree.
+    """
+    if not text:
+        return 0, 0
+    size = 0
+    degree: Optional[int] = 0
+    for side in text.replace('^', '**').split('='):
+        try:
+            tree = ast.parse(_IMPLICIT_PRODUCT.sub(r'\1*', side.strip()), mode='eval')
+            side_degree = _degree(tree.body)
+        except (SyntaxError, ValueError, RecursionError):
+            return len(_TOKEN.findall(text)), None
+        size += sum(1 for _ in ast.walk(tree.body))
+        degree = None if degree is None or side_degree is None else max(degree, side_degree)
+    return size, degree
+
+def extract_features(question: str, symbolic, kb=None) -> QueryFeatures:
+    """Features of a question, using the solver's patterns and the KB's cheap candidate score"""
+    operation, expression = symbolic.classify(question)
+    tree_size, degree = expression_features(expression)
+    candidate_score = getattr(kb, 'candidate_score', None)
+    kb_score = candidate_score(question) if candidate_score else None
+    return QueryFeatures(operation, tree_size, degree, kb_score)
+
+class _Outcomes:
+    __slots__ = ('count', 'successes', 'latency')
+
+    def __init__(self):
+        self.count = 0
+        self.successes = 0
+        self.latency = 0.0
+
+    def add(self, latency: float, success: bool, alpha: float):
+        self.count += 1
+        self.successes += success
+        # Running mean at first, exponential average once there is enough history
+        self.latency += max(alpha, 1 / self.count) * (latency - self.latency)
+
+class QueryPlanner:
+    """
+    Online latency and success estimates per path.
+
+    Observations are kept at several levels of detail (path, path and
+    operation, then a feature bucket such as expression complexity or KB
+    score); each level shrinks towards the one above it, so a rare kind of
+    question starts from the path's general behaviour and moves to its own
+    as outcomes come in.
+    """
+    # Cold-start guesses (seconds, probability), replaced by observations
+    PRIOR_LATENCY = {KNOWLEDGE_BASE: 0.002, SYMBOLIC: 0.05, WEB_SEARCH: 1.0}
+    PRIOR_SUCCESS = {KNOWLEDGE_BASE: 0.3, SYMBOLIC: 0.7, WEB_SEARCH: 0.7}
+    SYMBOLIC_LATENCY = {'arithmetic': 0.0001, 'area': 0.001, 'derivative': 0.01, 'equation': 0.05, 'limit': 0.2, 'integral': 0.3}
+    # Weight of a path's wasted work when it runs alongside a path that answers;
+    # a web search mostly waits on the network
+    PARALLEL_COST = {KNOWLEDGE_BASE: 1.0, SYMBOLIC: 1.0, WEB_SEARCH: 0.1}
+    PRIOR_WEIGHT = 4
+    LATENCY_ALPHA = 0.1
+    MIN_SUCCESS = 0.01
+
+    def __init__(self, hedge_cost: float = 1.0):
+        self.hedge_cost = hedge_cost
+        self._stats: Dict[Tuple, _Outcomes] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _contexts(path: str, features: QueryFeatures) -> List[Tuple]:
+        """Keys from general to specific under which a path's outcomes are kept"""
+        contexts = [(path,), (path, features.operation)]
+        if path == KNOWLEDGE_BASE and features.kb_score is not None:
+            contexts.append((path, features.operation, min(int(features.kb_score * 10), 9)))
+        elif path == SYMBOLIC:
+            contexts.append((path, features.operation, features.complexity))
+        return contexts
+
+    def _prior(self, path: str, features: QueryFeatures) -> Tuple[float, float]:
+        if path == SYMBOLIC:
+            base = self.SYMBOLIC_LATENCY.get(features.operation, self.PRIOR_LATENCY[SYMBOLIC])
+            return base * max(1.0, features.tree_size / 8), self.PRIOR_SUCCESS[SYMBOLIC]
+        if path == KNOWLEDGE_BASE and features.kb_score is not None:
+            return self.PRIOR_LATENCY[path], features.kb_score
+        return self.PRIOR_LATENCY[path], self.PRIOR_SUCCESS[path]
+
+    def estimate(self, path: str, features: QueryFeatures) -> Tuple[float, float]:
+        """Expected latency (seconds) and probability of answering for one path"""
+        latency, success = self._prior(path, features)
+        with self._lock:
+            for context in self._contexts(path, features):
+                outcomes = self._stats.get(context)
+                if outcomes is None:
+                    break
+                total = outcomes.count + self.PRIOR_WEIGHT
+                success = (outcomes.successes + self.PRIOR_WEIGHT * success) / total
+                latency += outcomes.count / total * (outcomes.latency - latency)
+        return latency, success
+
+    def _hedge(self, first: str, second: str, estimates: Dict[str, Tuple[float, float]]) -> bool:
+        """Whether running two consecutive paths together saves more latency than it wastes"""
+        first_latency, first_success = estimates[first]
+        second_latency, second_success = estimates[second]
+        sequential = first_latency + (1 - first_success) * second_latency
+        if first_latency <= second_latency:
+            concurrent = first_success * first_latency + (1 - first_success) * second_latency
+        else:
+            concurrent = second_success * second_latency + (1 - second_success) * first_latency
+        wasted = first_success * second_latency * self.PARALLEL_COST[second]
+        return sequential - concurrent > self.hedge_cost * wasted
+
+    def plan(self, features: QueryFeatures, paths: Sequence[str], parallel: bool = True) -> List[List[str]]:
+        """Stages of paths to try in order; the paths of one stage run concurrently"""
+        # The solver only answers questions its patterns recognise
+        paths = [path for path in paths if path != SYMBOLIC or features.operation is not None]
+        estimates = {path: self.estimate(path, features) for path in paths}
+        order = sorted(paths, key=lambda path: estimates[path][0] / max(estimates[path][1], self.MIN_SUCCESS))
+        # Without a candidate score every KB miss for an operation lands in one
+        # bucket; ranking the KB on that would stop trying it, and so stop
+        # noticing entries added later. A lookup costs about a millisecond.
+        if KNOWLEDGE_BASE in order and features.kb_score is None:
+            order.remove(KNOWLEDGE_BASE)
+            order.insert(0, KNOWLEDGE_BASE)
+        stages = []
+        i = 0
+        while i < len(order):
+            if parallel and i + 1 < len(order) and self._hedge(order[i], order[i + 1], estimates):
+                stages.append(order[i:i + 2])
+                i += 2
+            else:
+                stages.append([order[i]])
+                i += 1
+        return stages
+
+    def record(self, path: str, features: QueryFeatures, latency: float, success: bool):
+        """Learn from one observed path run"""
+        with self._lock:
+            for context in self._contexts(path, features):
+                outcomes = self._stats.get(context)
+                if outcomes is None:
+                    outcomes = self._stats[context] = _Outcomes()
+                outcomes.add(latency, success, self.LATENCY_ALPHA)
+
+    def export_stats(self) -> List[Tuple[Tuple, int, int, float]]:
+        """Observations as (context, count, successes, latency) rows"""
+        with self._lock:
+            return [(context, outcomes.count, outcomes.successes, outcomes.latency)
+                    for context, outcomes in self._stats.items()]
+
+    def import_stats(self, rows: List[Tuple[Tuple, int, int, float]]):
+        """Start from earlier observations; contexts already observed here are kept"""
+        with self._lock:
+            for context, count, successes, latency in rows:
+                if context not in self._stats:
+                    outcomes = self._stats[context] = _Outcomes()
+                    outcomes.count, outcomes.successes, outcomes.latency = count, successes, latency
+
+    def stats(self) -> Dict[str, Dict]:
+        """Observed count, success rate and latency per context"""
+        with self._lock:
+            return {
+                '/'.join(str(part) for part in context): {
+                    'count': outcomes.count,
+                    'success_rate': outcomes.successes / outcomes.count,
+                    'latency_ms': outcomes.latency * 1000
+                }
+                for context, outcomes in sorted(self._stats.items(), key=lambda item: str(item[0]))
+            }
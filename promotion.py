@@ -0,0 +1,214 @@
+import argparse
+import ast
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ai_gateway import AIGateway
+from feedback import AnswerStore, FeedbackCollector, entry_rating, normalize_question
+from knowledge_base import KnowledgeBase
+
+class KBPromoter:
+    """
+    Promote well-rated answers from feedback history into the knowledge base.
+
+    FeedbackLogger's log file and FeedbackCollector's store are read
+    incrementally from a checkpoint. Each feedback event becomes a +1/-1 vote
+    for an answer, votes are tallied per normalized question, and the best
+    answer of every question that clears the threshold is bulk-loaded into
+    the KB.
+    """
+
+    def __init__(self, kb: Optional[KnowledgeBase] = None, collector: Optional[FeedbackCollector] = None,
+                 log_file: str = "feedback_log.txt", checkpoint_file: str = "promotion_checkpoint.json",
+                 min_score: int = 1, min_rating: float = 4, max_rating_negative: float = 2,
+                 classifier: Optional[Callable[..., List[Dict[str, Any]]]] = None,
+                 min_confidence: float = 0.8, gateway: Optional[AIGateway] = None,
+                 answers_file: str = "feedback_answers.jsonl"):
+        self.logger = logging.getLogger(__name__)
+        self.kb = kb or KnowledgeBase()
+        self.collector = collector or FeedbackCollector()
+        self.log_file = log_file
+        self.answers_file = answers_file
+        self.checkpoint_file = checkpoint_file
+        self.min_score = min_score
+        self.min_rating = min_rating
+        self.max_rating_negative = max_rating_negative
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.gateway = gateway or AIGateway()
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict:
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'log_offset': 0, 'collector_position': 0, 'tallies': {}, 'promoted': {}}
+
+    def _save_checkpoint(self):
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint, f, indent=2)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    @staticmethod
+    def _answer_fields(answer: Any) -> Optional[Dict]:
+        """Pull answer text, steps and source out of a logged response"""
+        if not isinstance(answer, dict) or not answer.get('answer'):
+            return None
+        return {
+            'answer': str(answer['answer']),
+            'steps': list(answer.get('steps') or []),
+            'source': answer.get('source', '')
+        }
+
+    def _read_log(self) -> Iterator[Tuple[str, Dict, bool, str]]:
+        """Yield (question, answer, helpful, comment) for log lines past the checkpoint"""
+        if not os.path.exists(self.log_file):
+            return
+        offset = self.checkpoint['log_offset']
+        if os.path.getsize(self.log_file) < offset:
+            offset = 0  # the log was truncated or rotated
+        # Newer log lines reference answers by hash instead of embedding them
+        answers = AnswerStore(self.answers_file)
+        with open(self.log_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partially written line, read on the next run
+                offset += len(line)
+                self.checkpoint['log_offset'] = offset
+                parts = line.decode('utf-8').rstrip('\r\n').split('\t')
+                if len(parts) < 5 or not parts[1].startswith('Q: '):
+                    continue
+                response = '\t'.join(parts[2:-2])[len('A: '):]
+                if response.startswith('#'):
+                    answer = answers.get(response[1:])
+                else:
+                    try:
+                        answer = ast.literal_eval(response)
+                    except (ValueError, SyntaxError):
+                        answer = None
+                yield parts[1][len('Q: '):], answer, parts[-2] == 'Helpful: True', parts[-1][len('Comment: '):]
+
+    def _read_collector(self, batch_size: int = 10000) -> Iterator[Dict]:
+        """Yield FeedbackCollector entries past the checkpoint"""
+        while True:
+            entries, position = self.collector.store.entries_after(self.checkpoint['collector_position'], batch_size)
+            if not entries:
+                return
+            for entry in entries:
+                yield entry
+            self.checkpoint['collector_position'] = position
+
+    def _vote(self, question: str, answer: Dict, score: int):
+        tallies = self.checkpoint['tallies'].setdefault(normalize_question(question), {})
+        tally = tallies.setdefault(answer['answer'], {'score': 0, 'votes': 0, **answer})
+        tally['score'] += score
+        tally['votes'] += 1
+        tally['question'] = question
+
+    def collect(self):
+        """Fold new feedback events into the per-question tallies"""
+        logged = []
+        for question, response, helpful, comment in self._read_log():
+            answer = self._answer_fields(response)
+            if answer and answer['source'] != 'Knowledge Base':
+                logged.append((question, answer, helpful, comment))
+
+        # Comments are classified in one batch; a confident negative comment
+        # overrides a "helpful" click
+        negative = set()
+        commented = [i for i, item in enumerate(logged) if item[3]]
+        if self.classifier and commented:
+            sentiments = self.classifier([logged[i][3] for i in commented], batch_size=len(commented))
+            negative = {i for i, sentiment in zip(commented, sentiments)
+                        if sentiment['label'] == 'NEGATIVE' and sentiment['score'] >= self.min_confidence}
+        for i, (question, answer, helpful, _) in enumerate(logged):
+            self._vote(question, answer, 1 if helpful and i not in negative else -1)
+
+        for entry in self._read_collector():
+            answer = self._answer_fields(entry['answer'])
+            rating = entry_rating(entry)
+            if not answer or answer['source'] == 'Knowledge Base' or rating == 0:
+                continue  # unrated entries are placeholders logged by Router
+            if rating >= self.min_rating:
+                self._vote(entry['question'], answer, 1)
+            elif rating <= self.max_rating_negative:
+                self._vote(entry['question'], answer, -1)
+
+    def select(self) -> List[Dict]:
+        """Best answer per question that clears the threshold and is not yet promoted"""
+        winners = []
+        for normalized, tallies in self.checkpoint['tallies'].items():
+            best = max(tallies.values(), key=lambda tally: (tally['score'], tally['votes']))
+            if best['score'] < self.min_score or self.checkpoint['promoted'].get(normalized) == best['answer']:
+                continue
+            if not self.gateway.validate_output(best['answer'])['valid']:
+                continue
+            winners.append({'normalized': normalized, **best})
+        return winners
+
+    def run(self, dry_run: bool = False) -> Dict:
+        """Read new feedback, promote the winners, and advance the checkpoint"""
+        self.collect()
+        winners = self.select()
+        promoted_at = datetime.now().isoformat()
+        entries = [{
+            'question': winner['question'],
+            'answer': winner['answer'],
+            'steps': winner['steps'],
+            'provenance': {
+                'method': 'feedback_promotion',
+                'source': winner['source'],
+                'score': winner['score'],
+                'votes': winner['votes'],
+                'timestamp': promoted_at
+            }
+        } for winner in winners]
+
+        if not dry_run:
+            self.kb.add_entries(entries)
+            for winner in winners:
+                self.checkpoint['promoted'][winner['normalized']] = winner['answer']
+            self._save_checkpoint()
+        return {
+            'questions': len(self.checkpoint['tallies']),
+            'promoted': len(entries) if not dry_run else 0,
+            'candidates': [entry['question'] for entry in entries]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Promote well-rated feedback answers into the knowledge base")
+    parser.add_argument('--feedback-file', default='feedback.json', help="FeedbackCollector file (.json or .db)")
+    parser.add_argument('--log-file', default='feedback_log.txt', help="FeedbackLogger log file")
+    parser.add_argument('--checkpoint', default='promotion_checkpoint.json', help="Where read positions and tallies are kept")
+    parser.add_argument('--min-score', type=int, default=1, help="Net positive votes needed for promotion")
+    parser.add_argument('--min-rating', type=float, default=4, help="Average rating that counts as a positive vote")
+    parser.add_argument('--sentiment', choices=['none', 'keyword', 'model'], default='none',
+                        help="Classify comments and let confident negatives veto helpful clicks")
+    parser.add_argument('--dry-run', action='store_true', help="Report candidates without writing the KB or checkpoint")
+    args = parser.parse_args()
+
+    classifier = None
+    if args.sentiment == 'keyword':
+        from feedback import KeywordSentimentClassifier
+        classifier = KeywordSentimentClassifier()
+    elif args.sentiment == 'model':
+        from transformers import pipeline
+        classifier = pipeline("text-classification", model="distilbert-base-uncased-finetuned-sst-2-english")
+
+    promoter = KBPromoter(collector=FeedbackCollector(args.feedback_file), log_file=args.log_file,
+                          checkpoint_file=args.checkpoint, min_score=args.min_score,
+                          min_rating=args.min_rating, classifier=classifier)
+    summary = promoter.run(dry_run=args.dry_run)
+
+    print(f"Questions with feedback: {summary['questions']}")
+    print(f"Promoted into knowledge base: {summary['promoted']}")
+    for question in summary['candidates']:
+        print(f"- {question}")
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,186 @@
+from admission import AdmissionController, Overloaded, default_admission, CHEAP, EXPENSIVE
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from guardrails import Guardrails
 from feedback import FeedbackCollector
-from typing import Dict, Optional
-import sympy as sp
-from knowledge_base import KnowledgeBase
+from planner import (QueryFeatures, QueryPlanner, extract_features, KNOWLEDGE_BASE, NO_SOURCE, OVERLOADED, SOURCES,
+                     SYMBOLIC, WEB_SEARCH)
+from typing import Dict, Iterator, List, Optional, Tuple
+from warm_start import default_warm_start
+import threading
+import time
+from symbolic import SymbolicSolver
+from telemetry import telemetry
 import wolframalpha
 
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _path_executor(admission: AdmissionController) -> ThreadPoolExecutor:
+    """
+    Threads for concurrent paths, sized to the admission pools: shared by
+    every Router on the default controller, one per Router with its own
+    """
+    # Threads past the pools' capacity would only wait for a slot
+    workers = sum(pool.max_concurrency for pool in admission.pools.values())
+    if admission is not default_admission():
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='router-path')
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='router-path')
+    return _executor
+
 class Router:
-    def __init__(self, kb, websearch):
+    SOURCES = SOURCES
+
+    def __init__(self, kb, websearch, admission: Optional[AdmissionController] = None,
+                 planner: Optional[QueryPlanner] = None):
         self.kb = kb
         self.websearch = websearch
+        warm_start = default_warm_start()
+        warm_start.install_guardrails()
         self.guardrails = Guardrails()
         self.feedback_collector = FeedbackCollector()
+        self.symbolic = SymbolicSolver()
+        self.admission = admission or default_admission()
+        self.planner = planner or QueryPlanner()
+        warm_start.attach(evaluator=self.symbolic.evaluator, planner=self.planner)
+        self._executor = _path_executor(self.admission)
 
-    def route(self, user_input: str) -> Dict:
+    def route(self, user_input: str, priority: int = 0) -> Dict:
         """Route the user input to appropriate handler and collect feedback."""
-        # First try knowledge base
-        
-        kb_result = self.kb.query(user_input)
-        if kb_result:
-            # Collect feedback on knowledge base result
-            feedback = self.feedback_collector.collect_feedback(
-                user_input, kb_result, {'accuracy': 0, 'clarity': 0, 'relevance': 0, 'comments': ''}
-            )
-            return {
-                **kb_result,
-                "feedback": feedback,
-                "source": "Knowledge Base"
-            }
-        
-        # If no result from knowledge base, try web search
-        if self.websearch:
-            web_result = self.websearch.search_math_content(user_input)
-            if web_result:
-                # Collect feedback on web search result
-                feedback = self.feedback_collector.collect_feedback(
-                    user_input, web_result, {'accuracy': 0, 'clarity': 0, 'relevance': 0, 'comments': ''}
-                )
-                return {
-                    **web_result,
-                    "feedback": feedback,
-                    "source": "Web Search"
-                }
-        
-        # Symbolic fallback for derivatives and equation solving
-        x = sp.symbols('x')
-        if "derivative" in user_input and "of" in user_input:
-            expr = user_input.split("of")[-1].strip()
-            try:
-                derivative = sp.diff(sp.sympify(expr), x)
-                return {
-                    "answer": f"The derivative of {expr} is {derivative}.",
-                    "steps": ["Parsed the expression.", "Used SymPy to compute the derivative."],
-                    "source": "Symbolic Math"
-                }
-            except Exception as e:
+        response = None
+        with telemetry.span('route'):
+            for response in self.route_stream(user_input, priority):
                 pass
-        if "solve" in user_input and "=" in user_input:
+        return response
+
+    @staticmethod
+    def _overloaded(error: Overloaded) -> Dict:
+        telemetry.increment('requests_total', source=OVERLOADED)
+        return {
+            "answer": str(error),
+            "steps": [f"The {error.pool} work queue could not take this request in time."],
+            "source": OVERLOADED,
+            "final": True
+        }
+
+    def _run_path(self, path: str, user_input: str, features: QueryFeatures, priority: int) -> Optional[Dict]:
+        """Run one answer path in its admission pool and report the outcome to the planner"""
+        if path == KNOWLEDGE_BASE:
+            pool, stage, handler = CHEAP, 'kb_query', self.kb.query
+        elif path == SYMBOLIC:
+            pool = EXPENSIVE if self.symbolic.is_expensive(user_input) else CHEAP
+            stage, handler = 'symbolic', self.symbolic.solve
+        else:
+            pool, stage, handler = EXPENSIVE, 'web_search', self.websearch.search_math_content
+        with self.admission.slot(pool, priority):
+            start = time.perf_counter()
+            with telemetry.span(stage):
+                result = handler(user_input)
+            self.planner.record(path, features, time.perf_counter() - start, bool(result))
+        return result
+
+    @staticmethod
+    def _is_preview(path: str, stage: List[str]) -> bool:
+        """Whether an answer from this path only stands in until the web search of its stage answers"""
+        return path == SYMBOLIC and WEB_SEARCH in stage
+
+    def _run_stage(self, stage: List[str], user_input: str, features: QueryFeatures,
+                   priority: int) -> Iterator[Tuple[str, Optional[Dict], Optional[Overloaded]]]:
+        """
+        (path, result, shed error) for each path of a stage as it finishes.
+        Closing the generator cancels paths that have not started yet; paths
+        already running finish in the background.
+        """
+        if len(stage) == 1:
             try:
-                eq = user_input.split("solve")[-1].strip()
-                solution = sp.solve(sp.sympify(eq))
-                return {
-                    "answer": f"The solution(s) to {eq} is/are {solution}.",
-                    "steps": ["Parsed the equation.", "Used SymPy to solve the equation."],
-                    "source": "Symbolic Math"
-                }
-            except Exception as e:
-                pass
-        # Symbolic fallback for area of a square
-        if "area" in user_input and "square" in user_input and "side" in user_input:
-            import re
-            match = re.search(r"side\s*(\d+)", user_input)
-            if match:
-                side = int(match.group(1))
-                area = side * side
-                return {
-                    "answer": f"The area of a square with side {side} is {area} square units.",
-                    "steps": [
-                        "Recall the formula for the area of a square: A = side².",
-                        f"Substitute side = {side}: A = {side}² = {area}."
-                    ],
-                    "source": "Symbolic Math"
-                }
+                yield stage[0], self._run_path(stage[0], user_input, features, priority), None
+            except Overloaded as e:
+                yield stage[0], None, e
+            return
+        futures = {}
+        for path in stage:
+            # A later path is not started once an earlier one has answered
+            if any(future.done() and not future.exception() and future.result()
+                   and not self._is_preview(earlier, stage) for future, earlier in futures.items()):
+                break
+            futures[self._executor.submit(self._run_path, path, user_input, features, priority)] = path
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Overloaded as e:
+                    yield futures[future], None, e
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def route_stream(self, user_input: str, priority: int = 0) -> Iterator[Dict]:
+        """
+        Route the user input and yield results as they become available.
+
+        The planner orders the knowledge base, symbolic and web paths by
+        expected latency and may run two of them concurrently; the first stage
+        that answers gives the result. When a symbolic answer arrives while
+        the web search of its stage is still running, it is yielded with
+        "final": False and the web answer, if there is one, follows as the
+        final response. The last response yielded always has
+        "final": True and matches what route() returns. Each path runs in an
+        admission pool (lower priority values are served first); if a path is
+        shed and no other path answered, the final response has source
+        "Overloaded".
+        """
+        with telemetry.span('plan'):
+            features = extract_features(user_input, self.symbolic, self.kb)
+            paths = [KNOWLEDGE_BASE, SYMBOLIC] + ([WEB_SEARCH] if self.websearch else [])
+            stages = self.planner.plan(features, paths)
+
+        shed = None
+        for stage in stages:
+            answer = None
+            stage_results = self._run_stage(stage, user_input, features, priority)
+            for path, result, stage_shed in stage_results:
+                shed = stage_shed or shed
+                if not result:
+                    continue
+                answer = path, result
+                if not self._is_preview(path, stage):
+                    break
+                # Shown while the web search of this stage runs
+                yield {**result, "source": self.SOURCES[path], "final": False}
+            stage_results.close()
+            if not answer:
+                continue
+            path, result = answer
+            source = self.SOURCES[path]
+            if path != SYMBOLIC:
+                # Collect feedback on knowledge base and web search results
+                self.feedback_collector.collect_feedback(
+                    user_input, result, {'accuracy': 0, 'clarity': 0, 'relevance': 0, 'comments': ''}, source=source
+                )
+            telemetry.increment('requests_total', source=source)
+            yield {
+                **result,
+                "source": source,
+                "final": True
+            }
+            return
+
+        if shed:
+            yield self._overloaded(shed)
+            return
         
         # If no results found
-        return {
+        telemetry.increment('requests_total', source=NO_SOURCE)
+        self.feedback_collector.collect_feedback(
+            user_input, {}, {'accuracy': 0, 'clarity': 0, 'relevance': 0, 'comments': ''}, source=NO_SOURCE
+        )
+        yield {
             "answer": "I'm sorry, I couldn't find an answer to your question.",
             "steps": ["No relevant information found in knowledge base or web search."],
-            "source": "No Source",
-            "feedback": self.feedback_collector.collect_feedback(
-                user_input, {}, {'accuracy': 0, 'clarity': 0, 'relevance': 0, 'comments': ''}
-            )
+            "source": NO_SOURCE,
+            "final": True
         }
 
     def get_feedback_summary(self) -> Dict:
@@ -98,20 +189,6 @@ class Router:
         """
         return self.feedback_collector.get_feedback_summary()
 
-x = sp.symbols('x')
-result = sp.diff(sp.log(x), x)
-# result will be 1/x
-
-kb = KnowledgeBase()
-kb.add_entry(
-    "What is the derivative of log x?",
-    "The derivative of log(x) is 1/x.",
-    [
-        "Recall the derivative rule for logarithmic functions.",
-        "The derivative of log(x) with respect to x is 1/x."
-    ]
-)
-
 class WebSearch:
     def __init__(self, app_id):
         self.client = wolframalpha.Client(app_id)
@@ -0,0 +1,384 @@
+"""
+Knowledge base shared between worker processes through mmap'd files.
+
+A single loader process publishes math_kb.json as an immutable snapshot file
+(question index + JSON payloads) and bumps a generation number in a small
+control file. Workers map both files read-only: attaching costs a couple of
+syscalls and the pages are shared by every process through the OS page
+cache. Workers keep no per-process copy of the questions: the similarity
+scan decodes the stored lowercase questions straight from the mapping,
+exact lookups binary-search a sorted index in it, and payloads are only
+decoded on a hit. The snapshot also carries the MinHash signatures and
+sorted LSH band arrays, so large knowledge bases are searched through
+candidates the same way KnowledgeBase does, without rebuilding the index.
+
+    python shared_kb.py --watch            # loader: publish and republish on change
+    MATH_AGENT_SHARED_KB=/dev/shm/math_agent_kb streamlit run frontend.py
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from knowledge_base import KnowledgeBase
+from minhash import MinHashLSH
+from warm_start import default_warm_start
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                 'math_agent_kb')
+
+# magic, version, generation, entry count, LSH section offset
+HEADER = struct.Struct('=4sIQQQ')
+# num_perm, bands, shingle, seed
+LSH_PARAMS = struct.Struct('=4q')
+# magic, generation
+CONTROL = struct.Struct('=4s4xQ')
+# question offset and length, lowercase question offset and length, payload offset and length
+INDEX_FIELDS = 6
+MAGIC = b'MKB1'
+CONTROL_MAGIC = b'MKBC'
+VERSION = 3
+
+def _snapshot_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f'kb-{generation:010d}.bin')
+
+def _control_path(directory: str) -> str:
+    return os.path.join(directory, 'control')
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % 8)
+
+def encode_snapshot(knowledge_base: Dict[str, Dict], generation: int, index: Optional[MinHashLSH] = None) -> bytes:
+    """
+    Serialize a knowledge base dict into the snapshot layout:
+    header | index | positions sorted by question bytes | questions | lowercase questions | payloads |
+    LSH parameters | signatures | sorted band keys | band ids
+
+    index is a MinHashLSH over exactly these questions in this order; one is
+    built when it is not given.
+    """
+    if index is None:
+        index = MinHashLSH()
+        index.add_many(list(knowledge_base))
+    if index.count != len(knowledge_base):
+        raise ValueError("The LSH index does not match the knowledge base")
+    sorted_keys, orders = index.band_arrays()
+    questions = [question.encode('utf-8') for question in knowledge_base]
+    lowered = [question.lower().encode('utf-8') for question in knowledge_base]
+    payloads = [json.dumps(entry, ensure_ascii=False).encode('utf-8') for entry in knowledge_base.values()]
+    offsets = array('Q')
+    question_offset = HEADER.size + len(questions) * (INDEX_FIELDS + 1) * offsets.itemsize
+    lowered_offset = question_offset + sum(len(q) for q in questions)
+    payload_offset = lowered_offset + sum(len(q) for q in lowered)
+    for question, lower, payload in zip(questions, lowered, payloads):
+        offsets.extend((question_offset, len(question), lowered_offset, len(lower), payload_offset, len(payload)))
+        question_offset += len(question)
+        lowered_offset += len(lower)
+        payload_offset += len(payload)
+    order = array('Q', sorted(range(len(questions)), key=questions.__getitem__))
+    signatures = index.signatures[:index.count].tobytes()
+    lsh = [_padding(payload_offset), LSH_PARAMS.pack(*index.params), signatures, _padding(len(signatures))]
+    lsh += [keys.astype(np.uint64).tobytes() for keys in sorted_keys]
+    lsh += [ids.astype(np.int64).tobytes() for ids in orders]
+    header = HEADER.pack(MAGIC, VERSION, generation, len(questions), payload_offset + len(lsh[0]))
+    return b''.join([header, offsets.tobytes(), order.tobytes()] + questions + lowered + payloads + lsh)
+
+class _Snapshot:
+    """One published generation, mapped read-only"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, self.count, lsh_offset = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a knowledge base snapshot")
+        end = HEADER.size + self.count * INDEX_FIELDS * 8
+        self._index = memoryview(self._mm)[HEADER.size:end].cast('Q')
+        self._order = memoryview(self._mm)[end:end + self.count * 8].cast('Q')
+        self.lsh = self._map_lsh(lsh_offset)
+
+    def _map_lsh(self, offset: int) -> MinHashLSH:
+        """Read-only MinHashLSH whose arrays are views of the mapping"""
+        params = LSH_PARAMS.unpack_from(self._mm, offset)
+        num_perm, bands = params[0], params[1]
+        offset += LSH_PARAMS.size
+        signatures = np.frombuffer(self._mm, dtype=np.uint32, count=self.count * num_perm, offset=offset)
+        offset += signatures.nbytes + len(_padding(signatures.nbytes))
+        sorted_keys = np.frombuffer(self._mm, dtype=np.uint64, count=bands * self.count, offset=offset)
+        offset += sorted_keys.nbytes
+        orders = np.frombuffer(self._mm, dtype=np.int64, count=bands * self.count, offset=offset)
+        return MinHashLSH.from_arrays(params, signatures.reshape(self.count, num_perm),
+                                      sorted_keys.reshape(bands, self.count), orders.reshape(bands, self.count), self)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> str:
+        return self.question(i)
+
+    def _field(self, i: int, field: int) -> bytes:
+        offset = self._index[i * INDEX_FIELDS + field]
+        return self._mm[offset:offset + self._index[i * INDEX_FIELDS + field + 1]]
+
+    def question(self, i: int) -> str:
+        return self._field(i, 0).decode('utf-8')
+
+    def lowered(self, positions: Optional[List[int]] = None) -> Iterator[str]:
+        """Lowercase questions (all, or at positions), decoded from the mapping as the scan reaches them"""
+        for i in (range(self.count) if positions is None else positions):
+            yield self._field(i, 2).decode('utf-8')
+
+    def position(self, question: str) -> Optional[int]:
+        """Index of a stored question, by binary search over the sorted positions"""
+        target = question.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._field(self._order[mid], 0) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._field(self._order[lo], 0) == target:
+            return self._order[lo]
+        return None
+
+    def entry(self, i: int) -> Dict:
+        return json.loads(self._field(i, 4).decode('utf-8'))
+
+class SharedKnowledgeBase:
+    """
+    Read-only KnowledgeBase backed by the snapshot a KBPublisher maintains.
+
+    Every call checks the control file's generation (a read from a mapped
+    page, no syscall) and switches to a newer snapshot when one appears.
+    The swap is a single reference assignment, so a query always runs
+    against one complete generation. retrieval, lsh_min_entries and
+    max_candidates mean the same as for KnowledgeBase.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, retrieval: str = 'auto', lsh_min_entries: int = 50000,
+                 max_candidates: int = 500):
+        self.directory = directory
+        self.retrieval = retrieval
+        self.lsh_min_entries = lsh_min_entries
+        self.max_candidates = max_candidates
+        with open(_control_path(directory), 'rb') as f:
+            self._control = mmap.mmap(f.fileno(), CONTROL.size, access=mmap.ACCESS_READ)
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._current()
+
+    @property
+    def generation(self) -> int:
+        return self._current().generation
+
+    def _current(self) -> _Snapshot:
+        generation = CONTROL.unpack_from(self._control)[1]
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.generation != generation:
+            snapshot = self._attach(generation)
+        return snapshot
+
+    def _attach(self, generation: int) -> _Snapshot:
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.generation == generation:
+                return self._snapshot
+            try:
+                snapshot = _Snapshot(_snapshot_path(self.directory, generation))
+            except (FileNotFoundError, ValueError):
+                # Already superseded and pruned; keep serving the old one and retry next call
+                if self._snapshot is None:
+                    raise
+                return self._snapshot
+            logger.info(f"Attached knowledge base generation {generation} ({snapshot.count} entries)")
+            self._snapshot = snapshot
+            return snapshot
+
+    def __len__(self) -> int:
+        return self._current().count
+
+    def get(self, question: str) -> Optional[Dict]:
+        """Exact lookup of a stored question"""
+        snapshot = self._current()
+        position = snapshot.position(question)
+        return snapshot.entry(position) if position is not None else None
+
+    def _use_lsh(self, snapshot: _Snapshot) -> bool:
+        return self.retrieval == 'lsh' or (self.retrieval == 'auto' and snapshot.count >= self.lsh_min_entries)
+
+    def candidate_score(self, question: str) -> Optional[float]:
+        """Same as KnowledgeBase.candidate_score, from the published signatures"""
+        snapshot = self._current()
+        if not snapshot.count:
+            return 0.0
+        if not self._use_lsh(snapshot):
+            return None
+        return snapshot.lsh.best_estimate(question)
+
+    def query(self, question: str, threshold: float = 0.85) -> Optional[Dict]:
+        """Query the knowledge base for similar questions (same matching as KnowledgeBase.query)"""
+        snapshot = self._current()
+        if not snapshot.count:
+            return None
+
+        if self._use_lsh(snapshot):
+            positions = snapshot.lsh.candidate_ids(question, self.max_candidates)
+        else:
+            positions = range(snapshot.count)
+        question_lower = question.lower()
+        best_position = None
+        best_similarity = 0
+        for i, stored_question in zip(positions, snapshot.lowered(positions)):
+            similarity = SequenceMatcher(None, question_lower, stored_question).ratio()
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_position = i
+
+        if best_similarity < threshold:
+            return None
+
+        entry = snapshot.entry(best_position)
+        return {
+            'question': snapshot.question(best_position),
+            'answer': entry['answer'],
+            'steps': entry['steps'],
+            'similarity': best_similarity
+        }
+
+class KBPublisher:
+    """Publishes a knowledge base file as numbered snapshots for SharedKnowledgeBase readers"""
+
+    def __init__(self, kb_file: str = 'math_kb.json', directory: str = DEFAULT_DIRECTORY, keep: int = 3):
+        self.kb_file = kb_file
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        control_path = _control_path(directory)
+        if not os.path.exists(control_path):
+            with open(control_path, 'wb') as f:
+                f.write(CONTROL.pack(CONTROL_MAGIC, 0))
+        with open(control_path, 'r+b') as f:
+            self._control = mmap.mmap(f.fileno(), CONTROL.size)
+        self.generation = CONTROL.unpack_from(self._control)[1]
+        self._signature = None
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.kb_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _lsh_index(self, questions: List[str]) -> MinHashLSH:
+        """
+        MinHashLSH over the questions in snapshot order, reusing signatures
+        from the KB's persisted index (math_kb.minhash.npz) where it has them
+        """
+        index = MinHashLSH()
+        signatures = None
+        lsh_file = os.path.splitext(self.kb_file)[0] + '.minhash.npz'
+        if os.path.exists(lsh_file):
+            try:
+                persisted = MinHashLSH.load(lsh_file)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring {lsh_file}: {e}")
+            else:
+                if persisted.params == index.params:
+                    rows = np.array([persisted.ids.get(question, -1) for question in questions], dtype=np.int64)
+                    known = rows >= 0
+                    signatures = np.empty((len(questions), index.num_perm), dtype=np.uint32)
+                    signatures[known] = persisted.signatures[rows[known]]
+                    missing = np.flatnonzero(~known)
+                    if len(missing):
+                        signatures[missing] = index.signatures_for([questions[i] for i in missing])
+        index.add_many(questions, signatures)
+        return index
+
+    def publish(self, knowledge_base: Optional[Dict[str, Dict]] = None) -> int:
+        """Write a new snapshot, then make it current by bumping the generation"""
+        if knowledge_base is None:
+            self._signature = self._file_signature()
+            knowledge_base = KnowledgeBase(self.kb_file).knowledge_base
+        generation = self.generation + 1
+        path = _snapshot_path(self.directory, generation)
+        data = encode_snapshot(knowledge_base, generation, self._lsh_index(list(knowledge_base)))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        # Readers only look at files whose generation the control file names
+        CONTROL.pack_into(self._control, 0, CONTROL_MAGIC, generation)
+        self.generation = generation
+        self._prune()
+        logger.info(f"Published knowledge base generation {generation} ({len(knowledge_base)} entries)")
+        return generation
+
+    def _prune(self):
+        """Remove old generations; processes that still map them keep their pages"""
+        for generation in range(max(1, self.generation - self.keep - 10), self.generation - self.keep + 1):
+            try:
+                os.remove(_snapshot_path(self.directory, generation))
+            except OSError:
+                pass
+
+    def publish_if_changed(self) -> Optional[int]:
+        if self._file_signature() != self._signature:
+            return self.publish()
+        return None
+
+    def watch(self, interval: float = 1.0):
+        """Republish whenever the knowledge base file changes"""
+        self.publish()
+        while True:
+            time.sleep(interval)
+            self.publish_if_changed()
+
+def open_knowledge_base(kb_file: str = 'math_kb.json', watch: bool = False):
+    """
+    SharedKnowledgeBase when MATH_AGENT_SHARED_KB names a published directory,
+    otherwise a regular KnowledgeBase loaded from kb_file, or from the
+    warm-start snapshot while kb_file is unchanged (reloading on file changes
+    when watch is set; shared snapshots always follow the publisher).
+    """
+    directory = os.environ.get('MATH_AGENT_SHARED_KB')
+    if directory:
+        try:
+            return SharedKnowledgeBase(directory)
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning(f"Shared knowledge base unavailable ({e}); loading {kb_file}")
+    kb = default_warm_start().knowledge_base(kb_file)
+    if watch:
+        kb.watch()
+    return kb
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish the knowledge base for shared-memory workers")
+    parser.add_argument('--kb-file', default='math_kb.json')
+    parser.add_argument('--directory', default=DEFAULT_DIRECTORY, help="Where snapshots are published")
+    parser.add_argument('--watch', action='store_true', help="Keep running and republish on changes")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between change checks")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    publisher = KBPublisher(args.kb_file, args.directory)
+    if args.watch:
+        publisher.watch(args.interval)
+    else:
+        generation = publisher.publish()
+        print(f"Published generation {generation} to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import re
+from typing import Dict, Optional, Tuple
+import logging
+import sympy as sp
+from evaluator import NumericEvaluator, format_number
+from sympy.parsing.sympy_parser import (
+    parse_expr, standard_transformations, implicit_multiplication,
+    implicit_application, convert_xor
+)
+
+class SymbolicSolver:
+    """Solve natural-language math questions locally with SymPy."""
+
+    TRANSFORMATIONS = standard_transformations + (implicit_multiplication, implicit_application, convert_xor)
+
+    # Unicode and spelling variants that SymPy does not understand
+    REPLACEMENTS = [
+        ('²', '**2'), ('³', '**3'), ('√', 'sqrt'), ('π', 'pi'), ('∞', 'oo'),
+        ('−', '-'), ('×', '*'), ('÷', '/'), ('cosec', 'csc'), ('cosine', 'cos'), ('sine', 'sin')
+    ]
+
+    DERIVATIVE_PATTERN = re.compile(r"(?:derivative|differentiate)\s+(?:of\s+)?(.+?)(?:\s+with respect to\s+([a-z]))?$")
+    INTEGRAL_PATTERN = re.compile(r"(?:integral|integrate|∫)\s*(?:of\s+)?(.+?)(?:\s+from\s+(\S+)\s+to\s+(\S+))?$")
+    LIMIT_PATTERN = re.compile(r"limit\s+(?:of\s+)?(.+?)\s+as\s+([a-z])\s+(?:approaches|tends to|->|→)\s+(.+)$")
+    SOLVE_PATTERN = re.compile(r"solve\s+(.+=.+)$")
+    SQUARE_PATTERN = re.compile(r"side\s*(\d+)")
+    ARITHMETIC_PATTERN = re.compile(r"^(?:what is|what's|calculate|compute|evaluate)?\s*(.+?)\s*=?$")
+    ARITHMETIC_OPERATOR = re.compile(r"[-+*/^%(]")
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.x = sp.symbols('x')
+        self.evaluator = NumericEvaluator()
+
+    def normalize(self, text: str) -> str:
+        """Lowercase the question and rewrite symbols into SymPy syntax"""
+        text = text.strip().rstrip('?.').lower()
+        for old, new in self.REPLACEMENTS:
+            text = text.replace(old, new)
+        return text
+
+    def parse(self, text: str, skip_words: bool = False) -> Optional[sp.Expr]:
+        """
+        Parse an expression whose free symbols are all single letters.
+
+        With skip_words, leading words are dropped one at a time so the
+        mathematical tail of a phrase like "the equation x**2 - 1" is found.
+        """
+        words = text.split()
+        for start in range(len(words) if skip_words else min(1, len(words))):
+            candidate = ' '.join(words[start:])
+            try:
+                expr = parse_expr(candidate, transformations=self.TRANSFORMATIONS)
+            except Exception:
+                continue
+            if all(len(symbol.name) == 1 for symbol in getattr(expr, 'free_symbols', ())):
+                return expr
+        return None
+
+    def _variable(self, expr: sp.Expr, name: Optional[str] = None) -> sp.Symbol:
+        """Pick the variable to operate on"""
+        if name:
+            return sp.symbols(name)
+        free = sorted(expr.free_symbols, key=lambda s: s.name)
+        return free[0] if len(free) == 1 else self.x
+
+    def is_expensive(self, question: str) -> bool:
+        """Whether solving may run an integral, limit or equation solve, which can take seconds"""
+        text = self.normalize(question)
+        return any(pattern.search(text) for pattern in (self.INTEGRAL_PATTERN, self.LIMIT_PATTERN, self.SOLVE_PATTERN))
+
+    def classify(self, question: str) -> Tuple[Optional[str], str]:
+        """
+        The operation solve() would run and the expression text it would work
+        on, found with the patterns alone. The operation is None for questions
+        solve() cannot answer.
+        """
+        text = self.normalize(question)
+        expression = self._arithmetic_expression(text)
+        if expression:
+            return 'arithmetic', expression
+        for operation, pattern in (('derivative', self.DERIVATIVE_PATTERN), ('integral', self.INTEGRAL_PATTERN),
+                                   ('limit', self.LIMIT_PATTERN), ('equation', self.SOLVE_PATTERN)):
+            match = pattern.search(text)
+            if match:
+                return operation, match.group(1)
+        if "area" in text and "square" in text and self.SQUARE_PATTERN.search(text):
+            return 'area', ''
+        return None, text
+
+    def solve(self, question: str) -> Optional[Dict]:
+        """Try every supported operation and return the first answer"""
+        text = self.normalize(question)
+        for handler in (self._arithmetic, self._derivative, self._integral, self._limit, self._equation,
+                        self._square_area):
+            try:
+                result = handler(text)
+            except Exception as e:
+                self.logger.debug(f"{handler.__name__} failed for {question!r}: {str(e)}")
+                continue
+            if result:
+                return result
+        return None
+
+    def _arithmetic_expression(self, text: str) -> Optional[str]:
+        """The expression of a plain arithmetic question such as 'what is 2+3*4'"""
+        match = self.ARITHMETIC_PATTERN.search(text)
+        expression = match.group(1)
+        if not self.ARITHMETIC_OPERATOR.search(expression):
+            return None
+        compiled = self.evaluator.compile(expression)
+        if compiled is None or compiled.variables:
+            return None
+        return expression
+
+    def _arithmetic(self, text: str) -> Optional[Dict]:
+        expression = self._arithmetic_expression(text)
+        if expression is None:
+            return None
+        value = self.evaluator.evaluate(expression)
+        if value is None:
+            return None
+        if self.evaluator.is_approximate(expression) and self.evaluator.integer_only(expression):
+            # Floats drop integer digits past 2**53; every intermediate was a
+            # finite float, so SymPy's exact arithmetic stays cheap
+            exact = sp.sympify(expression)
+            if exact.is_Rational:
+                return {
+                    "answer": f"{expression} = {exact}",
+                    "steps": ["Parsed the arithmetic expression.", "Evaluated it exactly with SymPy."],
+                    "source": "Symbolic Math"
+                }
+        return {
+            "answer": f"{expression} = {format_number(value)}",
+            "steps": ["Parsed the arithmetic expression.", "Evaluated it numerically."],
+            "source": "Symbolic Math"
+        }
+
+    def _derivative(self, text: str) -> Optional[Dict]:
+        match = self.DERIVATIVE_PATTERN.search(text)
+        if not match:
+            return None
+        expr = self.parse(match.group(1))
+        if expr is None:
+            return None
+        variable = self._variable(expr, match.group(2))
+        derivative = sp.diff(expr, variable)
+        return {
+            "answer": f"The derivative of {expr} is {derivative}.",
+            "steps": ["Parsed the expression.", "Used SymPy to compute the derivative."],
+            "source": "Symbolic Math"
+        }
+
+    def _integral(self, text: str) -> Optional[Dict]:
+        match = self.INTEGRAL_PATTERN.search(text)
+        if not match:
+            return None
+        body, lower, upper = match.groups()
+        variable_match = re.search(r"\s*d([a-z])$", body)
+        name = None
+        if variable_match:
+            name = variable_match.group(1)
+            body = body[:variable_match.start()]
+        expr = self.parse(body)
+        if expr is None:
+            return None
+        variable = self._variable(expr, name)
+        if lower is not None and upper is not None:
+            bounds = self._bounds(lower, upper)
+            integral = sp.integrate(expr, (variable, *bounds))
+            return {
+                "answer": f"The integral of {expr} from {bounds[0]} to {bounds[1]} evaluates to {integral}.",
+                "steps": ["Parsed the expression.", "Used SymPy to compute the definite integral."],
+                "source": "Symbolic Math"
+            }
+        integral = sp.integrate(expr, variable)
+        return {
+            "answer": f"The integral of {expr} is {integral} + C.",
+            "steps": ["Parsed the expression.", "Used SymPy to compute the indefinite integral."],
+            "source": "Symbolic Math"
+        }
+
+    def _bounds(self, lower: str, upper: str) -> Tuple[sp.Expr, sp.Expr]:
+        return (parse_expr(lower, transformations=self.TRANSFORMATIONS),
+                parse_expr(upper, transformations=self.TRANSFORMATIONS))
+
+    def _limit(self, text: str) -> Optional[Dict]:
+        match = self.LIMIT_PATTERN.search(text)
+        if not match:
+            return None
+        expr = self.parse(match.group(1))
+        if expr is None:
+            return None
+        variable = sp.symbols(match.group(2))
+        point = parse_expr(match.group(3).replace('infinity', 'oo'), transformations=self.TRANSFORMATIONS)
+        lim = sp.limit(expr, variable, point)
+        return {
+            "answer": f"The limit of {expr} as {variable} approaches {point} is {lim}.",
+            "steps": ["Parsed the expression.", "Used SymPy to compute the limit."],
+            "source": "Symbolic Math"
+        }
+
+    def _equation(self, text: str) -> Optional[Dict]:
+        match = self.SOLVE_PATTERN.search(text)
+        if not match:
+            return None
+        lhs, rhs = match.group(1).split('=', 1)
+        left = self.parse(lhs, skip_words=True)
+        right = self.parse(rhs)
+        if left is None or right is None:
+            return None
+        eq = sp.Eq(left, right)
+        solution = sp.solve(eq)
+        return {
+            "answer": f"The solution(s) to {eq.lhs} = {eq.rhs} is/are {solution}.",
+            "steps": ["Parsed the equation.", "Used SymPy to solve the equation."],
+            "source": "Symbolic Math"
+        }
+
+    def _square_area(self, text: str) -> Optional[Dict]:
+        if not ("area" in text and "square" in text and "side" in text):
+            return None
+        match = self.SQUARE_PATTERN.search(text)
+        if not match:
+            return None
+        side = int(match.group(1))
+        area = side * side
+        return {
+            "answer": f"The area of a square with side {side} is {area} square units.",
+            "steps": [
+                "Recall the formula for the area of a square: A = side².",
+                f"Substitute side = {side}: A = {side}² = {area}."
+            ],
+            "source": "Symbolic Math"
+        }
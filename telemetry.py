@@ -0,0 +1,292 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram in microseconds.
+
+    Values are grouped into log-linear buckets: every power of two is split
+    into SUB_BUCKETS equal slices, so any recorded value is reproduced within
+    about 1/SUB_BUCKETS relative error with a small, sparse set of counters.
+    """
+    SUB_BUCKETS = 16
+    SUB_BITS = 4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        exponent = value.bit_length() - 1
+        mantissa = (value >> (exponent - cls.SUB_BITS)) & (cls.SUB_BUCKETS - 1)
+        return (exponent - cls.SUB_BITS + 1) * cls.SUB_BUCKETS + mantissa
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        """Largest value that falls into a bucket"""
+        if index < cls.SUB_BUCKETS:
+            return index
+        exponent = index // cls.SUB_BUCKETS + cls.SUB_BITS - 1
+        mantissa = index % cls.SUB_BUCKETS
+        width = 1 << (exponent - cls.SUB_BITS)
+        return (1 << exponent) + (mantissa + 1) * width - 1
+
+    def record(self, value_us: float):
+        value = max(0, int(value_us))
+        index = self._index(value)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value_us
+            self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> int:
+        """Value (us) at or below which percent of the recordings fall"""
+        with self._lock:
+            if not self.count:
+                return 0
+            target = max(1, int(round(self.count * percent / 100.0)))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    return min(self._upper_bound(index), self.max)
+            return self.max
+
+    def cumulative(self, bounds_us: List[float]) -> List[int]:
+        """Cumulative counts at each upper bound, for Prometheus 'le' buckets"""
+        with self._lock:
+            items = sorted(self.counts.items())
+        result = []
+        for bound in bounds_us:
+            result.append(sum(count for index, count in items if self._upper_bound(index) <= bound))
+        return result
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count if self.count else 0,
+            'p50_us': self.percentile(50),
+            'p95_us': self.percentile(95),
+            'p99_us': self.percentile(99),
+            'max_us': self.max
+        }
+
+class _NoopSpan:
+    """Returned by Telemetry.span while telemetry is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Telemetry:
+    """
+    Lightweight request tracing: spans around pipeline stages, latency
+    histograms per stage, counters (e.g. which source answered) and gauges
+    (e.g. admission queue depth).
+
+    While disabled, span() returns a shared no-op context manager and
+    increment() returns immediately, so instrumented code pays almost nothing.
+    Enable with MATH_AGENT_TELEMETRY=1 or configure(enabled=True).
+    """
+    PROMETHEUS_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                          0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+    def __init__(self):
+        self.enabled = os.environ.get('MATH_AGENT_TELEMETRY', '') not in ('', '0', 'false')
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self.gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace_ids = itertools.count(1)
+        self.span_logger: Optional[logging.Logger] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        if os.environ.get('MATH_AGENT_TELEMETRY_LOG'):
+            self.configure(log_file=os.environ['MATH_AGENT_TELEMETRY_LOG'])
+        if self.enabled and os.environ.get('MATH_AGENT_METRICS_PORT'):
+            self.start_http_server(int(os.environ['MATH_AGENT_METRICS_PORT']))
+
+    def configure(self, enabled: Optional[bool] = None, log_file: Optional[str] = None):
+        """Turn telemetry on/off and optionally log every span as a JSON line"""
+        if enabled is not None:
+            self.enabled = enabled
+        if log_file:
+            self.span_logger = logging.getLogger(f"{__name__}.spans")
+            self.span_logger.setLevel(logging.INFO)
+            self.span_logger.propagate = False
+            handler = logging.FileHandler(log_file, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.span_logger.addHandler(handler)
+
+    def span(self, stage: str):
+        """Context manager timing one pipeline stage"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage: str) -> Iterator[None]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # The outermost span of a thread starts a new trace
+        trace_id = stack[0][1] if stack else next(self._trace_ids)
+        parent = stack[-1][0] if stack else None
+        stack.append((stage, trace_id))
+        start = time.perf_counter_ns()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration_us = (time.perf_counter_ns() - start) / 1000
+            stack.pop()
+            self._histogram(stage).record(duration_us)
+            if self.span_logger is not None:
+                self.span_logger.info(json.dumps({
+                    'timestamp': datetime.now().isoformat(),
+                    'trace': trace_id,
+                    'span': stage,
+                    'parent': parent,
+                    'duration_ms': duration_us / 1000,
+                    'error': error
+                }))
+
+    def _histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def increment(self, name: str, amount: int = 1, **labels: str):
+        """Add to a counter such as source hits"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """Record the current value of a level such as queue depth"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def _copies(self) -> Tuple[Dict, Dict, Dict]:
+        """Histograms, counters and gauges as of now; request threads keep adding keys"""
+        with self._lock:
+            return dict(self.histograms), dict(self.counters), dict(self.gauges)
+
+    def snapshot(self) -> Dict:
+        """Histogram percentiles, counters, gauges and per-source hit rates"""
+        histograms, all_counters, all_gauges = self._copies()
+        counters = {}
+        for (name, labels), value in sorted(all_counters.items()):
+            label_text = ','.join(f'{k}={v}' for k, v in labels)
+            counters[f'{name}{{{label_text}}}' if labels else name] = value
+        gauges = {}
+        for (name, labels), value in sorted(all_gauges.items()):
+            label_text = ','.join(f'{k}={v}' for k, v in labels)
+            gauges[f'{name}{{{label_text}}}' if labels else name] = value
+        sources = {dict(labels).get('source'): value for (name, labels), value in all_counters.items()
+                   if name == 'requests_total'}
+        total = sum(sources.values())
+        return {
+            'stages': {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())},
+            'counters': counters,
+            'gauges': gauges,
+            'source_hit_rate': {source: value / total for source, value in sources.items()} if total else {}
+        }
+
+    def dump(self, path: str):
+        """Write the current snapshot to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def export_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP math_agent_stage_latency_seconds Latency of each request pipeline stage.',
+            '# TYPE math_agent_stage_latency_seconds histogram'
+        ]
+        histograms, counters, gauges = self._copies()
+        bounds_us = [bound * 1e6 for bound in self.PROMETHEUS_BUCKETS]
+        for stage, histogram in sorted(histograms.items()):
+            for bound, count in zip(self.PROMETHEUS_BUCKETS, histogram.cumulative(bounds_us)):
+                lines.append(f'math_agent_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'math_agent_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'math_agent_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total / 1e6}')
+            lines.append(f'math_agent_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f'# TYPE math_agent_{name} counter')
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'math_agent_{name}{{{label_text}}} {value}' if labels else f'math_agent_{name} {value}')
+
+        for name in sorted({name for name, _ in gauges}):
+            lines.append(f'# TYPE math_agent_{name} gauge')
+            for (gauge_name, labels), value in sorted(gauges.items()):
+                if gauge_name != name:
+                    continue
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'math_agent_{name}{{{label_text}}} {value}' if labels else f'math_agent_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port: int = 9464, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+        """Serve export_prometheus() at /metrics from a daemon thread"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.export_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        return self._server
+
+telemetry = Telemetry()
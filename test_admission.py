@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionPool, Overloaded, default_admission
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def queue_waiter(pool, priority, admitted, **kwargs):
+    """Start a thread blocked in acquire() and return once it is queued"""
+    queued = pool.stats()['queued']
+
+    def run():
+        pool.acquire(priority, **kwargs)
+        admitted.append(priority)
+        pool.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_for(lambda: pool.stats()['queued'] == queued + 1)
+    return thread
+
+def test_waiters_are_served_by_priority_then_arrival():
+    pool = AdmissionPool('test', 1, queue_timeout=5)
+    pool.acquire()
+    admitted = []
+    threads = [queue_waiter(pool, priority, admitted) for priority in (5, 1, 3, 1)]
+    pool.release()
+    for thread in threads:
+        thread.join(5)
+    assert admitted == [1, 1, 3, 5]
+    assert pool.stats()['active'] == 0
+
+def test_release_hands_the_slot_to_the_next_waiter():
+    pool = AdmissionPool('test', 1, queue_timeout=5)
+    pool.acquire()
+    holding = threading.Event()
+    done = threading.Event()
+
+    def run():
+        pool.acquire()
+        holding.set()
+        done.wait(5)
+        pool.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_for(lambda: pool.stats()['queued'] == 1)
+    pool.release()
+    assert holding.wait(5)
+    # The slot moved over without being freed, so nobody could jump in between
+    assert pool.stats()['active'] == 1
+    with pytest.raises(Overloaded):
+        pool.acquire(timeout=0.01)
+    done.set()
+    thread.join(5)
+    assert pool.stats()['active'] == 0
+    assert pool.stats()['admitted'] == 2
+
+def test_predicted_wait_is_shed_without_queueing():
+    pool = AdmissionPool('test', 1, queue_timeout=0.5)
+    pool.acquire()
+    pool.release(service_time=2.0)
+    pool.acquire()
+    with pytest.raises(Overloaded) as error:
+        pool.acquire()
+    assert error.value.reason == 'predicted_wait'
+    assert pool.stats()['queued'] == 0
+
+def test_deadline_sheds_and_leaves_the_queue():
+    pool = AdmissionPool('test', 1)
+    pool.acquire()
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as error:
+        pool.acquire(timeout=0.05)
+    assert error.value.reason == 'deadline'
+    assert time.monotonic() - start < 1
+    assert pool.stats()['queued'] == 0
+    pool.release()
+    assert pool.stats()['active'] == 0
+    assert pool.stats()['shed']['deadline'] == 1
+
+def test_full_queue_is_shed():
+    pool = AdmissionPool('test', 1, max_queue=1, queue_timeout=5)
+    pool.acquire()
+    admitted = []
+    thread = queue_waiter(pool, 0, admitted)
+    with pytest.raises(Overloaded) as error:
+        pool.acquire()
+    assert error.value.reason == 'queue_full'
+    pool.release()
+    thread.join(5)
+    assert admitted == [0]
+
+def test_routers_share_the_default_controller(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MATH_AGENT_WARM_START', '0')
+    from router import Router
+    first, second = Router(None, None), Router(None, None)
+    assert first.admission is second.admission is default_admission()
+    assert first._executor is second._executor
+    separate = Router(None, None, admission=AdmissionController(cheap_concurrency=1, expensive_concurrency=1))
+    assert separate._executor is not first._executor
+    assert separate._executor._max_workers == 2
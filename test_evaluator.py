@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from admission import AdmissionController
+from evaluator import NumericEvaluator
+from main import MathAgent
+from symbolic import SymbolicSolver
+
+@pytest.fixture
+def evaluator():
+    return NumericEvaluator()
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').getcwd()",
+    "__builtins__",
+    "_x + 1",
+    "(1).__class__",
+    "x.real",
+    "(lambda: 1)()",
+    "eval('1')",
+    "open('/etc/passwd')",
+    "sin(x, key=1)",
+    "[1, 2][0]",
+    "'a' * 3",
+    "True + 1",
+    "sin",
+])
+def test_rejects_input_outside_the_grammar(evaluator, expression):
+    assert evaluator.compile(expression) is None
+    assert evaluator.evaluate(expression) is None
+
+def test_evaluates_arithmetic_and_functions(evaluator):
+    assert evaluator.evaluate("2+3*4") == 14
+    assert evaluator.evaluate("2^10 % 1000") == 24
+    assert evaluator.evaluate("sqrt(16) + log(E)") == 5
+    assert evaluator.evaluate("x^2 + y", {'x': 3, 'y': 1}) == 10
+    # Symbolic input without values is left to SymPy
+    assert evaluator.evaluate("x^2") is None
+
+def test_overflow_and_math_errors_are_not_answers(evaluator):
+    start = time.perf_counter()
+    assert evaluator.evaluate("9**9**9") is None
+    assert time.perf_counter() - start < 1
+    assert evaluator.evaluate("1/0") is None
+    assert evaluator.evaluate("sqrt(-1)") is None
+    assert evaluator.evaluate("1" * 2000) is None
+
+def test_large_integers_are_answered_exactly():
+    solver = SymbolicSolver()
+    assert solver.solve("what is 2^64")['answer'] == "2^64 = 18446744073709551616"
+    assert solver.solve("what is (2^60+1) % 10")['answer'] == "(2^60+1) % 10 = 7"
+    assert solver.evaluator.is_approximate("2^64")
+    assert not solver.evaluator.is_approximate("2^52 + 1")
+
+def test_cache_is_bounded():
+    evaluator = NumericEvaluator(cache_size=8)
+    for i in range(20):
+        assert evaluator.evaluate(f"{i} + 1") == i + 1
+    assert len(evaluator._cache) == 8
+    # Oldest entries go first
+    assert "19 + 1" in evaluator._cache and "0 + 1" not in evaluator._cache
+
+@pytest.fixture
+def agent(monkeypatch):
+    calls = []
+    real_sympify = main.sp.sympify
+
+    def sympify(expression, *args, **kwargs):
+        calls.append(expression)
+        return real_sympify(expression, *args, **kwargs)
+
+    monkeypatch.setattr(main.sp, 'sympify', sympify)
+    stub = SimpleNamespace(admission=AdmissionController(), evaluator=NumericEvaluator())
+    return SimpleNamespace(evaluate=lambda expression: MathAgent.evaluate_expression(stub, expression), calls=calls)
+
+@pytest.mark.parametrize("expression", ["__import__('os').getcwd()", "x.__class__", "(lambda: 1)()", "1 +"])
+def test_evaluate_expression_never_sympifies_rejected_input(agent, expression):
+    assert agent.evaluate(expression).startswith("Error:")
+    assert agent.calls == []
+
+def test_evaluate_expression_only_sympifies_symbolic_input(agent):
+    assert agent.evaluate("2+3*4") == 14
+    assert agent.calls == []
+    assert agent.evaluate("x^2 + 2*x") == "x**2 + 2*x"
+    assert agent.calls == ["x^2 + 2*x"]
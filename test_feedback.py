@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from feedback import (AnalysisLog, FeedbackCache, FeedbackLogger, KeywordSentimentClassifier, MathFeedback,
+                      TemplateFeedbackBackend)
+
+class RecordingClassifier(KeywordSentimentClassifier):
+    """Keyword classifier that remembers the size of every batch it was given"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, **kwargs):
+        self.batches.append(len(texts))
+        return super().__call__(texts, **kwargs)
+
+class CountingBackend(TemplateFeedbackBackend):
+    """Template backend that counts its calls and the most stages it ran at once"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _stage(self, stage, *args):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            return getattr(super(), stage)(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def generate_feedback(self, question, answer):
+        return self._stage('generate_feedback', question, answer)
+
+    def analyze_feedback(self, feedback, question, answer):
+        return self._stage('analyze_feedback', feedback, question, answer)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def make_logger(classifier, **kwargs):
+    return FeedbackLogger(log_file="feedback_log.txt", classifier=classifier, analysis_file="analysis.jsonl",
+                          answers_file="answers.jsonl", **kwargs)
+
+def test_full_batch_is_analyzed_without_waiting_for_the_latency_budget(workdir):
+    classifier = RecordingClassifier()
+    logger = make_logger(classifier, batch_size=4, max_latency=30)
+    start = time.monotonic()
+    for i in range(4):
+        logger.log_feedback(f"What is {i} + {i}?", f"{2 * i}", True)
+    assert logger.flush(timeout=10)
+    assert time.monotonic() - start < 10
+    assert classifier.batches == [4]
+
+def test_partial_batch_is_analyzed_after_the_latency_budget(workdir):
+    classifier = RecordingClassifier()
+    logger = make_logger(classifier, batch_size=100, max_latency=0.05)
+    logger.log_feedback("What is 2 + 2?", "4", True)
+    logger.log_feedback("What is 3 + 3?", "7", False, "wrong answer")
+    assert logger.flush(timeout=10)
+    assert classifier.batches == [2]
+
+def test_flush_persists_analyses_to_the_log(workdir):
+    logger = make_logger(KeywordSentimentClassifier(), batch_size=8, max_latency=0.05)
+    logger.log_feedback("What is 2 + 2?", "4", True)
+    logger.log_feedback("What is 3 + 3?", {"answer": "7", "steps": []}, False, "wrong answer")
+    assert logger.flush(timeout=10)
+
+    # A fresh reader sees what the worker wrote
+    records = AnalysisLog("analysis.jsonl", legacy_path=None).read()
+    analyses = [record["analysis"] for record in records]
+    assert [analysis["question"] for analysis in analyses] == ["What is 2 + 2?", "What is 3 + 3?"]
+    assert [analysis["sentiment"] for analysis in analyses] == ["POSITIVE", "NEGATIVE"]
+    assert logger.get_improvements()[1]["response"] == {"answer": "7", "steps": []}
+
+def test_feedback_stages_are_memoized_across_restarts(tmp_path):
+    cache_file = str(tmp_path / "feedback_cache.db")
+    backend = CountingBackend()
+    first = MathFeedback(backend=backend, cache=FeedbackCache(cache_file)).collect_feedback("What is 2 + 2?", "2 + 2 = 4")
+    assert first['success']
+    assert backend.calls == 2
+
+    # A new process: fresh cache connection and backend over the same file
+    restarted = CountingBackend()
+    second = MathFeedback(backend=restarted, cache=FeedbackCache(cache_file)).collect_feedback("What is 2 + 2?", "2 + 2 = 4")
+    assert second == first
+    assert restarted.calls == 0
+
+def test_feedback_batch_is_bounded_ordered_and_deduplicated(tmp_path):
+    backend = CountingBackend(delay=0.02)
+    module = MathFeedback(backend=backend, cache=FeedbackCache(str(tmp_path / "feedback_cache.db")))
+    pairs = [(f"What is {i} + {i}?", f"{i} + {i} = {2 * i}") for i in range(6)]
+    results = module.collect_feedback_batch(pairs + pairs[:2], max_workers=2)
+
+    assert backend.max_running == 2
+    # Two stages per distinct pair; the repeated pairs are not sent again
+    assert backend.calls == 12
+    assert [result['feedback'] for result in results] == [
+        TemplateFeedbackBackend().generate_feedback(*pair) for pair in pairs + pairs[:2]
+    ]
+
+def test_analysis_log_skips_corrupt_lines(workdir, caplog):
+    with open("analysis.jsonl", "w", encoding="utf-8") as f:
+        f.write('{"timestamp": "2024-01-01T00:00:00", "analysis": {"question": "a"}}\n')
+        f.write('{"timestamp": "2024-01-02T00:00:00", "analys\n')
+        f.write('{"analysis": {"question": "no timestamp"}}\n')
+        f.write('{"timestamp": "2024-01-03T00:00:00", "analysis": {"question": "b"}}\n')
+    log = AnalysisLog("analysis.jsonl", legacy_path=None)
+    assert [record["analysis"]["question"] for record in log.read()] == ["a", "b"]
+    assert "Skipping bad record" in caplog.text
+    # Readers built on the log keep working
+    assert len(make_logger(KeywordSentimentClassifier()).get_improvements()) == 2
+
+def test_analysis_log_ranges_follow_timestamps_not_file_order(workdir):
+    # Two processes appending: the second writer's batch starts earlier
+    first = AnalysisLog("analysis.jsonl", legacy_path=None)
+    second = AnalysisLog("analysis.jsonl", legacy_path=None)
+    first.append([{"timestamp": "2024-01-03T00:00:00", "analysis": {"question": "c"}}])
+    second.append([{"timestamp": "2024-01-01T00:00:00", "analysis": {"question": "a"}},
+                   {"timestamp": "2024-01-04T00:00:00", "analysis": {"question": "d"}}])
+    first.append([{"timestamp": "2024-01-02T00:00:00", "analysis": {"question": "b"}}])
+    for log in (first, second):
+        assert [record["analysis"]["question"] for record in log.read()] == ["c", "a", "d", "b"]
+        in_range = log.read_range("2024-01-02T00:00:00", "2024-01-04T00:00:00")
+        assert [record["analysis"]["question"] for record in in_range] == ["b", "c"]
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+
+from knowledge_base import KnowledgeBase
+
+def entries(generation, count=200):
+    # Each generation drops and adds questions, and changes the ones it keeps
+    return {f"What is {i} + 1?": {'answer': str(generation), 'steps': [str(generation)]}
+            for i in range(generation, generation + count)}
+
+def write(path, knowledge_base):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(knowledge_base, f)
+    os.replace(tmp_path, path)
+
+def test_readers_never_see_a_half_applied_reload(tmp_path):
+    kb_file = str(tmp_path / 'math_kb.json')
+    write(kb_file, entries(0))
+    kb = KnowledgeBase(kb_file, retrieval='exact')
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            snapshot = kb.knowledge_base
+            answers = {entry['answer'] for entry in snapshot.values()}
+            if len(snapshot) != 200 or len(answers) != 1:
+                errors.append((len(snapshot), answers))
+            match = kb.query("What is 150 + 1?")
+            if match and match['steps'] != [match['answer']]:
+                errors.append(match)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for generation in range(1, 30):
+        write(kb_file, entries(generation))
+        # Bump the mtime in case the rewrite landed within the clock's resolution
+        os.utime(kb_file, ns=(time.time_ns(), time.time_ns() + generation * 10 ** 9))
+        assert kb.reload() == {'added': 1, 'changed': 199, 'removed': 1}
+    stop.set()
+    for reader in readers:
+        reader.join(5)
+    assert errors == []
+    assert kb.query("What is 29 + 1?")['answer'] == '29'
+    assert kb.query("What is 0 + 1?", threshold=1.0) is None
+
+def test_reload_only_reads_the_file_when_mtime_or_size_change(tmp_path):
+    kb_file = str(tmp_path / 'math_kb.json')
+    write(kb_file, {"What is 1 + 1?": {'answer': '2', 'steps': []}})
+    kb = KnowledgeBase(kb_file)
+    assert kb.reload() == {}
+    stat = os.stat(kb_file)
+
+    # Same size and mtime: not noticed
+    write(kb_file, {"What is 1 + 1?": {'answer': '3', 'steps': []}})
+    os.utime(kb_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert kb.reload() == {}
+    assert kb.knowledge_base["What is 1 + 1?"]['answer'] == '2'
+
+    # Same size, new mtime
+    os.utime(kb_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert kb.reload() == {'added': 0, 'changed': 1, 'removed': 0}
+    assert kb.knowledge_base["What is 1 + 1?"]['answer'] == '3'
+
+    # New size, same mtime
+    write(kb_file, {"What is 1 + 1?": {'answer': '3', 'steps': []}, "What is 2 + 2?": {'answer': '4', 'steps': []}})
+    os.utime(kb_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert kb.reload() == {'added': 1, 'changed': 0, 'removed': 0}
+
+    # The KB's own writes are not external changes
+    kb.add_entry("What is 3 + 3?", "6", [])
+    assert kb.reload() == {}
+
+def test_reload_keeps_the_state_when_the_file_is_mid_write(tmp_path):
+    kb_file = str(tmp_path / 'math_kb.json')
+    write(kb_file, {"What is 1 + 1?": {'answer': '2', 'steps': []}})
+    kb = KnowledgeBase(kb_file)
+    with open(kb_file, 'w') as f:
+        f.write('{"What is 1 + 1?": {"answer"')
+    assert kb.reload() == {}
+    assert kb.query("What is 1 + 1?")['answer'] == '2'
+
+def test_watch_picks_up_changes(tmp_path):
+    kb_file = str(tmp_path / 'math_kb.json')
+    write(kb_file, {"What is 1 + 1?": {'answer': '2', 'steps': []}})
+    kb = KnowledgeBase(kb_file)
+    kb.watch(interval=0.01)
+    write(kb_file, {"What is 2 + 2?": {'answer': '4', 'steps': ["Add 2 and 2."]}})
+    deadline = time.monotonic() + 5
+    while "What is 2 + 2?" not in kb.knowledge_base:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert "What is 1 + 1?" not in kb.knowledge_base
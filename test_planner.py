@@ -0,0 +1,27 @@
+from planner import KNOWLEDGE_BASE, SYMBOLIC, WEB_SEARCH, QueryFeatures, QueryPlanner
+
+PATHS = [KNOWLEDGE_BASE, SYMBOLIC, WEB_SEARCH]
+
+def flatten(stages):
+    return [path for stage in stages for path in stage]
+
+def test_knowledge_base_is_tried_first_without_a_candidate_score():
+    planner = QueryPlanner()
+    features = QueryFeatures('integral', 5, 1, None)
+    # A run of misses for the same kind of question
+    for _ in range(38):
+        planner.record(KNOWLEDGE_BASE, features, 0.001, False)
+        planner.record(SYMBOLIC, features, 0.3, True)
+    assert planner.estimate(KNOWLEDGE_BASE, features)[1] < 0.1
+    assert flatten(planner.plan(features, PATHS))[0] == KNOWLEDGE_BASE
+    assert flatten(planner.plan(features, PATHS, parallel=False))[0] == KNOWLEDGE_BASE
+
+def test_candidate_score_ranks_the_knowledge_base():
+    planner = QueryPlanner()
+    assert flatten(planner.plan(QueryFeatures('arithmetic', 3, 0, 0.0), PATHS, parallel=False)) == \
+        [SYMBOLIC, KNOWLEDGE_BASE, WEB_SEARCH]
+    assert flatten(planner.plan(QueryFeatures('integral', 3, 1, 1.0), PATHS, parallel=False))[0] == KNOWLEDGE_BASE
+
+def test_symbolic_is_skipped_for_unrecognised_questions():
+    planner = QueryPlanner()
+    assert SYMBOLIC not in flatten(planner.plan(QueryFeatures(None, 0, 0, None), PATHS))
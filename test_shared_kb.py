@@ -0,0 +1,96 @@
+import os
+import threading
+
+import pytest
+
+from shared_kb import HEADER, KBPublisher, SharedKnowledgeBase, _snapshot_path
+
+def entries(generation, count):
+    return {f"What is {i} + {generation}?": {'answer': str(i + generation), 'steps': [str(generation)]}
+            for i in range(count)}
+
+@pytest.fixture
+def publisher(tmp_path):
+    return KBPublisher(str(tmp_path / 'math_kb.json'), directory=str(tmp_path / 'shm'), keep=2)
+
+def test_publish_then_attach(publisher):
+    knowledge_base = entries(1, 50)
+    knowledge_base["Ünïcode question?"] = {'answer': 'ü', 'steps': []}
+    publisher.publish(knowledge_base)
+    shared = SharedKnowledgeBase(publisher.directory)
+    assert shared.generation == 1
+    assert len(shared) == 51
+    assert all(shared.get(question) == entry for question, entry in knowledge_base.items())
+    assert shared.get("What is 1 + 2?") is None
+    match = shared.query("what is 7 + 1")
+    assert match['question'] == "What is 7 + 1?" and match['answer'] == '8'
+
+def test_lsh_retrieval_matches_the_full_scan(publisher):
+    knowledge_base = entries(1, 300)
+    publisher.publish(knowledge_base)
+    exact = SharedKnowledgeBase(publisher.directory, retrieval='exact')
+    lsh = SharedKnowledgeBase(publisher.directory, retrieval='lsh')
+    assert exact.candidate_score("What is 5 + 1?") is None
+    assert lsh.candidate_score("What is 5 + 1?") == 1.0
+    for question in ["what is 12 + 1", "WHAT IS 250 + 1?"]:
+        assert lsh.query(question) == exact.query(question)
+
+def test_position_binary_search(publisher):
+    questions = ["", "a", "ab", "abc", "b", "B", "é", "z" * 300, "What is 2 + 2?", "what is 2 + 2?"]
+    publisher.publish({question: {'answer': str(i), 'steps': []} for i, question in enumerate(questions)})
+    snapshot = SharedKnowledgeBase(publisher.directory)._current()
+    for i, question in enumerate(questions):
+        assert snapshot.position(question) == i
+        assert snapshot.question(i) == question
+    for missing in ["aa", "abcd", "A", "0", "zz", "What is 2 + 3?"]:
+        assert snapshot.position(missing) is None
+
+def test_readers_pick_up_each_generation_whole(publisher):
+    publisher.publish(entries(1, 1))
+    shared = SharedKnowledgeBase(publisher.directory)
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        seen = 0
+        while not stop.is_set():
+            snapshot = shared._current()
+            # Generation g holds g entries whose steps name the generation
+            if snapshot.generation < seen or snapshot.count != snapshot.generation:
+                errors.append((seen, snapshot.generation, snapshot.count))
+            elif snapshot.entry(snapshot.count - 1)['steps'] != [str(snapshot.generation)]:
+                errors.append(snapshot.generation)
+            seen = snapshot.generation
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for generation in range(2, 40):
+        publisher.publish(entries(generation, generation))
+    stop.set()
+    for reader in readers:
+        reader.join(5)
+    assert errors == []
+    assert shared.generation == 39
+
+def test_old_generations_are_pruned(publisher):
+    publisher.publish(entries(1, 3))
+    shared = SharedKnowledgeBase(publisher.directory)
+    first = shared._current()
+    for generation in range(2, 6):
+        publisher.publish(entries(generation, 3))
+    remaining = sorted(name for name in os.listdir(publisher.directory) if name.endswith('.bin'))
+    assert remaining == [os.path.basename(_snapshot_path(publisher.directory, generation)) for generation in (4, 5)]
+    assert shared.get("What is 0 + 5?") == {'answer': '5', 'steps': ['5']}
+    # A reader still holding a pruned generation keeps its mapped pages
+    assert first.entry(0) == {'answer': '1', 'steps': ['1']}
+
+def test_other_snapshot_versions_are_rejected(publisher):
+    publisher.publish(entries(1, 3))
+    path = _snapshot_path(publisher.directory, 1)
+    with open(path, 'r+b') as f:
+        magic, version, generation, count, lsh_offset = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(HEADER.pack(magic, version - 1, generation, count, lsh_offset))
+    with pytest.raises(ValueError):
+        SharedKnowledgeBase(publisher.directory)
@@ -0,0 +1,392 @@
+"""
+Warm-start snapshot of prepared in-memory state.
+
+Building a MathAgent or the Streamlit components otherwise parses
+math_kb.json, builds the KB's lookup and MinHash-LSH indexes and the
+guardrail keyword matcher, and starts with empty evaluator and planner
+caches. The snapshot keeps all of that, already prepared, in one versioned
+file:
+
+    header | metadata (JSON) | section | section | ...
+
+Each section is a pickle (protocol 5) followed by its out-of-band buffers,
+so large numpy arrays such as LSH signatures are used straight from the
+memory-mapped file. The metadata records a CRC-32 and the size and
+modification time of every source file (data and code) per section; a
+section whose sources changed, or whose checksum fails, is rebuilt from the
+sources and written back from a background thread (or at exit). The
+evaluator and planner caches change on every run, so they live in a small
+file of the same format next to it (warm_start.caches.snap) and saving them
+never rewrites the large one. The feedback store changes with every rating
+and is not snapshotted. The files are a local cache and are unpickled, so
+they must never come from an untrusted place.
+
+    python warm_start.py            # build or refresh warm_start.snap
+    python warm_start.py --info     # list sections and whether they are fresh
+
+Set MATH_AGENT_WARM_START=0 to disable it, or MATH_AGENT_WARM_START_FILE to
+move it.
+"""
+import argparse
+import atexit
+import gc
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import weakref
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import evaluator
+import guardrail_engine
+import knowledge_base
+import minhash
+import planner
+from evaluator import NumericEvaluator
+from guardrail_engine import GuardrailEngine, set_default_engine
+from knowledge_base import KnowledgeBase
+from planner import QueryPlanner
+
+MAGIC = b'MAWS'
+FORMAT_VERSION = 1
+# magic, format version, metadata length, metadata CRC-32
+HEADER = struct.Struct('=4sIQI')
+ALIGNMENT = 64
+DEFAULT_FILE = 'warm_start.snap'
+# Evaluator cache entries kept across runs
+CACHE_LIMIT = 4096
+CACHE_SOURCES = [evaluator.__file__, planner.__file__]
+
+_MISSING = object()
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def _signatures(paths: Sequence[str]) -> Dict[str, Optional[List[int]]]:
+    """Size and modification time of each source file (None if it does not exist)"""
+    signatures = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signatures[path] = None
+            continue
+        signatures[path] = [stat.st_size, stat.st_mtime_ns]
+    return signatures
+
+def _runtime() -> Dict[str, str]:
+    """Pickles are only reused by the same Python and numpy"""
+    return {'python': '.'.join(map(str, sys.version_info[:2])), 'numpy': np.__version__}
+
+def _serialize(obj: Any) -> Tuple[List, Dict]:
+    """Pickle bytes and aligned out-of-band buffers of one section, with its layout"""
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    parts = [data]
+    layout = []
+    offset = len(data)
+    for buffer in buffers:
+        raw = buffer.raw()
+        start = _align(offset)
+        parts.extend([bytes(start - offset), raw])
+        layout.append([start, raw.nbytes])
+        offset = start + raw.nbytes
+    crc = 0
+    for part in parts:
+        crc = zlib.crc32(part, crc)
+    return parts, {'length': offset, 'pickle_length': len(data), 'buffers': layout, 'crc32': crc}
+
+class WarmStart:
+    """One snapshot file: loads fresh sections and queues rebuilt ones for flush()."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_FILE, caches_path: Optional[str] = None):
+        # Without a path nothing is read or written and every section is built
+        self.path = os.path.abspath(path) if path else None
+        if self.path and caches_path is None:
+            caches_path = os.path.splitext(self.path)[0] + '.caches.snap'
+        # Holds only the 'caches' section; an empty caches_path means none
+        self._cache_file = WarmStart(caches_path, caches_path='') if self.path and caches_path else None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        # Serializes writers; readers only wait for _lock, which a write holds briefly
+        self._write_lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._meta: Optional[Dict] = None
+        self._base = 0
+        self._pending: Dict[str, Tuple[List, Dict, Dict]] = {}
+        self._guardrails: Optional[GuardrailEngine] = None
+        self._caches: Optional[Dict] = None
+        self._evaluators = weakref.WeakSet()
+        self._planners = weakref.WeakSet()
+        self._exit_hook = False
+        self._flusher: Optional[threading.Thread] = None
+
+    def _read_meta(self):
+        """Map the snapshot file and parse its metadata, once"""
+        if self._meta is not None:
+            return
+        self._meta = {'sections': {}}
+        try:
+            with open(self.path, 'rb') as f:
+                # Private copy-on-write mapping: arrays restored from it stay writable
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (FileNotFoundError, ValueError):
+            return
+        except OSError as e:
+            self.logger.warning(f"Cannot map warm-start snapshot {self.path}: {e}")
+            return
+        try:
+            magic, version, meta_length, meta_crc = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"unsupported format {magic!r} version {version}")
+            raw = self._map[HEADER.size:HEADER.size + meta_length]
+            if zlib.crc32(raw) != meta_crc:
+                raise ValueError("metadata checksum mismatch")
+            meta = json.loads(raw)
+        except (struct.error, ValueError) as e:
+            self.logger.warning(f"Ignoring warm-start snapshot {self.path}: {e}")
+            return
+        if meta.get('runtime') != _runtime():
+            self.logger.info(f"Warm-start snapshot {self.path} was written by another runtime; rebuilding")
+            return
+        self._meta = meta
+        self._base = _align(HEADER.size + meta_length)
+
+    def _load(self, name: str, sources: Dict) -> Any:
+        info = self._meta['sections'].get(name)
+        if info is None or info['sources'] != sources:
+            return _MISSING
+        start = self._base + info['offset']
+        view = memoryview(self._map)[start:start + info['length']]
+        if zlib.crc32(view) != info['crc32']:
+            self.logger.warning(f"Warm-start section {name} failed its checksum; rebuilding")
+            return _MISSING
+        buffers = [view[offset:offset + length] for offset, length in info['buffers']]
+        # Restoring a large KB allocates hundreds of thousands of containers;
+        # cyclic GC passes over them would double the load time
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(view[:info['pickle_length']], buffers=buffers)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def section(self, name: str, sources: Sequence[str], build: Callable[[], Any]) -> Any:
+        """
+        The object stored under name while its source files are unchanged,
+        otherwise build() (queued to be written by the next flush()).
+        """
+        if self.path is None:
+            return build()
+        with self._lock:
+            self._read_meta()
+            try:
+                obj = self._load(name, _signatures(sources))
+            except Exception as e:
+                self.logger.warning(f"Cannot restore warm-start section {name} ({e}); rebuilding")
+                obj = _MISSING
+            if obj is not _MISSING:
+                return obj
+            obj = build()
+            # Signed after the build, which may write sources of its own (the LSH index)
+            parts, info = _serialize(obj)
+            self._pending[name] = (parts, info, _signatures(sources))
+            self._schedule_flush()
+            return obj
+
+    def _schedule_flush(self):
+        """Write pending sections from a background thread, or at exit if it has not finished"""
+        if not self._exit_hook:
+            atexit.register(self._at_exit)
+            self._exit_hook = True
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_pending, name="warm-start-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_pending(self):
+        while self._pending:
+            self.flush()
+
+    def _at_exit(self):
+        self.save_caches()
+        self.flush()
+
+    def flush(self):
+        """Write the sections built since the last flush, keeping the stored ones"""
+        with self._write_lock:
+            with self._lock:
+                if self.path is None or not self._pending:
+                    return
+                self._read_meta()
+                sections: Dict[str, Tuple[List, Dict]] = {}
+                for name, info in self._meta['sections'].items():
+                    # Stale sections are dropped: their sources will not change back
+                    if name not in self._pending and info['sources'] == _signatures(list(info['sources'])):
+                        start = self._base + info['offset']
+                        sections[name] = ([memoryview(self._map)[start:start + info['length']]], dict(info))
+                for name, (parts, info, sources) in self._pending.items():
+                    sections[name] = (parts, {**info, 'sources': sources})
+                self._pending = {}
+            self._write(sections)
+            with self._lock:
+                # Reopened on next use; objects restored from the old mapping keep it alive
+                self._meta = None
+                self._map = None
+
+    def _write(self, sections: Dict[str, Tuple[List, Dict]]):
+        """Lay out the sections and atomically replace the snapshot file"""
+        offset = 0
+        for parts, info in sections.values():
+            info['offset'] = offset
+            offset = _align(offset + info['length'])
+        meta = json.dumps({'runtime': _runtime(), 'sections': {name: info for name, (_, info) in sections.items()}})
+        meta = meta.encode('utf-8')
+        base = _align(HEADER.size + len(meta))
+        if not os.path.isdir(os.path.dirname(self.path)):
+            # e.g. a temporary working directory removed before the exit hook ran
+            self.logger.info(f"Not writing warm-start snapshot {self.path}: its directory no longer exists")
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.snap.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), zlib.crc32(meta)))
+                f.write(meta)
+                for parts, info in sections.values():
+                    f.write(bytes(base + info['offset'] - f.tell()))
+                    for part in parts:
+                        f.write(part)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Cannot write warm-start snapshot {self.path}: {e}")
+
+    def knowledge_base(self, kb_file: str = 'math_kb.json') -> KnowledgeBase:
+        """The knowledge base with its retrieval index prepared"""
+        kb_file = os.path.abspath(kb_file)
+
+        def build() -> KnowledgeBase:
+            kb = KnowledgeBase(kb_file)
+            kb.prepare()
+            return kb
+
+        # Same naming as KnowledgeBase.lsh_file
+        lsh_file = os.path.splitext(kb_file)[0] + '.minhash.npz'
+        return self.section(f'knowledge_base:{kb_file}', [kb_file, lsh_file, knowledge_base.__file__, minhash.__file__],
+                            build)
+
+    def install_guardrails(self) -> GuardrailEngine:
+        """Make the process-wide guardrail engine use the stored keyword matcher"""
+        with self._lock:
+            if self._guardrails is None:
+                matcher = self.section('guardrails', [guardrail_engine.__file__], GuardrailEngine.build_matcher)
+                self._guardrails = GuardrailEngine(matcher=matcher)
+                set_default_engine(self._guardrails)
+            return self._guardrails
+
+    def _stored_caches(self) -> Dict:
+        if self._caches is None:
+            empty = {'evaluator': {}, 'planner': []}
+            store = self._cache_file
+            if store is None:
+                self._caches = empty
+            else:
+                store._read_meta()
+                try:
+                    caches = store._load('caches', _signatures(CACHE_SOURCES))
+                except Exception as e:
+                    self.logger.warning(f"Cannot restore warm-start caches ({e})")
+                    caches = _MISSING
+                self._caches = empty if caches is _MISSING else caches
+        return self._caches
+
+    def attach(self, evaluator: Optional[NumericEvaluator] = None, planner: Optional[QueryPlanner] = None):
+        """Seed an evaluator's and a planner's caches from the snapshot and save them back at exit"""
+        if self._cache_file is None:
+            return
+        with self._lock:
+            caches = self._stored_caches()
+            if evaluator is not None:
+                evaluator.import_cache(caches['evaluator'])
+                self._evaluators.add(evaluator)
+            if planner is not None:
+                planner.import_stats(caches['planner'])
+                self._planners.add(planner)
+            if not self._exit_hook:
+                atexit.register(self._at_exit)
+                self._exit_hook = True
+
+    def save_caches(self):
+        """Merge the caches of every attached evaluator and planner into the caches file"""
+        if self._cache_file is None:
+            return
+        with self._lock:
+            stored = self._stored_caches()
+            evaluator_cache = dict(stored['evaluator'])
+            for attached in list(self._evaluators):
+                evaluator_cache.update(attached.export_cache())
+            evaluator_cache = dict(list(evaluator_cache.items())[-CACHE_LIMIT:])
+            planner_rows = {row[0]: row for row in stored['planner']}
+            for attached in list(self._planners):
+                for row in attached.export_stats():
+                    # The planner with the most observations of a context wins
+                    if row[0] not in planner_rows or row[1] >= planner_rows[row[0]][1]:
+                        planner_rows[row[0]] = row
+            caches = {'evaluator': evaluator_cache, 'planner': list(planner_rows.values())}
+            if caches == stored:
+                return
+            parts, info = _serialize(caches)
+            self._cache_file._pending['caches'] = (parts, info, _signatures(CACHE_SOURCES))
+            self._caches = caches
+            self._cache_file.flush()
+
+    def info(self) -> List[Dict]:
+        """Stored sections, their size and whether their sources are unchanged"""
+        if self.path is None:
+            return []
+        with self._lock:
+            self._read_meta()
+            return [{
+                'section': name,
+                'bytes': info['length'],
+                'fresh': info['sources'] == _signatures(list(info['sources']))
+            } for name, info in self._meta['sections'].items()]
+
+_default: Optional[WarmStart] = None
+_default_lock = threading.Lock()
+
+def default_warm_start() -> WarmStart:
+    """The process-wide snapshot, configured by MATH_AGENT_WARM_START and MATH_AGENT_WARM_START_FILE"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            enabled = os.environ.get('MATH_AGENT_WARM_START', '1') not in ('0', 'false')
+            _default = WarmStart(os.environ.get('MATH_AGENT_WARM_START_FILE', DEFAULT_FILE) if enabled else None)
+    return _default
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the warm-start snapshot")
+    parser.add_argument('--snapshot', default=os.environ.get('MATH_AGENT_WARM_START_FILE', DEFAULT_FILE))
+    parser.add_argument('--kb-file', default='math_kb.json')
+    parser.add_argument('--info', action='store_true', help="Only list the stored sections")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    warm_start = WarmStart(args.snapshot)
+    if not args.info:
+        warm_start.knowledge_base(args.kb_file)
+        warm_start.install_guardrails()
+        warm_start.flush()
+    for section in warm_start.info():
+        print(f"{section['section']}: {section['bytes']} bytes, {'fresh' if section['fresh'] else 'stale'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ai_gateway import AIGateway
+from knowledge_base import KnowledgeBase
+from symbolic import SymbolicSolver
+
+# A remote solver takes a question and returns a dict with at least 'answer'
+RemoteSolver = Callable[[str], Optional[Dict]]
+
+_local_solver = None
+
+def _solve_locally(question: str) -> Optional[Dict]:
+    """Solve one question with SymPy (runs inside worker processes)"""
+    global _local_solver
+    if _local_solver is None:
+        _local_solver = SymbolicSolver()
+    return _local_solver.solve(question)
+
+def load_corpus(path: str) -> List[str]:
+    """
+    Load questions from a corpus file.
+
+    Supports plain text (one question per line), jee_questions.json style
+    lists, and feedback.json style {'entries': [...]} documents.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if not path.endswith('.json'):
+            return [line.strip() for line in f if line.strip()]
+        data = json.load(f)
+
+    items = data.get('entries', []) if isinstance(data, dict) else data
+    questions = []
+    for item in items:
+        if isinstance(item, str):
+            questions.append(item)
+        elif isinstance(item, dict):
+            question = item.get('text') or item.get('question')
+            if question:
+                questions.append(question)
+    return questions
+
+class KBWarmup:
+    """Precompute answers for a question corpus and bulk-load them into the KB."""
+
+    def __init__(self, kb: Optional[KnowledgeBase] = None, gateway: Optional[AIGateway] = None,
+                 remote_solver: Optional[RemoteSolver] = None, workers: Optional[int] = None,
+                 use_processes: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.kb = kb or KnowledgeBase()
+        self.gateway = gateway or AIGateway()
+        self.remote_solver = remote_solver
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+
+    def collect_questions(self, paths: Iterable[str], min_count: int = 1,
+                          force: bool = False) -> List[Tuple[str, str]]:
+        """
+        Gather (question, corpus) pairs ordered by how often they recur.
+
+        Questions the KB already answers are skipped unless force is set.
+        """
+        counts = Counter()
+        origin = {}
+        for path in paths:
+            for question in load_corpus(path):
+                question = question.strip()
+                counts[question] += 1
+                origin.setdefault(question, path)
+
+        selected = []
+        for question, count in counts.most_common():
+            if count < min_count:
+                continue
+            if not force and self.kb.query(question):
+                continue
+            selected.append((question, origin[question]))
+        return selected
+
+    def solve_all(self, questions: List[str]) -> Dict[str, Tuple[str, Dict]]:
+        """Solve questions in parallel: SymPy first, then the remote solver for misses"""
+        results = {}
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=self.workers) as executor:
+            chunksize = max(1, len(questions) // (self.workers * 4))
+            for question, result in zip(questions, executor.map(_solve_locally, questions, chunksize=chunksize)):
+                if result:
+                    results[question] = ('local', result)
+
+        misses = [q for q in questions if q not in results]
+        if self.remote_solver and misses:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for question, result in zip(misses, executor.map(self._solve_remotely, misses)):
+                    if result:
+                        results[question] = ('remote', result)
+        return results
+
+    def _solve_remotely(self, question: str) -> Optional[Dict]:
+        try:
+            return self.remote_solver(question)
+        except Exception as e:
+            self.logger.error(f"Remote solver failed for {question!r}: {str(e)}")
+            return None
+
+    def run(self, paths: Iterable[str], min_count: int = 1, force: bool = False,
+            dry_run: bool = False) -> Dict:
+        """Warm up the knowledge base and return a summary of what happened"""
+        candidates = self.collect_questions(paths, min_count=min_count, force=force)
+        solved = self.solve_all([question for question, _ in candidates])
+
+        warmed_at = datetime.now().isoformat()
+        entries = []
+        rejected = 0
+        for question, corpus in candidates:
+            if question not in solved:
+                continue
+            solver, result = solved[question]
+            answer = str(result.get('answer', ''))
+            validation = self.gateway.validate_output(answer)
+            if not validation['valid']:
+                self.logger.warning(f"Rejected warm-up answer for {question!r}: {validation['error']}")
+                rejected += 1
+                continue
+            entries.append({
+                'question': question,
+                'answer': answer,
+                'steps': result.get('steps', []),
+                'provenance': {
+                    'method': 'warmup',
+                    'solver': solver,
+                    'source': result.get('source', ''),
+                    'corpus': corpus,
+                    'timestamp': warmed_at
+                }
+            })
+
+        loaded = 0 if dry_run else self.kb.add_entries(entries)
+        return {
+            'candidates': len(candidates),
+            'solved_local': sum(1 for solver, _ in solved.values() if solver == 'local'),
+            'solved_remote': sum(1 for solver, _ in solved.values() if solver == 'remote'),
+            'rejected': rejected,
+            'unsolved': len(candidates) - len(solved),
+            'loaded': loaded
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for a question corpus and load them into the knowledge base")
+    parser.add_argument('corpus', nargs='+', help="Question files (.json or one question per line)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of parallel solvers")
+    parser.add_argument('--min-count', type=int, default=1, help="Only warm questions seen at least this often")
+    parser.add_argument('--force', action='store_true', help="Re-solve questions the KB already answers")
+    parser.add_argument('--dry-run', action='store_true', help="Solve and validate without writing the KB")
+    parser.add_argument('--threads', action='store_true', help="Use threads instead of processes for SymPy")
+    parser.add_argument('--wolfram-app-id', help="Use WolframAlpha as the remote solver for SymPy misses")
+    args = parser.parse_args()
+
+    remote_solver = None
+    if args.wolfram_app_id:
+        from router import WebSearch
+        remote_solver = WebSearch(app_id=args.wolfram_app_id).search_math_content
+
+    warmup = KBWarmup(remote_solver=remote_solver, workers=args.workers, use_processes=not args.threads)
+    summary = warmup.run(args.corpus, min_count=args.min_count, force=args.force, dry_run=args.dry_run)
+
+    print(f"Candidate questions: {summary['candidates']}")
+    print(f"Solved locally: {summary['solved_local']}")
+    print(f"Solved remotely: {summary['solved_remote']}")
+    print(f"Rejected by validation: {summary['rejected']}")
+    print(f"Unsolved: {summary['unsolved']}")
+    print(f"Loaded into knowledge base: {summary['loaded']}")
+
+if __name__ == "__main__":
+    main()